@@ -0,0 +1,98 @@
+""" Dataset analytics, computed once per dataset version and served from memory"""
+import threading
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session
+import dataset
+import models
+import query_helpers as helpers
+
+# Number of ratings converted to arrays at once during the analytics pass
+CHUNK_SIZE = 1_000_000
+
+# Percentiles of the number of ratings per user
+USER_ACTIVITY_PERCENTILES = (50, 75, 90, 95, 99)
+
+_lock = threading.Lock()
+_cache = {}
+
+def _grow(counts: np.ndarray, size: int) -> np.ndarray:
+    """ Pad a counts array with zeros up to the given size """
+    if size <= len(counts):
+        return counts
+    return np.concatenate([counts, np.zeros(size - len(counts), dtype = counts.dtype)])
+
+def rating_aggregates(db: Session, chunk_size: int = CHUNK_SIZE) -> dict:
+    """ Compute the rating histogram, the ratings per year and the ratings per user in a single pass
+
+    The ratings are read by chunks of plain tuples turned into NumPy arrays, and every statistic
+    is accumulated with bincount, so the memory stays bounded whatever the size of the table.
+    """
+    half_stars = np.zeros(11, dtype = np.int64) # 0.0, 0.5, ... 5.0
+    per_year = np.zeros(0, dtype = np.int64)    # index = year - 1970
+    per_user = np.zeros(0, dtype = np.int64)    # index = userId
+
+    rows = db.execute(
+        select(models.Rating.userId, models.Rating.rating, models.Rating.timestamp),
+        execution_options = {"yield_per": chunk_size},
+    )
+    for partition in rows.partitions():
+        # Converting Row objects directly is an order of magnitude slower than plain tuples
+        chunk = np.array([tuple(row) for row in partition], dtype = np.float64)
+        users = chunk[:, 0].astype(np.int64)
+        stars = np.rint(chunk[:, 1] * 2).astype(np.int64)
+        years = chunk[:, 2].astype("datetime64[s]").astype("datetime64[Y]").astype(np.int64)
+
+        half_stars += np.bincount(stars, minlength = len(half_stars))[:len(half_stars)]
+        year_counts = np.bincount(years)
+        per_year = _grow(per_year, len(year_counts))
+        per_year[:len(year_counts)] += year_counts
+        user_counts = np.bincount(users)
+        per_user = _grow(per_user, len(user_counts))
+        per_user[:len(user_counts)] += user_counts
+
+    active_users = per_user[per_user > 0]
+    user_activity = {}
+    if len(active_users):
+        user_activity = {f"p{p}": float(value) for p, value in zip(USER_ACTIVITY_PERCENTILES, np.percentile(active_users, USER_ACTIVITY_PERCENTILES))}
+        user_activity.update({"mean": float(active_users.mean()), "max": float(active_users.max())})
+
+    return {
+        "rating_count": int(half_stars.sum()),
+        "user_count": int(len(active_users)),
+        "rating_histogram": {index / 2: int(count) for index, count in enumerate(half_stars) if count},
+        "ratings_per_year": {1970 + index: int(count) for index, count in enumerate(per_year) if count},
+        "user_activity": user_activity,
+    }
+
+def compute_analytics(db: Session) -> dict:
+    """ Compute all the analytics of the dataset """
+    genre_counts = dict(
+        db.query(models.MovieGenre.genre, func.count())
+        .group_by(models.MovieGenre.genre)
+        .order_by(models.MovieGenre.genre)
+        .all()
+    )
+    return {
+        "movie_count": helpers.get_movie_count(db),
+        "tag_count": helpers.get_tag_count(db),
+        "link_count": helpers.get_link_count(db),
+        "genre_counts": genre_counts,
+        **rating_aggregates(db),
+    }
+
+def get_analytics(db: Session) -> dict:
+    """ Return the analytics of the current dataset version, computing them only when the version changed """
+    version = dataset.get_data_version(db)["version"]
+    cached = _cache.get("analytics")
+    if cached is not None and version is not None and cached["data_version"] == version:
+        return cached
+
+    # A single request computes the analytics of a new version, the others wait for its result
+    with _lock:
+        cached = _cache.get("analytics")
+        if cached is not None and version is not None and cached["data_version"] == version:
+            return cached
+        result = {**compute_analytics(db), "data_version": version}
+        _cache["analytics"] = result
+        return result
@@ -0,0 +1,68 @@
+""" Async versions of the query helpers, usable with a Session or an AsyncSession"""
+import functools
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import analytics
+import dataset
+import query_helpers as helpers
+import recommender
+
+def _asynchronous(helper):
+    """ Wrap a query helper into a coroutine which does not block the event loop
+
+    On an AsyncSession the helper runs through run_sync, on the async driver of the engine;
+    on a Session it runs on the threadpool, as a plain `def` endpoint would.
+    """
+    @functools.wraps(helper)
+    async def wrapper(db, *args, **kwargs):
+        if isinstance(db, AsyncSession):
+            return await db.run_sync(helper, *args, **kwargs)
+        return await run_in_threadpool(helper, db, *args, **kwargs)
+    return wrapper
+
+# --- Films---
+
+get_movie = _asynchronous(helpers.get_movie)
+get_movie_detail = _asynchronous(helpers.get_movie_detail)
+get_movies = _asynchronous(helpers.get_movies)
+get_movies_batch = _asynchronous(helpers.get_movies_batch)
+search_movies = _asynchronous(helpers.search_movies)
+get_top_movies = _asynchronous(helpers.get_top_movies)
+get_similar_movies = _asynchronous(helpers.get_similar_movies)
+
+# --- Ratings ---
+
+get_rating = _asynchronous(helpers.get_rating)
+get_ratings = _asynchronous(helpers.get_ratings)
+get_ratings_batch = _asynchronous(helpers.get_ratings_batch)
+get_rating_stats = _asynchronous(helpers.get_rating_stats)
+
+# --- Users ---
+
+get_user_stats = _asynchronous(helpers.get_user_stats)
+get_user_ratings = _asynchronous(helpers.get_user_ratings)
+
+# --- Recommendations ---
+
+recommend = _asynchronous(recommender.recommend)
+
+# ---Tags---
+
+get_tag = _asynchronous(helpers.get_tag)
+get_tags = _asynchronous(helpers.get_tags)
+get_tags_batch = _asynchronous(helpers.get_tags_batch)
+
+# --- Links---
+
+get_link = _asynchronous(helpers.get_link)
+get_links = _asynchronous(helpers.get_links)
+get_links_batch = _asynchronous(helpers.get_links_batch)
+
+# Analytic Queries 
+
+get_movie_count = _asynchronous(helpers.get_movie_count)
+get_rating_count = _asynchronous(helpers.get_rating_count)
+get_tag_count = _asynchronous(helpers.get_tag_count)
+get_link_count = _asynchronous(helpers.get_link_count)
+get_analytics = _asynchronous(analytics.get_analytics)
+get_data_version = _asynchronous(dataset.get_data_version)
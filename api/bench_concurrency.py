@@ -0,0 +1,99 @@
+""" Benchmark of the API throughput in sync and async database mode under many concurrent connections
+
+Usage: python bench_concurrency.py [--connections 256] [--requests 5000] [--path /ratings?user_Id=1]
+
+Each mode is served by its own uvicorn process (DB_MODE=sync, then DB_MODE=async) and hit by
+`connections` concurrent clients until `requests` responses were received.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+HOST = "127.0.0.1"
+
+
+async def _wait_until_up(base_url: str, timeout: float = 30.0):
+    """ Wait for the server health check to answer """
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            try:
+                if (await client.get(f"{base_url}/")).status_code == 200:
+                    return
+            except httpx.TransportError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"Server {base_url} did not start")
+
+
+async def _load(base_url: str, paths: list, connections: int, requests: int) -> dict:
+    """ Send `requests` GET requests over `connections` concurrent connections and measure them """
+    latencies = []
+    errors = 0
+    counter = iter(range(requests))
+    limits = httpx.Limits(max_connections = connections, max_keepalive_connections = connections)
+
+    async with httpx.AsyncClient(base_url = base_url, limits = limits, timeout = 60.0) as client:
+        async def worker():
+            nonlocal errors
+            for index in counter:
+                start = time.perf_counter()
+                try:
+                    response = await client.get(paths[index % len(paths)])
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(connections)))
+        elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests/s": requests / elapsed,
+        "p50 ms": 1000 * statistics.median(latencies),
+        "p99 ms": 1000 * latencies[int(0.99 * (len(latencies) - 1))],
+        "errors": errors,
+    }
+
+
+def run(mode: str, port: int, paths: list, connections: int, requests: int) -> dict:
+    """ Start the API in the given database mode and load it """
+    env = {**os.environ, "DB_MODE": mode}
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", HOST, "--port", str(port), "--log-level", "warning", "--timeout-keep-alive", "120",
+         "--backlog", str(max(2048, connections * 2))],
+        cwd = os.path.dirname(os.path.abspath(__file__)), env = env,
+    )
+    base_url = f"http://{HOST}:{port}"
+    try:
+        asyncio.run(_wait_until_up(base_url))
+        asyncio.run(_load(base_url, paths[:50], min(connections, 50), min(requests, 500))) # warm up
+        return asyncio.run(_load(base_url, paths, connections, requests))
+    finally:
+        server.terminate()
+        server.wait()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare the API throughput in sync and async database mode.")
+    parser.add_argument("--connections", type = int, default = 256, help = "Number of concurrent connections")
+    parser.add_argument("--requests", type = int, default = 5000, help = "Number of requests per mode")
+    parser.add_argument("--path", default = None, help = "Path requested (default: ratings of users 1 to 610)")
+    parser.add_argument("--port", type = int, default = 8765)
+    args = parser.parse_args()
+
+    paths = [args.path] if args.path else [f"/ratings?user_Id={user_Id}&limit=50" for user_Id in range(1, 611)]
+    print(f"{args.requests} requests over {args.connections} connections")
+    for mode in ("sync", "async"):
+        result = run(mode, args.port, paths, args.connections, args.requests)
+        print(f"{mode:<6} " + "  ".join(f"{name} {value:,.1f}" for name, value in result.items()))
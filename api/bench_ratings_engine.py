@@ -0,0 +1,63 @@
+""" Benchmark of the ratings queries: SQL through the ORM vs the memory-mapped ratings engine
+
+Usage: python bench_ratings_engine.py [--limit 100] [--repeat 200]
+
+Each filter of /ratings and the rating statistics of the movie detail are run the SQL way and
+through the engine, on random users and movies of the database. The engine snapshot of the current
+dataset version must have been written by load_data.py.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from database import SessionLocal
+from settings import settings
+import dataset
+import query_helpers as helpers
+import ratings_engine
+
+QUERIES = {
+    "page": lambda db, user, movie, limit: helpers.get_ratings(db, limit = limit, as_rows = True),
+    "user": lambda db, user, movie, limit: helpers.get_ratings(db, limit = limit, user_Id = user, as_rows = True),
+    "movie": lambda db, user, movie, limit: helpers.get_ratings(db, limit = limit, movies_Id = movie, as_rows = True),
+    "movie min_rating": lambda db, user, movie, limit: helpers.get_ratings(db, limit = limit, movies_Id = movie, min_rating = 4.0,
+                                                                           as_rows = True),
+    "min_rating": lambda db, user, movie, limit: helpers.get_ratings(db, limit = limit, min_rating = 5.0, as_rows = True),
+    "rating stats": lambda db, user, movie, limit: helpers.get_rating_stats(db, movie),
+}
+
+
+def measure(db, query, keys: list, limit: int) -> float:
+    """ Median duration of a query over the keys, in milliseconds """
+    query(db, *keys[0], limit) # warm up
+    durations = []
+    for user, movie in keys:
+        start = time.perf_counter()
+        query(db, user, movie, limit)
+        durations.append(time.perf_counter() - start)
+    return 1000 * statistics.median(durations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare the ratings queries in SQL and on the ratings engine.")
+    parser.add_argument("--limit", type = int, default = 100, help = "Rows per page")
+    parser.add_argument("--repeat", type = int, default = 200, help = "Queries per measure")
+    args = parser.parse_args()
+
+    with SessionLocal() as db:
+        version = dataset.get_data_version(db)["version"]
+        path = ratings_engine.engine_path(settings.snapshot_dir, version)
+        start = time.perf_counter()
+        engine = ratings_engine.RatingsEngine(path, version)
+        print(f"engine opened in {1000 * (time.perf_counter() - start):.2f}ms ({len(engine.users):,} ratings, {path})")
+
+        generator = random.Random(0)
+        keys = [(int(generator.choice(engine.user_ids)), int(generator.choice(engine.movie_ids))) for _ in range(args.repeat)]
+        print(f"{'query':<18} {'SQL ms':>8} {'engine ms':>10} {'speed-up':>9}")
+        for name, query in QUERIES.items():
+            settings.ratings_engine = False
+            before = measure(db, query, keys, args.limit)
+            settings.ratings_engine = True
+            after = measure(db, query, keys, args.limit)
+            print(f"{name:<18} {before:>8.3f} {after:>10.3f} {before / after:>8.1f}x")
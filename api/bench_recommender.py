@@ -0,0 +1,86 @@
+""" Benchmark of the recommendation model: training time, then latency of the recommendations of random users
+
+Usage: python bench_recommender.py [--factors 32] [--iterations 10] [--requests 500] [--synthetic-ratings 25000000]
+
+The model is trained on the ratings of the database into a temporary directory and served from
+there. The latency is measured on the query helper (ratings of the user, scoring of every movie,
+top k, titles) and on its scoring step alone. With --synthetic-ratings, the training time is also
+measured on that many random ratings with MovieLens 25M proportions.
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from sqlalchemy import create_engine
+
+from database import SessionLocal, SQLALCHEMY_DATABASE_URL
+from ratings_io import read_ratings
+from settings import settings
+import recommender
+import train_recommender
+
+
+def percentiles(durations: list) -> str:
+    """ Median, 95th and 99th percentiles of durations in seconds, in milliseconds """
+    p50, p95, p99 = np.percentile(durations, (50, 95, 99)) * 1000
+    return f"p50 {p50:>7.2f}ms  p95 {p95:>7.2f}ms  p99 {p99:>7.2f}ms"
+
+
+def synthetic_ratings(count: int, users: int = 162_541, movies: int = 59_047, seed: int = 0) -> tuple:
+    """ Random ratings with the numbers of users and movies of MovieLens 25M and skewed popularities """
+    generator = np.random.default_rng(seed)
+    user_ids = (generator.pareto(1.5, count) * users / 20).astype(np.int64) % users + 1
+    movie_ids = (generator.pareto(1.0, count) * movies / 50).astype(np.int64) % movies + 1
+    ratings = generator.integers(1, 11, count).astype(np.float32) / 2
+    return user_ids.astype(np.int32), movie_ids.astype(np.int32), ratings
+
+
+def time_training(name: str, users, movies, ratings, args) -> dict:
+    start = time.perf_counter()
+    model = train_recommender.train(users, movies, ratings, args.factors, args.iterations, workers = args.workers, verbose = False)
+    elapsed = time.perf_counter() - start
+    print(f"train {name:<10} {len(ratings):>12,} ratings  {elapsed:>8.2f}s  {elapsed / args.iterations:>6.2f}s/iteration  "
+          f"{len(model['user_ids']):,} users x {len(model['item_ids']):,} movies")
+    return model
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Measure the training time and the request latency of the recommendation model.")
+    parser.add_argument("--factors", type = int, default = train_recommender.DEFAULT_FACTORS, help = "Number of latent factors")
+    parser.add_argument("--iterations", type = int, default = train_recommender.DEFAULT_ITERATIONS, help = "ALS iterations")
+    parser.add_argument("--workers", type = int, default = None, help = "Training threads (default: number of CPUs)")
+    parser.add_argument("--requests", type = int, default = 500, help = "Recommendations measured")
+    parser.add_argument("--k", type = int, default = 10, help = "Recommended movies per request")
+    parser.add_argument("--synthetic-ratings", type = int, default = 0, help = "Also train on that many random ratings")
+    args = parser.parse_args()
+
+    engine = create_engine(SQLALCHEMY_DATABASE_URL)
+    users, movies, ratings = read_ratings(engine)
+    engine.dispose()
+    model = time_training("database", users, movies, ratings, args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        settings.model_dir = Path(directory)
+        train_recommender.save_model(Path(directory), "bench", model)
+        sample = np.random.default_rng(0).choice(model["user_ids"], args.requests)
+        with SessionLocal() as db:
+            recommender.recommend(db, int(sample[0]), k = args.k) # warm up: opens the model
+            served = recommender.get_model(db)
+            durations, scoring = [], []
+            for user_id in sample:
+                start = time.perf_counter()
+                recommender.recommend(db, int(user_id), k = args.k)
+                durations.append(time.perf_counter() - start)
+
+                user = np.searchsorted(served["user_ids"], user_id)
+                start = time.perf_counter()
+                scores = served["item_factors"] @ served["user_factors"][user] + served["item_bias"]
+                np.argpartition(-scores, args.k - 1)[:args.k]
+                scoring.append(time.perf_counter() - start)
+        print(f"recommend  {percentiles(durations)}  ({args.requests} users, k={args.k})")
+        print(f"scoring    {percentiles(scoring)}  (matrix-vector product + argpartition over {len(served['item_ids']):,} movies)")
+
+    if args.synthetic_ratings:
+        time_training("synthetic", *synthetic_ratings(args.synthetic_ratings), args)
@@ -0,0 +1,68 @@
+""" Benchmark of the list endpoints serialization: ORM objects validated by the response model vs plain rows
+
+Usage: python bench_serialization.py [--limit 1000] [--repeat 50]
+
+For each list endpoint, a page is built the way the endpoint used to (ORM objects, validated and
+dumped through the pydantic response model, then encoded by json) and the way it does now
+(column tuples encoded directly by serialization.encode_rows), on the same database.
+"""
+import argparse
+import json
+import statistics
+import time
+from typing import List
+
+from pydantic import TypeAdapter
+
+from database import SessionLocal
+import models
+import query_helpers as helpers
+import schemas
+import serialization
+
+ENDPOINTS = {
+    "/movies": (helpers.get_movies, models.Movie, schemas.MovieSimple),
+    "/ratings": (helpers.get_ratings, models.Rating, schemas.RatingSimple),
+    "/tags": (helpers.get_tags, models.Tag, schemas.TagSimple),
+    "/links": (helpers.get_links, models.Link, schemas.LinkSimple),
+}
+
+
+def validated_page(db, fetch, schema, limit: int) -> bytes:
+    """ Page encoded like a FastAPI response model: ORM objects -> validation -> JSON compatible data -> json """
+    adapter = TypeAdapter(List[schema])
+    items = adapter.validate_python(fetch(db, limit = limit), from_attributes = True)
+    return json.dumps(adapter.dump_python(items, mode = "json"), separators = (",", ":")).encode()
+
+
+def rows_page(db, fetch, model, limit: int) -> bytes:
+    """ Page encoded by the fast path: column tuples -> JSON """
+    keys = [column.key for column in helpers.get_columns(model)]
+    return serialization.encode_rows(keys, fetch(db, limit = limit, as_rows = True))
+
+
+def measure(build, repeat: int) -> float:
+    """ Median duration of a page build, in milliseconds """
+    build() # warm up
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        build()
+        durations.append(time.perf_counter() - start)
+    return 1000 * statistics.median(durations)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description = "Compare the serialization of the list endpoints before and after the fast path.")
+    parser.add_argument("--limit", type = int, default = 1000, help = "Rows per page")
+    parser.add_argument("--repeat", type = int, default = 50, help = "Pages built per measure")
+    args = parser.parse_args()
+
+    print(f"encoder: {'orjson' if serialization.orjson is not None else 'json'}, {args.limit} rows per page")
+    print(f"{'endpoint':<10} {'validated ms':>13} {'rows ms':>9} {'speed-up':>9}")
+    with SessionLocal() as db:
+        for path, (fetch, model, schema) in ENDPOINTS.items():
+            assert json.loads(validated_page(db, fetch, schema, args.limit)) == json.loads(rows_page(db, fetch, model, args.limit))
+            before = measure(lambda: validated_page(db, fetch, schema, args.limit), args.repeat)
+            after = measure(lambda: rows_page(db, fetch, model, args.limit), args.repeat)
+            print(f"{path:<10} {before:>13.2f} {after:>9.2f} {before / after:>8.1f}x")
@@ -0,0 +1,166 @@
+""" Offline build of the movie_similarity table: the k nearest neighbours of every movie by item-item similarity of the ratings"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import create_engine
+
+from database import Base, SQLALCHEMY_DATABASE_URL
+from ratings_io import read_ratings
+import models
+
+# Neighbours stored per movie, the largest k served by /movies/{movies_Id}/similar
+DEFAULT_NEIGHBOURS = 100
+# Movies compared with all the others by each task of the process pool
+DEFAULT_BLOCK_SIZE = 256
+# Movies with fewer ratings are left out, as sources and as neighbours: their similarities are noise
+DEFAULT_MIN_RATINGS = 5
+
+# "cosine": cosine of the rating vectors of two movies
+# "adjusted": adjusted cosine, the ratings are first centered on the mean rating of each user
+METRICS = ("cosine", "adjusted")
+
+
+def rating_matrix(users: np.ndarray, movies: np.ndarray, ratings: np.ndarray, metric: str = "cosine",
+                  min_ratings: int = DEFAULT_MIN_RATINGS) -> tuple:
+    """ Build the sparse movie x user matrix of the ratings with L2-normalized rows
+
+    The product of two normalized rows is the cosine similarity of the two movies.
+    Return the IDs of the movies of the rows and the CSR matrix (float32 values, int32 indices).
+    """
+    movie_ids, movie_index = np.unique(movies, return_inverse = True)
+    user_ids, user_index = np.unique(users, return_inverse = True)
+    values = ratings
+    if metric == "adjusted":
+        user_means = np.bincount(user_index, weights = ratings) / np.bincount(user_index)
+        values = (ratings - user_means[user_index]).astype(np.float32)
+
+    matrix = sparse.csr_matrix((values, (movie_index.astype(np.int32), user_index.astype(np.int32))),
+                               shape = (len(movie_ids), len(user_ids)), dtype = np.float32)
+    keep = np.diff(matrix.indptr) >= min_ratings
+    matrix, movie_ids = matrix[keep], movie_ids[keep]
+
+    norms = np.sqrt(np.asarray(matrix.multiply(matrix).sum(axis = 1)).ravel())
+    norms[norms == 0] = 1.0
+    matrix = sparse.csr_matrix(sparse.diags((1.0 / norms).astype(np.float32)) @ matrix)
+    matrix.eliminate_zeros()
+    return movie_ids, matrix
+
+
+# --- Process pool: the workers share the matrices through memory-mapped files ---
+
+MATRIX_PARTS = ("data", "indices", "indptr", "shape")
+
+_matrices = {}
+
+
+def _save_matrix(directory: Path, name: str, matrix):
+    """ Save the arrays of a CSR matrix as .npy files, to be memory-mapped by the workers """
+    arrays = {"data": matrix.data, "indices": matrix.indices.astype(np.int32),
+              "indptr": matrix.indptr.astype(np.int64), "shape": np.array(matrix.shape)}
+    for part in MATRIX_PARTS:
+        np.save(directory / f"{name}.{part}.npy", arrays[part])
+
+
+def _open_matrices(directory: str):
+    """ Initializer of the workers: map the normalized matrix ("rows") and its transpose ("columns") """
+    for name in ("rows", "columns"):
+        data, indices, indptr, shape = (np.load(Path(directory) / f"{name}.{part}.npy", mmap_mode = "r") for part in MATRIX_PARTS)
+        _matrices[name] = sparse.csr_matrix((data, indices, indptr), shape = tuple(shape), copy = False)
+
+
+def top_neighbours(start: int, stop: int, k: int) -> tuple:
+    """ Neighbours of the movies of the rows [start, stop): their similarity with every movie, then the top k
+
+    Return the column indices and the similarities of the neighbours, one row per movie, most similar first.
+    """
+    similarities = (_matrices["rows"][start:stop] @ _matrices["columns"]).toarray()
+    block = np.arange(stop - start)
+    # A movie is not its own neighbour
+    similarities[block, start + block] = -np.inf
+    k = min(k, similarities.shape[1] - 1)
+    if k <= 0:
+        return np.empty((stop - start, 0), np.int64), np.empty((stop - start, 0), np.float32)
+    top = np.argpartition(-similarities, k - 1, axis = 1)[:, :k]
+    values = np.take_along_axis(similarities, top, axis = 1)
+    order = np.argsort(-values, axis = 1, kind = "stable")
+    return np.take_along_axis(top, order, axis = 1), np.take_along_axis(values, order, axis = 1)
+
+
+def build(database_url: str = SQLALCHEMY_DATABASE_URL, metric: str = "cosine", k: int = DEFAULT_NEIGHBOURS,
+          block_size: int = DEFAULT_BLOCK_SIZE, min_ratings: int = DEFAULT_MIN_RATINGS,
+          workers: int = None, verbose: bool = True) -> int:
+    """ Rebuild movie_similarity from the ratings and return the number of stored neighbours
+
+    The blocks of movies are compared with every movie on a process pool. Only the normalized
+    matrix, its transpose (shared by the workers through memory-mapped files) and one dense block
+    of similarities per worker are held in memory. The table is replaced in a single transaction,
+    which also records the build time in dataset_meta: it is part of the ETag of /movies/{movies_Id}/similar,
+    whose responses change while the dataset version stays the same.
+    """
+    if metric not in METRICS:
+        raise ValueError(f"metric must be one of {', '.join(METRICS)}, got '{metric}'")
+    engine = create_engine(database_url)
+    table = models.MovieSimilarity.__table__
+    meta = models.DatasetMeta.__table__
+    try:
+        start = time.perf_counter()
+        users, movies, ratings = read_ratings(engine)
+        movie_ids, matrix = rating_matrix(users, movies, ratings, metric, min_ratings)
+        del users, movies, ratings
+        if verbose:
+            print(f"{'matrix':<14} {matrix.shape[0]:>9,} movies x {matrix.shape[1]:,} users, {matrix.nnz:,} ratings "
+                  f"{time.perf_counter() - start:>8.2f}s")
+
+        start = time.perf_counter()
+        count = 0
+        with tempfile.TemporaryDirectory() as directory:
+            _save_matrix(Path(directory), "rows", matrix)
+            _save_matrix(Path(directory), "columns", matrix.T.tocsr())
+            del matrix
+
+            Base.metadata.create_all(engine, tables = [table, meta])
+            starts = list(range(0, len(movie_ids), block_size))
+            stops = [min(begin + block_size, len(movie_ids)) for begin in starts]
+            with engine.begin() as conn, \
+                    ProcessPoolExecutor(workers or os.cpu_count(), initializer = _open_matrices, initargs = (directory,)) as pool:
+                conn.execute(table.delete())
+                for begin, (neighbours, similarities) in zip(starts, pool.map(top_neighbours, starts, stops, [k] * len(starts))):
+                    rows = [
+                        {"moviesId": int(movie_ids[begin + row]), "rank": rank + 1,
+                         "similarMoviesId": int(movie_ids[neighbour]), "similarity": float(similarity)}
+                        for row in range(len(neighbours))
+                        for rank, (neighbour, similarity) in enumerate(zip(neighbours[row], similarities[row]))
+                        if similarity > 0
+                    ]
+                    if rows:
+                        conn.execute(table.insert(), rows)
+                        count += len(rows)
+                conn.execute(meta.delete().where(meta.c.key == "similarity_built_at"))
+                conn.execute(meta.insert().values(key = "similarity_built_at", value = str(int(time.time()))))
+        if verbose:
+            elapsed = time.perf_counter() - start
+            print(f"{'similarity':<14} {count:>12,} rows {elapsed:>8.2f}s {len(movie_ids) / max(elapsed, 1e-9):>14,.0f} movies/s")
+    finally:
+        engine.dispose()
+    return count
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the table of the most similar movies from the ratings.")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL, help="SQLAlchemy URL of the database")
+    parser.add_argument("--metric", choices=METRICS, default="cosine", help="Cosine or adjusted cosine (centered on the user means)")
+    parser.add_argument("--neighbours", type=int, default=DEFAULT_NEIGHBOURS, help="Neighbours stored per movie")
+    parser.add_argument("--block-size", type=int, default=DEFAULT_BLOCK_SIZE, help="Movies per task of the process pool")
+    parser.add_argument("--min-ratings", type=int, default=DEFAULT_MIN_RATINGS, help="Minimum number of ratings of a movie")
+    parser.add_argument("--workers", type=int, default=None, help="Processes of the pool (default: number of CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build(args.database_url, args.metric, args.neighbours, args.block_size, args.min_ratings, args.workers)
+    print(f"Similarity built in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,41 @@
+""" Fixtures of the API tests: a database built by the loader from the CSV files, served by TestClient
+
+The settings are read from the environment when the API modules are imported, so the environment
+points them to a temporary directory before any test module imports them.
+"""
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+import pytest
+
+# Scripts querying movies.db when imported, to run by hand: they are not collected as tests
+collect_ignore = ["test_models.py", "test_query_helpers.py"]
+
+TEST_DIRECTORY = Path(tempfile.mkdtemp(prefix="movies-api-tests-"))
+os.environ.update({
+    "DATABASE_URL": f"sqlite:///{TEST_DIRECTORY / 'movies.db'}",
+    "SNAPSHOT_DIR": str(TEST_DIRECTORY / "snapshots"),
+    "MODEL_DIR": str(TEST_DIRECTORY / "recommender"),
+    "DB_MODE": "sync",
+    "DB_READ_ONLY": "false",
+    "RATINGS_ENGINE": "false",
+})
+
+
+@pytest.fixture(scope="session")
+def database_url():
+    import load_data
+    database_url = os.environ["DATABASE_URL"]
+    load_data.load(database_url, verbose=False)
+    yield database_url
+    shutil.rmtree(TEST_DIRECTORY, ignore_errors=True)
+
+
+@pytest.fixture(scope="session")
+def client(database_url):
+    from fastapi.testclient import TestClient
+    import main
+    with TestClient(main.app) as client:
+        yield client
@@ -1,19 +1,97 @@
 """ Database configuration"""
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import URL, make_url
 from sqlalchemy.orm import declarative_base 
 from sqlalchemy.orm import sessionmaker
+from settings import settings
 
-SQLALCHEMY_DATABASE_URL = "sqlite:///./movies.db" # The database from our directory
+SQLALCHEMY_DATABASE_URL = settings.database_url # movies.db next to this file unless DATABASE_URL is set
 
-## Create a database engine which establishes the connection with our SQLite database (movies.db)
+# Async drivers used for each database backend when DB_MODE=async
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+}
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
-)
+def async_database_url(url) -> URL:
+    """ Return the URL of the same database with the async driver of its backend """
+    url = make_url(url)
+    return url.set(drivername = ASYNC_DRIVERS[url.get_backend_name()])
+
+def sqlite_read_only_url(url) -> URL:
+    """ Return the URL opening a SQLite file read-only and immutable (no locking, no change detection) """
+    url = make_url(url)
+    return url.set(database = f"file:{url.database}", query = {**url.query, "mode": "ro", "immutable": "1", "uri": "true"})
+
+def sqlite_pragmas() -> list:
+    """ Performance settings applied to every SQLite connection """
+    pragmas = [
+        f"PRAGMA mmap_size = {settings.sqlite_mmap_size}",
+        f"PRAGMA cache_size = {settings.sqlite_cache_size}",
+        "PRAGMA temp_store = MEMORY",
+    ]
+    if not settings.db_read_only:
+        # WAL lets readers run while the database is written; it cannot be set on a read-only file
+        pragmas += ["PRAGMA journal_mode = WAL", "PRAGMA synchronous = NORMAL"]
+    return pragmas
+
+def is_sqlite_memory(url) -> bool:
+    """ Tell whether a SQLite URL opens an in-memory database (sqlite://, :memory: or mode=memory) """
+    url = make_url(url)
+    return url.get_backend_name() == "sqlite" and (
+        url.database in (None, "", ":memory:") or url.query.get("mode") == "memory")
+
+def engine_options(url) -> tuple:
+    """ Return the URL and the create_engine options for the backend of the URL """
+    url = make_url(url)
+    options = {}
+    if not is_sqlite_memory(url):
+        # SQLAlchemy serves an in-memory SQLite database from a single connection (SingletonThreadPool
+        # or StaticPool), which rejects the options of a QueuePool
+        options.update({
+            "pool_size": settings.db_pool_size,
+            "max_overflow": settings.db_max_overflow,
+            "pool_timeout": settings.db_pool_timeout,
+        })
+    if url.get_backend_name() == "sqlite":
+        if settings.db_read_only and not is_sqlite_memory(url):
+            url = sqlite_read_only_url(url)
+        options["connect_args"] = {"check_same_thread": False}
+    else:
+        # Server databases: recycle old connections and check them before use
+        options.update({"pool_recycle": settings.db_pool_recycle, "pool_pre_ping": True})
+    return url, options
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    """ Run the SQLite pragmas on each new connection """
+    cursor = dbapi_connection.cursor()
+    for pragma in sqlite_pragmas():
+        cursor.execute(pragma)
+    cursor.close()
+
+## Create a database engine which establishes the connection with our database (movies.db by default)
+
+_url, _options = engine_options(SQLALCHEMY_DATABASE_URL)
+engine = create_engine(_url, **_options)
+if engine.dialect.name == "sqlite":
+    event.listen(engine, "connect", _apply_sqlite_pragmas)
 
 # Define SessionLocal, which allow to create the sessions for interacting with the database
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+# The async engine is only created in async mode, so the sync mode does not need the async drivers
+async_engine = None
+AsyncSessionLocal = None
+if settings.db_mode == "async":
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+    _async_url, _async_options = engine_options(async_database_url(SQLALCHEMY_DATABASE_URL))
+    _async_options.pop("connect_args", None)
+    async_engine = create_async_engine(_async_url, **_async_options)
+    if async_engine.dialect.name == "sqlite":
+        event.listen(async_engine.sync_engine, "connect", _apply_sqlite_pragmas)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush = False, expire_on_commit = False)
+
 # Define Base class for SQLAlchemy modles to inherit from
 Base = declarative_base()
 
@@ -23,4 +101,3 @@ Base = declarative_base()
 #             print("Database connection successful.")
 #     except Exception as e:
 #         print(f"Database connection failed: {e}")
-
@@ -0,0 +1,48 @@
+""" Version of the loaded dataset, used to invalidate what is computed from the data
+
+The loader writes the version and the load time of the dataset. The offline builds of derived
+data which do not change the version (build_similarity.py) write their build time next to them.
+"""
+import threading
+import time
+from typing import Optional
+from sqlalchemy.orm import Session
+import models
+
+# Number of seconds during which the version read from the database is reused
+VERSION_TTL = 5.0
+
+_lock = threading.Lock()
+_cached = {"version": None, "loaded_at": None, "similarity_built_at": None, "checked_at": float("-inf")}
+
+# Keys of dataset_meta holding a time (seconds since the epoch), returned as integers
+TIME_KEYS = ("loaded_at", "similarity_built_at")
+
+def get_data_version(db: Session) -> dict:
+    """ Return the version, load time and similarity build time of the dataset, read from dataset_meta at most every VERSION_TTL seconds """
+    cached = cached_data_version()
+    if cached is not None:
+        return cached
+
+    now = time.monotonic()
+    meta = dict(db.query(models.DatasetMeta.key, models.DatasetMeta.value).all())
+    with _lock:
+        _cached["version"] = meta.get("version")
+        for key in TIME_KEYS:
+            _cached[key] = int(meta[key]) if meta.get(key) else None
+        _cached["checked_at"] = now
+    return _data_version()
+
+def _data_version() -> dict:
+    return {"version": _cached["version"], **{key: _cached[key] for key in TIME_KEYS}}
+
+def cached_data_version() -> Optional[dict]:
+    """ Return the version and times of the dataset if read less than VERSION_TTL seconds ago, None otherwise """
+    if time.monotonic() - _cached["checked_at"] < VERSION_TTL:
+        return _data_version()
+    return None
+
+def reset():
+    """ Forget the cached version, so the next call reads it from the database """
+    with _lock:
+        _cached["checked_at"] = float("-inf")
@@ -0,0 +1,55 @@
+""" HTTP conditional caching of the read endpoints, keyed by the version of the loaded dataset"""
+import hashlib
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Optional
+
+# Paths whose responses do not depend on the dataset: health check and documentation
+UNVERSIONED_PATHS = {"/", "/docs", "/docs/oauth2-redirect", "/redoc", "/openapi.json"}
+
+
+def make_etag(version: str, path: str, query: str, accept: str, built_at: Optional[int] = None) -> str:
+    """ Build the strong ETag of a response: the same dataset, URL and Accept header give the same body
+
+    `built_at` is the build time of the data derived offline that the response is made of, if any.
+    """
+    digest = hashlib.blake2b(digest_size = 16)
+    for part in (version, path, query, accept, str(built_at or "")):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return f'"{version}-{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str, wildcard: bool = True) -> bool:
+    """ Tell whether an If-None-Match header lists the ETag (weak comparison, as required for GET)
+
+    "*" matches any current representation, unless wildcard is False.
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return wildcard
+    candidates = (candidate.strip() for candidate in if_none_match.split(","))
+    return etag in (candidate[2:] if candidate.startswith("W/") else candidate for candidate in candidates)
+
+
+def not_modified_since(if_modified_since: Optional[str], loaded_at: Optional[int]) -> bool:
+    """ Tell whether the dataset was loaded before the date of an If-Modified-Since header """
+    if not if_modified_since or loaded_at is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return since.tzinfo is not None and loaded_at <= since.timestamp()
+
+
+def cache_headers(etag: str, loaded_at: Optional[int], max_age: int) -> dict:
+    """ Validators and caching policy sent with every versioned response """
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}",
+        "Vary": "Accept",
+    }
+    if loaded_at is not None:
+        headers["Last-Modified"] = formatdate(loaded_at, usegmt = True)
+    return headers
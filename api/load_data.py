@@ -0,0 +1,403 @@
+""" Bulk loader that (re)builds the database from the MovieLens CSV files"""
+import argparse
+import csv
+import hashlib
+import itertools
+import operator
+import os
+import time
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.schema import CreateTable
+
+from database import Base, SQLALCHEMY_DATABASE_URL
+from settings import default_snapshot_dir, settings
+import models
+import query_helpers as helpers
+import ratings_engine
+import snapshots
+
+DEFAULT_DATA_DIR = Path(__file__).resolve().parent.parent / "data"
+DEFAULT_CHUNK_SIZE = 50_000
+# Ratings turned into NumPy arrays at once while building the user profiles
+USER_STATS_CHUNK_SIZE = 1_000_000
+
+# --- CSV file loaded into each table, in foreign key order ---
+
+CSV_FILES = [
+    ("movies.csv", models.Movie),
+    ("ratings.csv", models.Rating),
+    ("tags.csv", models.Tag),
+    ("links.csv", models.Link),
+]
+
+# Placeholder used by MovieLens for the movies without genre
+NO_GENRE = "(no genres listed)"
+
+# The MovieLens files use "movieId" where our models use "moviesId"
+CSV_COLUMN_ALIASES = {"movieId": "moviesId"}
+
+# Settings only used while loading: no rollback journal, no fsync, big page cache
+SQLITE_LOAD_PRAGMAS = [
+    "PRAGMA journal_mode = OFF",
+    "PRAGMA synchronous = OFF",
+    "PRAGMA locking_mode = EXCLUSIVE",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -262144",
+]
+
+
+def _converter(column):
+    """ Build the function that turns a CSV field into a value for the given column """
+    python_type = column.type.python_type
+    if python_type is str:
+        return str
+
+    def convert(value):
+        return python_type(value) if value != "" else None
+
+    return convert
+
+
+def _read_rows(path: Path, table, positional: bool):
+    """ Stream the rows of a CSV file, converted to the types and order of the table insert """
+    with open(path, newline="", encoding="utf-8") as csv_file:
+        reader = csv.reader(csv_file)
+        header = [CSV_COLUMN_ALIASES.get(name, name) for name in next(reader)]
+        converters = [_converter(table.c[name]) for name in header]
+
+        if positional:
+            # Re-order the CSV fields to the column order of the compiled INSERT statement
+            order = [header.index(column.name) for column in table.columns]
+            if order == list(range(len(header))):
+                for fields in reader:
+                    yield tuple(map(operator.call, converters, fields))
+            else:
+                for fields in reader:
+                    yield tuple(converters[i](fields[i]) for i in order)
+        else:
+            for fields in reader:
+                yield {name: convert(value) for name, convert, value in zip(header, converters, fields)}
+
+
+def _chunks(rows, chunk_size: int):
+    """ Split an iterator of rows into lists of at most chunk_size rows """
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _target_path(database_url: str):
+    """ Return the file of a SQLite database URL, None for other databases """
+    url = make_url(database_url)
+    if url.get_backend_name() != "sqlite" or url.database in (None, "", ":memory:"):
+        return None
+    return Path(url.database)
+
+
+def split_genres(genres: str) -> list:
+    """ Split a pipe separated genres string into the lower-cased genre names """
+    if not genres or genres == NO_GENRE:
+        return []
+    return sorted({genre.strip().lower() for genre in genres.split("|") if genre.strip()})
+
+
+# --- Tables derived from the loaded data ---
+
+def _insert_rows(raw_connection, dialect, table, rows: list) -> int:
+    """ Insert rows given as dictionaries into a table with a single executemany call """
+    compiled = table.insert().compile(dialect=dialect)
+    if compiled.positional:
+        rows = [tuple(row[column.name] for column in table.columns) for row in rows]
+    cursor = raw_connection.cursor()
+    cursor.executemany(str(compiled), rows)
+    raw_connection.commit()
+    cursor.close()
+    return len(rows)
+
+
+def build_movie_genres(raw_connection, dialect) -> int:
+    """ Fill the movie <-> genre mapping from the genres of the loaded movies """
+    cursor = raw_connection.cursor()
+    cursor.execute('SELECT "moviesId", genres FROM movies')
+    movies = cursor.fetchall()
+    cursor.close()
+    rows = [{"genre": genre, "moviesId": movies_id} for movies_id, genres in movies for genre in split_genres(genres)]
+    return _insert_rows(raw_connection, dialect, models.MovieGenre.__table__, rows)
+
+
+def build_movie_stats(raw_connection, dialect) -> int:
+    """ Fill the statistics of every movie from a single grouped pass over the ratings """
+    cursor = raw_connection.cursor()
+    cursor.execute(
+        'SELECT "moviesId", COUNT(*), SUM(rating), SUM(rating * rating), MAX(timestamp) '
+        'FROM ratings GROUP BY "moviesId"'
+    )
+    aggregates = cursor.fetchall()
+    cursor.close()
+    count = sum(row[1] for row in aggregates)
+    prior_mean = sum(row[2] for row in aggregates) / count if count else 0.0
+    rows = [helpers.compute_movie_stats(*row, prior_mean=prior_mean) for row in aggregates]
+    return _insert_rows(raw_connection, dialect, models.MovieStats.__table__, rows)
+
+
+def build_user_stats(raw_connection, dialect, chunk_size: int = USER_STATS_CHUNK_SIZE) -> int:
+    """ Fill the profile of every user from a single pass over the ratings and a grouped pass over the tags
+
+    The ratings are read by chunks turned into NumPy arrays indexed by userId: the histogram, the
+    activity bounds and the (user, genre) counts and sums are accumulated with bincount, instead of
+    a join with movie_genres grouped by user and genre, which sorts one row per rating and genre.
+    """
+    cursor = raw_connection.cursor()
+    cursor.execute('SELECT MAX("userId") FROM ratings')
+    users = (cursor.fetchone()[0] or 0) + 1
+    cursor.execute('SELECT genre, "moviesId" FROM movie_genres')
+    mapping = cursor.fetchall()
+    genre_names = sorted({genre for genre, _ in mapping})
+    movie_genres = np.zeros((max((movies_id for _, movies_id in mapping), default=0) + 1, len(genre_names)), dtype=bool)
+    genre_index = {genre: index for index, genre in enumerate(genre_names)}
+    for genre, movies_id in mapping:
+        movie_genres[movies_id, genre_index[genre]] = True
+
+    half_stars = np.zeros((users, 11), dtype=np.int64) # 0.0, 0.5, ... 5.0
+    first_activity = np.full(users, np.iinfo(np.int64).max, dtype=np.int64)
+    last_activity = np.full(users, np.iinfo(np.int64).min, dtype=np.int64)
+    genre_counts = np.zeros((users, len(genre_names)), dtype=np.int64)
+    genre_sums = np.zeros((users, len(genre_names)), dtype=np.float64)
+
+    cursor.execute('SELECT "userId", "moviesId", rating, timestamp FROM ratings')
+    for rows in iter(lambda: cursor.fetchmany(chunk_size), []):
+        chunk = np.array(rows, dtype=np.float64)
+        user_ids = chunk[:, 0].astype(np.int64)
+        movie_ids = chunk[:, 1].astype(np.int64)
+        timestamps = chunk[:, 3].astype(np.int64)
+        half_stars += np.bincount(user_ids * 11 + np.rint(chunk[:, 2] * 2).astype(np.int64), minlength=users * 11).reshape(users, 11)
+        np.minimum.at(first_activity, user_ids, timestamps)
+        np.maximum.at(last_activity, user_ids, timestamps)
+        member = movie_genres[movie_ids.clip(max=len(movie_genres) - 1)] & (movie_ids < len(movie_genres))[:, None]
+        for index in range(len(genre_names)):
+            rated = member[:, index]
+            genre_counts[:, index] += np.bincount(user_ids[rated], minlength=users)
+            genre_sums[:, index] += np.bincount(user_ids[rated], weights=chunk[rated, 2], minlength=users)
+
+    tags = {}
+    cursor.execute('SELECT "userId", COUNT(*), MIN(timestamp), MAX(timestamp) FROM tags GROUP BY "userId"')
+    for user_id, count, first, last in cursor:
+        tags[user_id] = (count, first, last)
+    cursor.close()
+
+    # Users with ratings or tags: some users of the tags may have no rating
+    rows = []
+    for user_id in sorted(set(np.flatnonzero(half_stars.sum(axis=1)).tolist()) | set(tags)):
+        histogram, genres, activity = {}, [], []
+        if user_id < users and half_stars[user_id].any():
+            histogram = {index / 2: int(count) for index, count in enumerate(half_stars[user_id]) if count}
+            genres = [(name, int(genre_counts[user_id, index]), float(genre_sums[user_id, index]))
+                      for index, name in enumerate(genre_names) if genre_counts[user_id, index]]
+            activity = [int(first_activity[user_id]), int(last_activity[user_id])]
+        tag_count, *tag_activity = tags.get(user_id, (0,))
+        activity += tag_activity
+        rows.append(helpers.compute_user_stats(user_id, histogram, min(activity, default=None), max(activity, default=None),
+                                               tag_count, genres))
+    return _insert_rows(raw_connection, dialect, models.UserStats.__table__, rows)
+
+
+DERIVED_TABLES = [
+    (models.MovieGenre, build_movie_genres),
+    (models.MovieStats, build_movie_stats),
+    (models.UserStats, build_user_stats),
+]
+
+
+# --- Full-text index over the titles (SQLite FTS5) ---
+
+# External content table: the index reads the titles from the movies table and is kept in sync by triggers
+TITLE_SEARCH_DDL = [
+    "DROP TABLE IF EXISTS movies_fts",
+    """CREATE VIRTUAL TABLE movies_fts USING fts5(
+        title, content='movies', content_rowid='moviesId',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS movies_fts_insert AFTER INSERT ON movies BEGIN
+        INSERT INTO movies_fts(rowid, title) VALUES (new."moviesId", new.title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS movies_fts_delete AFTER DELETE ON movies BEGIN
+        INSERT INTO movies_fts(movies_fts, rowid, title) VALUES ('delete', old."moviesId", old.title);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS movies_fts_update AFTER UPDATE ON movies BEGIN
+        INSERT INTO movies_fts(movies_fts, rowid, title) VALUES ('delete', old."moviesId", old.title);
+        INSERT INTO movies_fts(rowid, title) VALUES (new."moviesId", new.title);
+    END""",
+    "INSERT INTO movies_fts(movies_fts) VALUES ('rebuild')",
+    "INSERT INTO movies_fts(movies_fts) VALUES ('optimize')",
+]
+
+
+def build_title_search(raw_connection):
+    """ Build the FTS5 index of the movie titles once the movies are loaded """
+    cursor = raw_connection.cursor()
+    for statement in TITLE_SEARCH_DDL:
+        cursor.execute(statement)
+    raw_connection.commit()
+    cursor.close()
+
+
+def load_table(raw_connection, dialect, table, path: Path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """ Insert a CSV file into a table with chunked executemany calls, in a single transaction """
+    compiled = table.insert().compile(dialect=dialect)
+    sql = str(compiled)
+    rows = _read_rows(path, table, positional=compiled.positional)
+
+    cursor = raw_connection.cursor()
+    count = 0
+    for chunk in _chunks(rows, chunk_size):
+        cursor.executemany(sql, chunk)
+        count += len(chunk)
+    raw_connection.commit()
+    cursor.close()
+    return count
+
+
+def dataset_version(data_dir: Path) -> str:
+    """ Derive the version of the dataset from the name, size and modification time of the CSV files """
+    digest = hashlib.sha256()
+    for file_name, _ in CSV_FILES:
+        stat = (data_dir / file_name).stat()
+        digest.update(f"{file_name}:{stat.st_size}:{stat.st_mtime_ns};".encode())
+    return digest.hexdigest()[:16]
+
+
+def _report(name: str, count: int, elapsed: float):
+    """ Print the loading speed of a table """
+    print(f"{name:<14} {count:>12,} rows {elapsed:>8.2f}s {count / max(elapsed, 1e-9):>14,.0f} rows/s")
+
+
+def load(database_url: str = SQLALCHEMY_DATABASE_URL, data_dir: Path = DEFAULT_DATA_DIR,
+         chunk_size: int = DEFAULT_CHUNK_SIZE, verbose: bool = True,
+         snapshot_dir: Optional[Path] = None, build_snapshots: bool = True) -> dict:
+    """ Rebuild every table from the CSV files and return the loading statistics per table
+
+    A SQLite database is built next to the target file and moved in place once complete,
+    so a running API never sees a half loaded database. The Arrow and Parquet snapshots and the
+    ratings engine snapshot of the new version are written before the switch, and those of
+    older versions deleted after.
+    """
+    data_dir = Path(data_dir)
+    version = dataset_version(data_dir)
+    if snapshot_dir is None:
+        # The snapshots of the API database go where the API serves them from (SNAPSHOT_DIR)
+        snapshot_dir = settings.snapshot_dir if database_url == settings.database_url else default_snapshot_dir(database_url)
+    snapshot_dir = Path(snapshot_dir)
+    target = _target_path(database_url)
+    if target is not None:
+        building = target.with_name(target.name + ".loading")
+        if building.exists():
+            building.unlink()
+        engine = create_engine(f"sqlite:///{building}")
+    else:
+        engine = create_engine(database_url)
+
+    # movie_similarity is created empty: it is filled offline by build_similarity.py
+    tables = ([model.__table__ for _, model in CSV_FILES] + [model.__table__ for model, _ in DERIVED_TABLES]
+              + [models.MovieSimilarity.__table__, models.DatasetMeta.__table__])
+    stats = {}
+    try:
+        # Tables are created without their secondary indexes, which are built once the data is in
+        Base.metadata.drop_all(engine, tables=tables)
+        with engine.begin() as conn:
+            for table in tables:
+                conn.execute(CreateTable(table))
+
+        raw_connection = engine.raw_connection()
+        try:
+            if engine.dialect.name == "sqlite":
+                cursor = raw_connection.cursor()
+                for pragma in SQLITE_LOAD_PRAGMAS:
+                    cursor.execute(pragma)
+                cursor.close()
+
+            for file_name, model in CSV_FILES:
+                start = time.perf_counter()
+                count = load_table(raw_connection, engine.dialect, model.__table__, data_dir / file_name, chunk_size)
+                elapsed = time.perf_counter() - start
+                stats[model.__tablename__] = {"rows": count, "seconds": elapsed}
+                if verbose:
+                    _report(model.__tablename__, count, elapsed)
+
+            for model, build in DERIVED_TABLES:
+                start = time.perf_counter()
+                count = build(raw_connection, engine.dialect)
+                elapsed = time.perf_counter() - start
+                stats[model.__tablename__] = {"rows": count, "seconds": elapsed}
+                if verbose:
+                    _report(model.__tablename__, count, elapsed)
+
+            _insert_rows(raw_connection, engine.dialect, models.DatasetMeta.__table__, [
+                {"key": "version", "value": version},
+                {"key": "loaded_at", "value": str(int(time.time()))},
+            ])
+
+            if engine.dialect.name == "sqlite":
+                start = time.perf_counter()
+                build_title_search(raw_connection)
+                if verbose:
+                    print(f"{'movies_fts':<14} {'':>12} {time.perf_counter() - start:>13.2f}s")
+        finally:
+            raw_connection.close()
+
+        start = time.perf_counter()
+        with engine.begin() as conn:
+            for table in tables:
+                for index in table.indexes:
+                    index.create(conn)
+            conn.exec_driver_sql("ANALYZE")
+        if verbose:
+            print(f"{'indexes':<14} {'':>12} {time.perf_counter() - start:>13.2f}s")
+
+        if build_snapshots:
+            start = time.perf_counter()
+            built = snapshots.build_snapshots(engine, snapshot_dir, version)
+            if verbose:
+                if built is None:
+                    print("snapshots      skipped: pyarrow is not installed")
+                else:
+                    print(f"{'snapshots':<14} {'':>12} {time.perf_counter() - start:>13.2f}s  {snapshot_dir}")
+            # Snapshot of the ratings engine, opened by the API when RATINGS_ENGINE is set
+            start = time.perf_counter()
+            count = ratings_engine.build_snapshot(engine, snapshot_dir, version)
+            if verbose:
+                _report("ratings_engine", count, time.perf_counter() - start)
+    finally:
+        engine.dispose()
+
+    if target is not None:
+        # A write-ahead log left by the previous database must not be replayed into the new one
+        for suffix in ("-wal", "-shm"):
+            stale = target.with_name(target.name + suffix)
+            if stale.exists():
+                stale.unlink()
+        os.replace(building, target)
+    if build_snapshots:
+        snapshots.prune_snapshots(snapshot_dir)
+    return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the movies database from the MovieLens CSV files.")
+    parser.add_argument("--data-dir", type=Path, default=DEFAULT_DATA_DIR, help="Directory containing the MovieLens CSV files")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL, help="SQLAlchemy URL of the database to build")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Number of rows inserted per executemany call")
+    parser.add_argument("--snapshot-dir", type=Path, default=None,
+                        help="Directory of the Arrow, Parquet and ratings engine snapshots (default: SNAPSHOT_DIR, or next to the SQLite database)")
+    parser.add_argument("--no-snapshots", action="store_true", help="Do not build the Arrow and Parquet snapshots nor the ratings engine")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    load(args.database_url, args.data_dir, args.chunk_size, snapshot_dir=args.snapshot_dir, build_snapshots=not args.no_snapshots)
+    print(f"Database built in {time.perf_counter() - start:.2f}s")
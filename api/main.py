@@ -1,24 +1,219 @@
-from fastapi import FastAPI,Depends, HTTPException, Query, Path
-from sqlalchemy.orm import Session
+from fastapi import FastAPI,Depends, Header, HTTPException, Query, Path, Request, Response
+from fastapi.responses import FileResponse, StreamingResponse
+from fastapi.routing import APIRoute
+from starlette.routing import Match
+from contextlib import asynccontextmanager
+import collections
+import csv
+import io
+import itertools
+import json
+import logging
 from typing import List, Optional
-from database import SessionLocal
+from database import SessionLocal, AsyncSessionLocal
+from settings import settings
+import async_query_helpers as aio
+import dataset
+import http_cache
 import query_helpers as helpers
+import models
+import recommender
 import schemas
+import serialization
+import snapshots
+
+# Logger of the server, configured by uvicorn
+logger = logging.getLogger("uvicorn.error")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if serialization.orjson is None:
+        logger.warning("orjson is not installed: the JSON responses are encoded with the slower json module")
+    else:
+        logger.info("JSON responses encoded with %s", serialization.JSON_ENCODER)
+    yield
 
 # --- Initialize FastAPI app ---
 app = FastAPI(
     title="Movies API",
     description="An API to retrieve movie information, ratings, and tags.",
     version="0.1",
+    lifespan=lifespan,
 ) 
 
-# Dependency to get DB session
-def get_db():
+# Dependency to get DB session: an AsyncSession in async mode, a Session otherwise.
+# The endpoints run the query helpers through async_query_helpers, which accept both.
+async def get_db():
+    if settings.db_mode == "async":
+        async with AsyncSessionLocal() as db:
+            yield db
+        return
     db = SessionLocal()
     try:
         yield db
+    finally:
+        # Closed on the event loop: waiting for a threadpool slot while holding a pooled
+        # connection could starve the threads waiting for that connection
+        db.close()
+
+# Pagination with a cursor: the cursor of the next page is sent back in this header
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+# Conditional requests: the data only changes when the loader rebuilds the database, so every
+# GET response is identified by the dataset version, and a client holding the current version
+# gets a 304 from the cached version without any query
+
+async def current_data_version() -> dict:
+    """ Version and load time of the dataset, read from the database only when the cached ones expired """
+    cached = dataset.cached_data_version()
+    if cached is not None:
+        return cached
+    if settings.db_mode == "async":
+        async with AsyncSessionLocal() as db:
+            return await aio.get_data_version(db)
+    db = SessionLocal()
+    try:
+        return await aio.get_data_version(db)
     finally:
         db.close()
+
+# Endpoints serving data built offline after the load, without a new dataset version: the time of
+# the last build (or training of the model) is part of their ETag and Last-Modified
+BUILT_AT = {
+    "similar_movies": lambda data_version: data_version["similarity_built_at"],
+    "user_recommendations": lambda data_version: recommender.trained_at(data_version["version"]),
+}
+
+def built_at(data_version: dict, route: Optional[APIRoute]) -> Optional[int]:
+    """ Build time of the offline data served by an endpoint, None for the endpoints serving the loaded data """
+    return BUILT_AT[route.name](data_version) if route is not None and route.name in BUILT_AT else None
+
+def modified_at(data_version: dict, route: Optional[APIRoute]) -> Optional[int]:
+    """ Last time the data served by an endpoint changed: the load of the dataset or the later offline build """
+    return max(data_version["loaded_at"] or 0, built_at(data_version, route) or 0) or None
+
+def response_cache_headers(request: Request, data_version: dict, route: Optional[APIRoute] = None) -> dict:
+    """ ETag and caching headers of the response to a GET request for the current dataset version """
+    etag = http_cache.make_etag(data_version["version"], request.url.path, request.url.query, request.headers.get("accept", ""),
+                                built_at(data_version, route))
+    return http_cache.cache_headers(etag, modified_at(data_version, route), settings.http_cache_max_age)
+
+def matching_route(scope) -> Optional[APIRoute]:
+    """ Endpoint answering a GET request, None when no route matches its path """
+    scope = {**scope, "method": "GET"}
+    for route in app.router.routes:
+        if isinstance(route, APIRoute) and route.matches(scope)[0] == Match.FULL:
+            return route
+    return None
+
+def is_paginated(route: APIRoute) -> bool:
+    """ Tell whether an endpoint sends back the cursor of the next page """
+    return any(param.name == "cursor" for param in route.dependant.query_params)
+
+# Cursor of the next page sent with the recent pages, by ETag: a page revalidated with its ETag
+# gets its 304 and its cursor without running its query
+NEXT_CURSORS_KEPT = 10000
+_next_cursors = collections.OrderedDict()
+
+def remember_next_cursor(etag: str, cursor: Optional[str]):
+    """ Keep the cursor sent with a page (None for the last page), forgetting the oldest ones """
+    _next_cursors[etag] = cursor
+    _next_cursors.move_to_end(etag)
+    while len(_next_cursors) > NEXT_CURSORS_KEPT:
+        _next_cursors.popitem(last = False)
+
+def not_modified(headers: dict, cursor: Optional[str] = None) -> Response:
+    """ 304 response with the validators of the representation, and the cursor of the next page of a page """
+    if cursor:
+        headers = {**headers, NEXT_CURSOR_HEADER: cursor}
+    return Response(status_code = 304, headers = headers)
+
+def without_body(response: Response) -> Response:
+    """ Response to a HEAD request: the status and headers of the GET response, without the body """
+    head = Response(status_code = response.status_code)
+    head.raw_headers = response.raw_headers
+    return head
+
+async def conditional_response(request: Request, call_next) -> Response:
+    """ Answer a GET request, with a 304 when the client already holds the current representation
+
+    Only the paths served by an endpoint get an ETag. An ETag listed by If-None-Match was sent with
+    a 200 for the same URL and dataset version, so the resource exists and the 304 is sent without
+    running the endpoint (pages also need their cursor to be known). "*" and If-Modified-Since only
+    get a 304 once the endpoint has found the resource.
+    """
+    route = matching_route(request.scope) if request.url.path not in http_cache.UNVERSIONED_PATHS else None
+    if route is None:
+        return await call_next(request)
+    data_version = await current_data_version()
+    if data_version["version"] is None:
+        return await call_next(request)
+
+    headers = response_cache_headers(request, data_version, route)
+    etag = headers["ETag"]
+    if_none_match = request.headers.get("if-none-match")
+    paginated_route = is_paginated(route)
+    if http_cache.etag_matches(if_none_match, etag, wildcard = False) and (not paginated_route or etag in _next_cursors):
+        return not_modified(headers, _next_cursors.get(etag))
+
+    response = await call_next(request)
+    if response.status_code not in (200, 206):
+        return response
+    response.headers.update(headers)
+    cursor = response.headers.get(NEXT_CURSOR_HEADER)
+    if paginated_route and response.status_code == 200:
+        remember_next_cursor(etag, cursor)
+    if response.status_code == 200 and (http_cache.etag_matches(if_none_match, etag) or (
+            if_none_match is None and http_cache.not_modified_since(request.headers.get("if-modified-since"), modified_at(data_version, route)))):
+        return not_modified(headers, cursor)
+    return response
+
+@app.middleware("http")
+async def conditional_get(request: Request, call_next):
+    if request.method == "HEAD":
+        # HEAD is answered by the GET endpoint, with the headers of its response but no body
+        request.scope["method"] = "GET"
+        return without_body(await conditional_response(request, call_next))
+    if request.method == "GET":
+        return await conditional_response(request, call_next)
+    return await call_next(request)
+
+# Content negotiation of the list and batch endpoints: JSON objects by default, columnar JSON
+# or an Arrow IPC stream when the client asks for it in the Accept header
+
+def wire_format(accept: Optional[str] = Header(None, include_in_schema = False)) -> str:
+    """ Media type of the rows sent back, negotiated from the Accept header """
+    return serialization.negotiate(accept)
+
+ROWS_RESPONSES = {
+    200: {"content": {
+        serialization.COLUMNAR_JSON: {"schema": {"type": "object", "properties": {
+            "columns": {"type": "object", "description": "Values of each column"},
+            "types": {"type": "object", "description": "Type of each column: int32, int64, float32 or string"},
+        }}},
+        serialization.ARROW_STREAM: {"schema": {"type": "string", "format": "binary"}},
+    }},
+}
+
+def rows_response(model, rows, media_type: str) -> Response:
+    """ Encode plain rows of a model in the negotiated media type """
+    return serialization.RowsResponse(helpers.get_columns(model), rows, media_type = media_type)
+
+async def paginated(model, limit: int, fetch, media_type: str = serialization.JSON, keys: Optional[tuple] = None) -> Response:
+    """ Run a paginated helper returning plain rows, encode them and send back the cursor of the next page
+
+    The rows are encoded directly: the response model of the endpoint documents them in OpenAPI
+    but is not used to validate them again.
+    """
+    try:
+        rows = await fetch()
+    except ValueError as exc:
+        raise HTTPException(status_code = 400, detail = str(exc))
+    response = rows_response(model, rows, media_type)
+    cursor = helpers.next_cursor(rows, limit, model, keys)
+    if cursor:
+        response.headers[NEXT_CURSOR_HEADER] = cursor
+    return response
         
 # -- Endpoint to get movie details by ID ---
 @app.get("/",
@@ -32,22 +227,87 @@ def get_db():
 async def root():
     return {"message": "Movies API is up and running!"} 
 
+# -- Endpoint to search movies by title (declared before /movies/{movies_Id}) --
+
+@app.get(
+    "/movies/search",
+    summary = "Search movies by title",
+    description = "Full-text search over the titles: every word matches as a prefix, accents and word order are ignored, and results are ranked by relevance (BM25)",
+    response_description = "Movies ranked by relevance",
+    response_model = List[schemas.MovieSearchResult],
+    tags = ["movies"],
+)
+
+async def search_movies(
+    q: str = Query(..., min_length = 1, description = "Words to search in the titles"),
+    skip: int = Query(0, ge = 0, description = "Number of results that should be skipped"),
+    limit: int = Query(20, ge = 1, le = 100, description = "Maximum number of returned results"),
+    db = Depends(get_db)
+):
+    return await aio.search_movies(db, q, skip = skip, limit = limit)
+
+# -- Endpoint to get the best movies from the precomputed statistics (declared before /movies/{movies_Id}) --
+
+@app.get(
+    "/movies/top",
+    summary = "Top movies",
+    description = "Return the movies with the best weighted score (Bayesian average), the most ratings or the best mean rating, optionally filtered by genre and minimum number of ratings",
+    response_description = "Movies with their rating statistics",
+    response_model = List[schemas.MovieTop],
+    tags = ["movies"],
+)
+
+async def top_movies(
+    by: str = Query("score", pattern = "^(score|count|mean)$", description = "Order by weighted score, number of ratings or mean rating"),
+    genre: str = Query(None, description = "Filter movies by genre, several genres can be separated by commas or pipes"),
+    genre_mode: str = Query("all", pattern = "^(all|any)$", description = "Keep the movies having all the genres or any of them"),
+    min_count: int = Query(0, ge = 0, description = "Minimum number of ratings"),
+    skip: int = Query(0, ge = 0, description = "Number of results that should be skipped"),
+    limit: int = Query(20, ge = 1, le = 1000, description = "Maximum number of returned results"),
+    db = Depends(get_db)
+):
+    return await aio.get_top_movies(db, by = by, genre = genre, genre_mode = genre_mode, min_count = min_count, skip = skip, limit = limit)
+
 # -- Endpoint to get an movies using it ID ---
 
 @app.get("/movies/{movies_Id}",summary = "Get movie using its ID", 
-         description = "Return the information about movies with respect to thier ID", 
+         description = "Return the information about movies with respect to thier ID, with a sample of its ratings and tags and the statistics of all its ratings", 
          response_description = "Details about the movies",
          response_model=schemas.MovieDetailed,tags = ["movies"])
 
 
-def read_movie_by_id( 
+async def read_movie_by_id( 
      movies_Id: int = Path(..., description="The ID of the movie to retrieve"),
-     db: Session = Depends(get_db),):
-     db_movie = helpers.get_movie(db, movies_Id)
+     ratings_limit: int = Query(100, ge = 0, le = 1000, description = "Maximum number of embedded ratings"),
+     tags_limit: int = Query(100, ge = 0, le = 1000, description = "Maximum number of embedded tags"),
+     db = Depends(get_db),):
+     db_movie = await aio.get_movie_detail(db, movies_Id, ratings_limit = ratings_limit, tags_limit = tags_limit)
      if db_movie is None:
          raise HTTPException(status_code=404, detail="Movie not found")
      return db_movie
 
+# -- Endpoint to get the movies similar to a movie --
+
+@app.get(
+    "/movies/{movies_Id}/similar",
+    summary = "Similar movies",
+    description = "Return the k movies whose ratings are the most similar to those of a movie (item-item cosine similarity), "
+                  "precomputed offline by build_similarity.py. The list is empty until it has been built.",
+    response_description = "Similar movies, the most similar first",
+    response_model = List[schemas.SimilarMovie],
+    tags = ["movies"],
+)
+
+async def similar_movies(
+    movies_Id: int = Path(..., description = "The ID of the movie"),
+    k: int = Query(10, ge = 1, le = 100, description = "Number of similar movies"),
+    db = Depends(get_db),
+):
+    similar = await aio.get_similar_movies(db, movies_Id, k = k)
+    if not similar and await aio.get_movie(db, movies_Id) is None:
+        raise HTTPException(status_code = 404, detail = "Movie not found")
+    return similar
+
 
 
 # -- Endpoint to get a list of movies with pagination and optional filters title, genre, skip, limit --
@@ -58,18 +318,24 @@ def read_movie_by_id(
     description = "Return a list of movies with pagination and optionals filters, either by title or genres",
     response_description = "A list of movies",
     response_model = List[schemas.MovieSimple],
+    responses = ROWS_RESPONSES,
     tags = ["movies"],
 ) 
 
-def movies_list(
+async def movies_list(
     skip: int = Query(0, ge = 0, description = "Number of results that should be skipped"),
     limit: int = Query(100, le = 1000, description= "Maximum number of returned results"),
     title: str = Query(None, description = "Filter movies by title"),
-    genre: str = Query(None, description= "Filter movies by genre"),
-    db: Session = Depends(get_db)
+    genre: str = Query(None, description= "Filter movies by genre, several genres can be separated by commas or pipes"),
+    genre_mode: str = Query("all", pattern = "^(all|any)$", description = "Keep the movies having all the genres or any of them"),
+    cursor: Optional[str] = Query(None, description = f"Cursor returned in the {NEXT_CURSOR_HEADER} header of the previous page"),
+    db = Depends(get_db),
+    media_type: str = Depends(wire_format),
 ):
-    movies = helpers.get_movies(db, skip = skip, limit = limit, title = title, genre = genre)
-    return movies
+    return await paginated(models.Movie, limit,
+                           lambda: aio.get_movies(db, skip = skip, limit = limit, title = title, genre = genre, cursor = cursor, genre_mode = genre_mode,
+                                                  as_rows = True),
+                           media_type = media_type)
 
 # -- Endpoint to get an evaluation with respect to the user and movie --
 
@@ -82,12 +348,12 @@ def movies_list(
     tags = ["Evaluation"]
 )
 
-def read_rating(
+async def read_rating(
     user_Id: int = Path(..., description = "User ID"),
     movies_Id: int = Path(..., description = "Movie ID"),
-    db: Session = Depends (get_db)
+    db = Depends (get_db)
 ):
-    rating = helpers.get_rating(db, user_Id = user_Id, movies_Id= movies_Id)
+    rating = await aio.get_rating(db, user_Id = user_Id, movies_Id= movies_Id)
     if rating is None:
         raise HTTPException (
             status_code = 404,
@@ -104,19 +370,105 @@ def read_rating(
     description = "Return a list of evaluations with pagination and optional filters (movie, user, note min)",
     response_description = "List of evaluations",
     response_model = List[schemas.RatingSimple],
+    responses = ROWS_RESPONSES,
     tags = ["Evaluations"]
 )
 
-def list_ratings(
+async def list_ratings(
     skip: int = Query(0, ge = 0, description = "Number of results that should be skipped"),
     limit: int = Query(100, le= 1000, description = "Maximun number of return results"),
     movies_Id: Optional[int] = Query(None, description = "Filters using movies ID"),
     user_Id: Optional[int] = Query(None, description = "Filter using user ID"),
     min_rating: Optional[float] = Query(None, ge=0.0, le = 5.0, description = "Filter rating greater or equal to this values"),
-    db: Session = Depends(get_db) 
+    cursor: Optional[str] = Query(None, description = f"Cursor returned in the {NEXT_CURSOR_HEADER} header of the previous page"),
+    db = Depends(get_db),
+    media_type: str = Depends(wire_format),
+):
+    return await paginated(models.Rating, limit,
+                           lambda: aio.get_ratings(db, skip = skip, limit = limit, movies_Id= movies_Id, user_Id= user_Id, min_rating = min_rating, cursor = cursor,
+                                                   as_rows = True),
+                           media_type = media_type)
+
+# -- Endpoint to get the precomputed profile of a user --
+
+@app.get(
+    "/users/{user_Id}",
+    summary = "Profile of a user",
+    description = "Return the activity of a user, precomputed by the loader: number, mean and distribution of the ratings, "
+                  "first and last rating or tag, number of tags and most rated genres.",
+    response_description = "Profile of the user",
+    response_model = schemas.UserProfile,
+    tags = ["users"],
+)
+
+async def read_user(
+    user_Id: int = Path(..., description = "The ID of the user"),
+    db = Depends(get_db),
+):
+    profile = await aio.get_user_stats(db, user_Id)
+    if profile is None:
+        raise HTTPException(status_code = 404, detail = "User not found")
+    return profile
+
+# -- Endpoint to get the ratings of a user sorted by time or score --
+
+@app.get(
+    "/users/{user_Id}/ratings",
+    summary = "Ratings of a user",
+    description = "Return the ratings of a user sorted by time (most recent first by default) or by score (best first by default). "
+                  f"The cursor of the next page is sent back in the {NEXT_CURSOR_HEADER} header.",
+    response_description = "A list of ratings",
+    response_model = List[schemas.RatingSimple],
+    responses = ROWS_RESPONSES,
+    tags = ["users"],
+)
+
+async def list_user_ratings(
+    user_Id: int = Path(..., description = "The ID of the user"),
+    sort: str = Query("time", pattern = "^(time|score)$", description = "Sort the ratings by timestamp or by rating"),
+    order: str = Query("desc", pattern = "^(asc|desc)$", description = "Sort order"),
+    skip: int = Query(0, ge = 0, description = "Number of results that should be skipped"),
+    limit: int = Query(100, ge = 1, le = 1000, description = "Maximum number of returned results"),
+    cursor: Optional[str] = Query(None, description = f"Cursor returned in the {NEXT_CURSOR_HEADER} header of the previous page"),
+    db = Depends(get_db),
+    media_type: str = Depends(wire_format),
 ):
-    ratings = helpers.get_ratings(db, skip = skip, limit = limit, movies_Id= movies_Id, user_Id= user_Id, min_rating = min_rating)
-    return ratings
+    return await paginated(models.Rating, limit,
+                           lambda: aio.get_user_ratings(db, user_Id, sort = sort, order = order, skip = skip, limit = limit, cursor = cursor,
+                                                        as_rows = True),
+                           media_type = media_type, keys = helpers.USER_RATINGS_ORDER[sort])
+
+# -- Endpoint to recommend movies to a user from the factors of the trained model --
+
+@app.get(
+    "/users/{user_Id}/recommendations",
+    summary = "Recommendations for a user",
+    description = "Return the k movies not rated yet by the user with the highest predicted rating, scored with the user and "
+                  "movie factors of the matrix factorization model trained offline by train_recommender.py. "
+                  "The genre filters work as on /movies.",
+    response_description = "Recommended movies, the highest predicted rating first",
+    response_model = List[schemas.Recommendation],
+    responses = {
+        404: {"description": "The user has no rating"},
+        503: {"description": "No recommendation model has been trained"},
+    },
+    tags = ["users"],
+)
+
+async def user_recommendations(
+    user_Id: int = Path(..., description = "The ID of the user"),
+    k: int = Query(10, ge = 1, le = 100, description = "Number of recommended movies"),
+    genre: str = Query(None, description = "Filter movies by genre, several genres can be separated by commas or pipes"),
+    genre_mode: str = Query("all", pattern = "^(all|any)$", description = "Keep the movies having all the genres or any of them"),
+    db = Depends(get_db),
+):
+    try:
+        recommendations = await aio.recommend(db, user_Id, k = k, genre = genre, genre_mode = genre_mode)
+    except recommender.ModelNotTrained as exc:
+        raise HTTPException(status_code = 503, detail = str(exc))
+    if recommendations is None:
+        raise HTTPException(status_code = 404, detail = "User not found")
+    return recommendations
 
 # -- Endpoint to return tag with respect to user and given movie --
 
@@ -129,13 +481,13 @@ def list_ratings(
     tags = ["tags"],
 )
 
-def read_tag(
+async def read_tag(
     user_Id:int = Path(..., description = "User ID"),
     movies_Id: int = Path (..., description = "Movie ID"),
     tag_text: str = Path(..., description = "Exact contente of tag"),
-    db: Session = Depends(get_db)
+    db = Depends(get_db)
 ):
-    result = helpers.get_tag(db, user_Id=user_Id, movies_Id=movies_Id, tag_text = tag_text)
+    result = await aio.get_tag(db, user_Id=user_Id, movies_Id=movies_Id, tag_text = tag_text)
     if result is None:
         raise HTTPException(
             status_code = 404,
@@ -152,17 +504,22 @@ def read_tag(
     description = "Return a list of tags with pagination and optional filters by user or movie",
     response_description = "Get list of tags",
     response_model= List[schemas.TagSimple],
+    responses = ROWS_RESPONSES,
     tags = ["tags"]
 )
 
-def list_tags(
+async def list_tags(
     skip: int = Query(0, ge = 0, description = "Numbers of results that should be skipped"),
     limit: int = Query(100, le= 1000, description = "Maximun number of returned results"),
     movies_Id: Optional[int]= Query(None, description = "Filter by movie ID"),
     user_Id: Optional[int] =  Query(None, description = "Filter by user ID"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description = f"Cursor returned in the {NEXT_CURSOR_HEADER} header of the previous page"),
+    db = Depends(get_db),
+    media_type: str = Depends(wire_format),
 ):
-    return helpers.get_tags(db, skip = skip, limit = limit, movies_Id = movies_Id, user_Id = user_Id)
+    return await paginated(models.Tag, limit,
+                           lambda: aio.get_tags(db, skip = skip, limit = limit, movies_Id = movies_Id, user_Id = user_Id, cursor = cursor, as_rows = True),
+                           media_type = media_type)
 
 
 # -- Endpoint to return the IMDB and TMDB ID for given movie --
@@ -176,11 +533,11 @@ def list_tags(
     tags = ["link"]
 )
 
-def read_link(
+async def read_link(
     movies_Id: int = Path(..., description = "Movie ID"),
-    db: Session = Depends(get_db)
+    db = Depends(get_db)
 ):
-    result = helpers.get_link(db, movies_Id = movies_Id)
+    result = await aio.get_link(db, movies_Id = movies_Id)
     if result is None:
         raise HTTPException (status_code = 404,
                              detail = f"Any movie link don't found with the ID{movies_Id}")
@@ -195,15 +552,200 @@ def read_link(
     description = "Return a list of paginated IMDB and TMDB ID for all movies.",
     response_description = "Get all list of movies links",
     response_model = List[schemas.LinkSimple],
+    responses = ROWS_RESPONSES,
     tags = ["links"]
 )
 
-def list_links(
+async def list_links(
     skip: int =Query(0, ge = 0, description = "Number of results that should be skipped"),
     limit: int = Query(100, le= 1000, description = "Maximun number of returned results"),
-    db: Session = Depends(get_db)
+    cursor: Optional[str] = Query(None, description = f"Cursor returned in the {NEXT_CURSOR_HEADER} header of the previous page"),
+    db = Depends(get_db),
+    media_type: str = Depends(wire_format),
 ):
-    return helpers.get_links(db, skip = skip, limit = limit)
+    return await paginated(models.Link, limit,
+                           lambda: aio.get_links(db, skip = skip, limit = limit, cursor = cursor, as_rows = True),
+                           media_type = media_type)
+
+
+# -- Endpoints to resolve many IDs or (user, movie) pairs in a single request --
+
+async def batch_response(model, fetch, media_type: str = serialization.JSON) -> Response:
+    """ Run a batch helper returning plain rows and encode them """
+    return rows_response(model, await fetch(), media_type)
+
+@app.post(
+    "/movies/batch",
+    summary = "Get many movies",
+    description = f"Return the movies of up to {schemas.BATCH_MAX_SIZE} IDs, in the order of the IDs. Unknown IDs are left out.",
+    response_description = "Movies found",
+    response_model = List[schemas.MovieSimple],
+    responses = ROWS_RESPONSES,
+    tags = ["movies"],
+)
+
+async def movies_batch(batch: schemas.MovieIdsBatch, db = Depends(get_db), media_type: str = Depends(wire_format)):
+    return await batch_response(models.Movie, lambda: aio.get_movies_batch(db, batch.moviesIds, as_rows = True), media_type)
+
+@app.post(
+    "/ratings/batch",
+    summary = "Get many evaluations",
+    description = f"Return the evaluations of up to {schemas.BATCH_MAX_SIZE} (userId, moviesId) pairs, in the order of the pairs. Pairs without evaluation are left out.",
+    response_description = "Evaluations found",
+    response_model = List[schemas.RatingSimple],
+    responses = ROWS_RESPONSES,
+    tags = ["Evaluations"],
+)
+
+async def ratings_batch(batch: schemas.UserMoviePairsBatch, db = Depends(get_db), media_type: str = Depends(wire_format)):
+    return await batch_response(models.Rating, lambda: aio.get_ratings_batch(db, batch.pairs, as_rows = True), media_type)
+
+@app.post(
+    "/tags/batch",
+    summary = "Get the tags of many users and movies",
+    description = f"Return all the tags of up to {schemas.BATCH_MAX_SIZE} (userId, moviesId) pairs, in the order of the pairs. Pairs without tag are left out.",
+    response_description = "Tags found",
+    response_model = List[schemas.TagSimple],
+    responses = ROWS_RESPONSES,
+    tags = ["tags"],
+)
+
+async def tags_batch(batch: schemas.UserMoviePairsBatch, db = Depends(get_db), media_type: str = Depends(wire_format)):
+    return await batch_response(models.Tag, lambda: aio.get_tags_batch(db, batch.pairs, as_rows = True), media_type)
+
+@app.post(
+    "/links/batch",
+    summary = "Get the links of many movies",
+    description = f"Return the IMDB and TMDB IDs of up to {schemas.BATCH_MAX_SIZE} movies, in the order of the IDs. Unknown IDs are left out.",
+    response_description = "Links found",
+    response_model = List[schemas.LinkSimple],
+    responses = ROWS_RESPONSES,
+    tags = ["links"],
+)
+
+async def links_batch(batch: schemas.MovieIdsBatch, db = Depends(get_db), media_type: str = Depends(wire_format)):
+    return await batch_response(models.Link, lambda: aio.get_links_batch(db, batch.moviesIds, as_rows = True), media_type)
+
+
+# -- Endpoint to stream a whole table as NDJSON, CSV or Arrow IPC --
+
+EXPORT_MEDIA_TYPES = {
+    schemas.ExportFormat.ndjson: "application/x-ndjson",
+    schemas.ExportFormat.csv: "text/csv",
+    schemas.ExportFormat.arrow: serialization.ARROW_STREAM,
+}
+
+# Number of rows encoded together before being sent to the client
+EXPORT_BATCH_SIZE = 5000
+
+def stream_export(table: str, format: schemas.ExportFormat, filters: dict):
+    """ Generate the encoded rows of a table by batches, keeping a constant memory """
+    # The session belongs to the generator: it must live as long as the response is streamed
+    db = SessionLocal()
+    try:
+        rows = helpers.export_rows(db, table, batch_size = EXPORT_BATCH_SIZE, **filters)
+        columns = helpers.get_columns(helpers.EXPORT_MODELS[table])
+        if format == schemas.ExportFormat.arrow:
+            # One record batch per batch of rows
+            rows = iter(rows)
+            batches = iter(lambda: list(itertools.islice(rows, EXPORT_BATCH_SIZE)), [])
+            yield from serialization.stream_arrow(columns, batches)
+            return
+
+        keys = [column.key for column in columns]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator = "\n")
+        if format == schemas.ExportFormat.csv:
+            writer.writerow(keys)
+
+        for count, row in enumerate(rows, start = 1):
+            if format == schemas.ExportFormat.csv:
+                writer.writerow(row)
+            else:
+                buffer.write(json.dumps(dict(zip(keys, row)), separators = (",", ":")))
+                buffer.write("\n")
+            if count % EXPORT_BATCH_SIZE == 0:
+                yield buffer.getvalue()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue()
+    finally:
+        db.close()
+
+@app.get(
+    "/export/{table}",
+    summary = "Export a whole table",
+    description = "Stream all the rows of a table as NDJSON (one JSON object per line), CSV or an Arrow IPC stream. Ratings and tags can be filtered like the list endpoints. "
+                  f"Without format, the rows are sent as Arrow when the Accept header asks for {serialization.ARROW_STREAM}, and as NDJSON otherwise.",
+    response_description = "Rows of the table",
+    response_class = StreamingResponse,
+    tags = ["export"]
+)
+
+def export_table(
+    table: schemas.ExportTable = Path(..., description = "Table to export"),
+    format: Optional[schemas.ExportFormat] = Query(None, description = "Output format, negotiated from the Accept header when missing"),
+    movies_Id: Optional[int] = Query(None, description = "Filter ratings or tags by movie ID"),
+    user_Id: Optional[int] = Query(None, description = "Filter ratings or tags by user ID"),
+    min_rating: Optional[float] = Query(None, ge = 0.0, le = 5.0, description = "Filter ratings greater or equal to this value"),
+    media_type: str = Depends(wire_format),
+):
+    if format is None:
+        format = schemas.ExportFormat.arrow if media_type == serialization.ARROW_STREAM else schemas.ExportFormat.ndjson
+    if format == schemas.ExportFormat.arrow and serialization.pyarrow is None:
+        raise HTTPException(status_code = 406, detail = "The Arrow format needs pyarrow, which is not installed on the server")
+    filters = {"movies_Id": movies_Id, "user_Id": user_Id, "min_rating": min_rating}
+    allowed = {
+        schemas.ExportTable.ratings: {"movies_Id", "user_Id", "min_rating"},
+        schemas.ExportTable.tags: {"movies_Id", "user_Id"},
+    }.get(table, set())
+    unsupported = [name for name, value in filters.items() if value is not None and name not in allowed]
+    if unsupported:
+        raise HTTPException(status_code = 400,
+                            detail = f"Filters {', '.join(unsupported)} are not supported for the table {table.value}")
+
+    return StreamingResponse(stream_export(table.value, format, filters),
+                             media_type = EXPORT_MEDIA_TYPES[format],
+                             headers = {"Content-Disposition": f"attachment; filename={table.value}.{format.value}"})
+
+
+# -- Endpoint to download the prebuilt snapshot of a whole table --
+
+# Version of the dataset of a snapshot, also part of its file name
+DATASET_VERSION_HEADER = "X-Dataset-Version"
+
+@app.get(
+    "/snapshots/{table}",
+    summary = "Download the snapshot of a table",
+    description = "Send the whole table as a file built by the loader for the current version of the dataset: an Arrow IPC file, "
+                  "which can be memory-mapped, or a compressed Parquet file. Range requests resume an interrupted download "
+                  "(with If-Range set to the ETag), and If-None-Match skips a version already downloaded.",
+    response_description = "Snapshot file of the table",
+    response_class = FileResponse,
+    responses = {
+        200: {"content": {media_type: {"schema": {"type": "string", "format": "binary"}}
+                          for _, media_type in snapshots.SNAPSHOT_FORMATS.values()}},
+        206: {"description": "Part of the file requested with a Range header"},
+        404: {"description": "No snapshot built for the current version of the dataset"},
+    },
+    tags = ["export"]
+)
+
+async def download_snapshot(
+    request: Request,
+    table: schemas.ExportTable = Path(..., description = "Table to download"),
+    format: schemas.SnapshotFormat = Query(schemas.SnapshotFormat.arrow, description = "File format"),
+):
+    data_version = await current_data_version()
+    version = data_version["version"]
+    path = snapshots.snapshot_path(settings.snapshot_dir, table.value, format.value, version) if version else None
+    if path is None or not path.is_file():
+        raise HTTPException(status_code = 404,
+                            detail = f"No {format.value} snapshot of the table {table.value} for the current dataset version, rebuild it with load_data.py")
+    # The ETag of the version is also the validator of If-Range: a partial download of another
+    # version is sent again from the start
+    headers = {**response_cache_headers(request, data_version), DATASET_VERSION_HEADER: version}
+    return FileResponse(path, media_type = snapshots.SNAPSHOT_FORMATS[format.value][1], filename = path.name, headers = headers)
 
 
 # -- Endpoint to statistics on the database --
@@ -217,21 +759,15 @@ def list_links(
     - Total number of evaluations
     - Total number of tags
     - Total number of links towars IMDB/TMDB
+    - Number of ratings for each rating value, each year and number of movies of each genre
+    - Percentiles of the number of ratings per user
+
+    The statistics are computed once for each version of the dataset and then served from memory.
     """,
     response_description = "All database statistcs",
     response_model= schemas.AnalyticsResponse,
     tags = ["analytics"]
 )
 
-def get_analytics(db: Session = Depends(get_db)):
-    movie_count = helpers.get_movie_count(db)
-    rating_count = helpers.get_rating_count(db)
-    tag_count = helpers.get_tag_count(db)
-    link_count = helpers.get_link_count(db)
-
-    return schemas.AnalyticsResponse(
-        movie_count=movie_count,
-        rating_count=rating_count,
-        tag_count=tag_count,
-        link_count=link_count
-    )
+async def get_analytics(db = Depends(get_db)):
+    return await aio.get_analytics(db)
@@ -1,6 +1,6 @@
 """SQLAlchemy models"""
 
-from sqlalchemy import Column, Integer, String, Float, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship # to ensure relationships between tables
 from database import Base
 
@@ -18,6 +18,14 @@ class Movie(Base):
     
 class Rating(Base):
     __tablename__ = "ratings"
+    # The primary key leads with userId: these indexes serve the movie-keyed and time-keyed accesses
+    __table_args__ = (
+        Index("ix_ratings_movie_user", "moviesId", "userId"),
+        Index("ix_ratings_movie_rating", "moviesId", "rating"),
+        Index("ix_ratings_timestamp", "timestamp"),
+        # History of a user in time order, moviesId breaking the ties of the keyset pagination
+        Index("ix_ratings_user_timestamp", "userId", "timestamp", "moviesId"),
+    )
 
     userId = Column(Integer, primary_key=True)
     moviesId = Column(Integer, ForeignKey("movies.moviesId"), primary_key=True)
@@ -28,6 +36,9 @@ class Rating(Base):
     
 class Tag(Base):
     __tablename__ = "tags"
+    __table_args__ = (
+        Index("ix_tags_movie_user", "moviesId", "userId"),
+    )
 
     userId = Column(Integer, primary_key=True)
     moviesId = Column(Integer, ForeignKey("movies.moviesId"), primary_key=True)
@@ -43,4 +54,67 @@ class Link(Base):
     imdbId = Column(String)
     tmdbId = Column(Integer)
 
-    movie = relationship("Movie", back_populates="links")
\ No newline at end of file
+    movie = relationship("Movie", back_populates="links")
+    
+
+class MovieGenre(Base):
+    """ Movie <-> genre mapping, filled by the loader from the pipe separated Movie.genres """
+    __tablename__ = "movie_genres"
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    genre = Column(String, primary_key=True) # lower-cased genre name
+    moviesId = Column(Integer, ForeignKey("movies.moviesId"), primary_key=True)
+    
+
+class MovieStats(Base):
+    """ Rating statistics of each movie, built by the loader with the rest of the database """
+    __tablename__ = "movie_stats"
+    # Rankings of /movies/top, moviesId breaking the ties so the pages never overlap
+    __table_args__ = (
+        Index("ix_movie_stats_weighted_score", "weighted_score", "moviesId"),
+        Index("ix_movie_stats_rating_count", "rating_count", "moviesId"),
+        Index("ix_movie_stats_rating_mean", "rating_mean", "moviesId"),
+    )
+
+    moviesId = Column(Integer, ForeignKey("movies.moviesId"), primary_key=True)
+    rating_count = Column(Integer, nullable=False)
+    rating_sum = Column(Float, nullable=False)
+    rating_sum_squares = Column(Float, nullable=False)
+    rating_mean = Column(Float)
+    rating_stddev = Column(Float)
+    weighted_score = Column(Float) # Bayesian average, shrunk toward the global mean
+    last_rated_at = Column(Integer)
+    
+
+class UserStats(Base):
+    """ Activity profile of each user, built by the loader from the ratings, the tags and the movie genres """
+    __tablename__ = "user_stats"
+
+    userId = Column(Integer, primary_key=True)
+    rating_count = Column(Integer, nullable=False)
+    rating_mean = Column(Float)
+    rating_histogram = Column(String, nullable=False) # JSON object: rating -> number of ratings
+    first_activity_at = Column(Integer) # first rating or tag
+    last_activity_at = Column(Integer)
+    tag_count = Column(Integer, nullable=False)
+    top_genres = Column(String, nullable=False) # JSON list of the most rated genres with their count and mean rating
+    
+
+class MovieSimilarity(Base):
+    """ Nearest neighbours of each movie by item-item similarity of their ratings, built by build_similarity.py """
+    __tablename__ = "movie_similarity"
+    # Clustered on (movie, rank): the neighbours of a movie are a single range read in order
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    moviesId = Column(Integer, ForeignKey("movies.moviesId"), primary_key=True)
+    rank = Column(Integer, primary_key=True) # 1 for the most similar movie
+    similarMoviesId = Column(Integer, ForeignKey("movies.moviesId"), nullable=False)
+    similarity = Column(Float, nullable=False)
+    
+
+class DatasetMeta(Base):
+    """ Key/value information about the loaded dataset (version, load time) written by the loader """
+    __tablename__ = "dataset_meta"
+
+    key = Column(String, primary_key=True)
+    value = Column(String)
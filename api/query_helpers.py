@@ -1,8 +1,74 @@
 """ SQLAlchemy query helpers functions"""
+import base64
+import json
+import math
+import re
+from sqlalchemy import and_, desc, false, func, or_, select, text, tuple_
 from sqlalchemy.orm import Session
-from sqlalchemy.orm import joinedload
+from sqlalchemy.orm import aliased, joinedload
 from typing import Optional
 import models
+import ratings_engine
+
+# --- Cursor pagination ---
+
+# Columns used to order each table and to seek the next page (the primary key)
+CURSOR_KEYS = {
+    models.Movie: ("moviesId",),
+    models.Rating: ("userId", "moviesId"),
+    models.Tag: ("userId", "moviesId", "tag"),
+    models.Link: ("moviesId",),
+}
+
+def encode_cursor(values) -> str:
+    """ Encode the key of the last returned row into an opaque cursor """
+    return base64.urlsafe_b64encode(json.dumps(list(values), separators=(",", ":")).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor: str, size: int) -> list:
+    """ Decode a cursor built by encode_cursor, raise ValueError if it is malformed """
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, TypeError) as exc:
+        raise ValueError(f"Invalid cursor '{cursor}'") from exc
+    if not isinstance(values, list) or len(values) != size:
+        raise ValueError(f"Invalid cursor '{cursor}'")
+    return values
+
+def next_cursor(items, limit: int, model, keys: Optional[tuple] = None) -> Optional[str]:
+    """ Return the cursor of the page following items, None when items is the last page
+
+    The cursor holds the sort key of the last item: the table key, or the given key columns.
+    """
+    if not items or len(items) < limit:
+        return None
+    last = items[-1]
+    return encode_cursor(getattr(last, key) for key in (keys or CURSOR_KEYS[model]))
+
+def _paginate(query, model, skip: int, limit: int, cursor: Optional[str] = None, pinned: tuple = (), source = None):
+    """ Order a query by the table key and apply the cursor (seek) and skip/limit pagination
+
+    Key columns pinned by an equality filter are left out of the seek condition,
+    so the condition stays a range on the index serving the filter. When every key
+    column is pinned, the filter matches a single row: no page follows it. The key columns
+    can be taken from another entity of the query (source) joined on the same key.
+    """
+    keys = CURSOR_KEYS[model]
+    source = source if source is not None else model
+    query = query.order_by(*(getattr(source, key) for key in keys))
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        seek = [(getattr(source, key), value) for key, value in zip(keys, values) if key not in pinned]
+        if not seek:
+            query = query.filter(false())
+        elif len(seek) == 1:
+            query = query.filter(seek[0][0] > seek[0][1])
+        elif seek:
+            query = query.filter(tuple_(*(column for column, _ in seek)) > tuple_(*(value for _, value in seek)))
+    return query.offset(skip).limit(limit)
+
+def _select(db: Session, model, as_rows: bool = False):
+    """ Query the ORM objects of a model, or with as_rows plain rows of its column values """
+    return db.query(*get_columns(model)) if as_rows else db.query(model)
 
 # --- Films---
 
@@ -10,16 +76,110 @@ def get_movie(db:Session, movies_Id: int) -> Optional[models.Movie]:
     """ Retrieve a movie by its ID """
     return db.query(models.Movie).filter(models.Movie.moviesId == movies_Id).first()
 
-def get_movies(db: Session, skip: int = 0, limit: int = 100, title: str = None, genre: str = None):
-    """ Retrieve multiple movies with optional filters for title and genre """
-    query = db.query(models.Movie)
+def get_rating_stats(db: Session, movies_Id: int) -> dict:
+    """ Compute the count, mean and histogram of the ratings of a movie with a single grouped query, or from the ratings engine """
+    engine = ratings_engine.get_engine(db)
+    if engine is not None:
+        return engine.get_rating_stats(movies_Id)
+    histogram = dict(
+        db.query(models.Rating.rating, func.count())
+        .filter(models.Rating.moviesId == movies_Id)
+        .group_by(models.Rating.rating)
+        .order_by(models.Rating.rating)
+        .all()
+    )
+    count = sum(histogram.values())
+    mean = sum(value * n for value, n in histogram.items()) / count if count else None
+    return {"count": count, "mean": mean, "histogram": histogram}
+
+def get_movie_detail(db: Session, movies_Id: int, ratings_limit: int = 100, tags_limit: int = 100) -> Optional[dict]:
+    """ Retrieve a movie with its links, a bounded sample of its ratings and tags and its rating statistics
+
+    Runs a fixed number of queries whatever the number of ratings of the movie.
+    """
+    movie = (
+        db.query(models.Movie)
+        .options(joinedload(models.Movie.links))
+        .filter(models.Movie.moviesId == movies_Id)
+        .first()
+    )
+    if movie is None:
+        return None
+
+    ratings = get_ratings(db, limit = ratings_limit, movies_Id = movies_Id) if ratings_limit else []
+    tags = get_tags(db, limit = tags_limit, movies_Id = movies_Id) if tags_limit else []
+    return {
+        "moviesId": movie.moviesId,
+        "title": movie.title,
+        "genres": movie.genres,
+        "links": movie.links,
+        "ratings": ratings,
+        "tags": tags,
+        "rating_stats": get_rating_stats(db, movies_Id),
+    }
+
+def parse_genres(genre: Optional[str]) -> list:
+    """ Split a genre filter such as "Action,Comedy" or "Action|Comedy" into lower-cased genre names """
+    if not genre:
+        return []
+    return sorted({name.strip().lower() for name in genre.replace("|", ",").split(",") if name.strip()})
+
+def filter_genres(query, genres: list, genre_mode: str = "all"):
+    """ Keep the movies having all (AND) or any (OR) of the genres, using the movie_genres index
+
+    Return the query and the entity to order the movies by: with "all", the mapping of the
+    first genre, so the movies are read in order from its (genre, moviesId) key without sorting.
+    """
+    if not genres:
+        return query, None
+    if genre_mode == "any":
+        movie_ids = select(models.MovieGenre.moviesId).where(models.MovieGenre.genre.in_(genres))
+        return query.filter(models.Movie.moviesId.in_(movie_ids)), None
+    mappings = [aliased(models.MovieGenre) for _ in genres]
+    for mapping, genre in zip(mappings, genres):
+        query = query.join(mapping, and_(mapping.moviesId == models.Movie.moviesId, mapping.genre == genre))
+    return query, mappings[0]
+
+def get_movies(db: Session, skip: int = 0, limit: int = 100, title: str = None, genre: str = None, cursor: Optional[str] = None,
+               genre_mode: str = "all", as_rows: bool = False):
+    """ Retrieve multiple movies with optional filters for title and genres (all or any of them) """
+    query = _select(db, models.Movie, as_rows)
     
     if title:
+        # Substring of the title, as it has always been: the word prefix search is /movies/search
         query = query.filter(models.Movie.title.contains(title))
-    if genre:
-        query = query.filter(models.Movie.genres.ilike(f"%genre%"))
+    query, source = filter_genres(query, parse_genres(genre), genre_mode)
         
-    return query.offset(skip).limit(limit).all() 
+    return _paginate(query, models.Movie, skip, limit, cursor, source = source).all()
+
+def fts_query(q: str) -> Optional[str]:
+    """ Turn a free text into an FTS5 query matching every word as a prefix, None if it has no word """
+    words = re.findall(r"\w+", q)
+    if not words:
+        return None
+    return " ".join(f'"{word}"*' for word in words)
+
+def search_movies(db: Session, q: str, skip: int = 0, limit: int = 20) -> list:
+    """ Full-text search of the movie titles, ranked by BM25 (higher score is better) on SQLite """
+    match = fts_query(q)
+    if match is None:
+        return []
+    if db.get_bind().dialect.name != "sqlite":
+        # Without FTS5 every word is matched as a substring of the title, without ranking
+        query = db.query(models.Movie.moviesId, models.Movie.title, models.Movie.genres)
+        for word in re.findall(r"\w+", q):
+            query = query.filter(models.Movie.title.ilike(f"%{word}%"))
+        rows = query.order_by(models.Movie.title).offset(skip).limit(limit).all()
+        return [{"moviesId": row.moviesId, "title": row.title, "genres": row.genres, "score": 0.0} for row in rows]
+    rows = db.execute(
+        text(
+            'SELECT m."moviesId", m.title, m.genres, -bm25(movies_fts) AS score '
+            'FROM movies_fts JOIN movies AS m ON m."moviesId" = movies_fts.rowid '
+            'WHERE movies_fts MATCH :match ORDER BY bm25(movies_fts) LIMIT :limit OFFSET :skip'
+        ),
+        {"match": match, "limit": limit, "skip": skip},
+    )
+    return [dict(row._mapping) for row in rows]
 
 def get_rating(db: Session, user_Id: int, movies_Id: int) -> Optional[models.Rating]:
     """ Retrieve a rating by user ID and movie ID """
@@ -28,17 +188,28 @@ def get_rating(db: Session, user_Id: int, movies_Id: int) -> Optional[models.Rat
         models.Rating.moviesId == movies_Id
     ).first()
     
-def get_ratings(db: Session, skip: int = 0, limit: int = 100, movies_Id: int = None, user_Id: int = None, min_rating: float = None):
-    """ Retrieve multiple ratings """
-    query = db.query(models.Rating)
-    
+def _filter_ratings(query, movies_Id: int = None, user_Id: int = None, min_rating: float = None):
+    """ Apply the optional ratings filters, return the query and the key columns pinned by them """
+    pinned = ()
     if movies_Id:
         query = query.filter(models.Rating.moviesId == movies_Id)
+        pinned += ("moviesId",)
     if user_Id:
         query = query.filter(models.Rating.userId == user_Id)
+        pinned += ("userId",)
     if min_rating:
         query = query.filter(models.Rating.rating >= min_rating)
-    return query.offset(skip).limit(limit).all()
+    return query, pinned
+    
+def get_ratings(db: Session, skip: int = 0, limit: int = 100, movies_Id: int = None, user_Id: int = None, min_rating: float = None, cursor: Optional[str] = None,
+                as_rows: bool = False):
+    """ Retrieve multiple ratings, from the in-memory ratings engine when it is enabled """
+    engine = ratings_engine.get_engine(db)
+    if engine is not None:
+        after = decode_cursor(cursor, len(CURSOR_KEYS[models.Rating])) if cursor else None
+        return engine.get_ratings(skip, limit, movies_Id, user_Id, min_rating, after)
+    query, pinned = _filter_ratings(_select(db, models.Rating, as_rows), movies_Id, user_Id, min_rating)
+    return _paginate(query, models.Rating, skip, limit, cursor, pinned).all()
 
 # ---Tags---
 
@@ -50,16 +221,22 @@ def get_tag(db: Session, user_Id: int, movies_Id: int, tag_text: str) -> Optiona
         models.Tag.tag == tag_text
     ).first()
     
-def get_tags(db: Session, skip: int = 0, limit: int = 100, movies_Id: Optional[int] = None, user_Id: Optional[int] = None):
-    """ Retrieve multiple tags """
-    query = db.query(models.Tag)
-    
+def _filter_tags(query, movies_Id: Optional[int] = None, user_Id: Optional[int] = None):
+    """ Apply the optional tags filters, return the query and the key columns pinned by them """
+    pinned = ()
     if movies_Id:
         query = query.filter(models.Tag.moviesId == movies_Id)
+        pinned += ("moviesId",)
     if user_Id:
         query = query.filter(models.Tag.userId == user_Id)
-        
-    return query.offset(skip).limit(limit).all()
+        pinned += ("userId",)
+    return query, pinned
+    
+def get_tags(db: Session, skip: int = 0, limit: int = 100, movies_Id: Optional[int] = None, user_Id: Optional[int] = None, cursor: Optional[str] = None,
+             as_rows: bool = False):
+    """ Retrieve multiple tags """
+    query, pinned = _filter_tags(_select(db, models.Tag, as_rows), movies_Id, user_Id)
+    return _paginate(query, models.Tag, skip, limit, cursor, pinned).all()
 
 # --- Links---
 
@@ -67,9 +244,218 @@ def get_link(db: Session, movies_Id: int) -> Optional[models.Link]:
     """ Retrieve a link by movie ID """
     return db.query(models.Link).filter(models.Link.moviesId == movies_Id).first()
 
-def get_links(db: Session, skip: int = 0, limit: int = 100):
+def get_links(db: Session, skip: int = 0, limit: int = 100, cursor: Optional[str] = None, as_rows: bool = False):
     """ Retrieve multiple links """
-    return db.query(models.Link).offset(skip).limit(limit).all()
+    return _paginate(_select(db, models.Link, as_rows), models.Link, skip, limit, cursor).all()
+
+# --- Batch lookups ---
+
+# Keys resolved by each query of a batch lookup, within the bound parameters limit of SQLite
+BATCH_CHUNK_SIZE = 500
+
+def _key_filter(db: Session, columns: list, keys: list):
+    """ Condition matching the rows whose key columns are one of keys (tuples of values) """
+    if len(columns) == 1:
+        return columns[0].in_([key[0] for key in keys])
+    if db.get_bind().dialect.name == "sqlite":
+        # SQLite does not search an index for a row value IN list, but does for each branch of an OR
+        return or_(*(and_(*(column == value for column, value in zip(columns, key))) for key in keys))
+    return tuple_(*columns).in_(keys)
+
+def get_batch(db: Session, model, key_names: tuple, keys: list, as_rows: bool = False) -> list:
+    """ Retrieve the rows of a model matching a list of keys, with one query per chunk of keys
+
+    The rows are returned in the order of the keys, duplicates are resolved once and the
+    keys without any row are left out.
+    """
+    keys = list(dict.fromkeys(tuple(key) if isinstance(key, (list, tuple)) else (key,) for key in keys))
+    columns = [getattr(model, name) for name in key_names]
+    found = {}
+    for start in range(0, len(keys), BATCH_CHUNK_SIZE):
+        chunk = keys[start:start + BATCH_CHUNK_SIZE]
+        query = _select(db, model, as_rows).filter(_key_filter(db, columns, chunk))
+        query = query.order_by(*(getattr(model, key) for key in CURSOR_KEYS[model]))
+        for row in query.all():
+            found.setdefault(tuple(getattr(row, name) for name in key_names), []).append(row)
+    return [row for key in keys for row in found.get(key, [])]
+
+def get_movies_batch(db: Session, movies_Ids: list, as_rows: bool = False) -> list:
+    """ Retrieve the movies of a list of IDs """
+    return get_batch(db, models.Movie, ("moviesId",), movies_Ids, as_rows)
+
+def get_links_batch(db: Session, movies_Ids: list, as_rows: bool = False) -> list:
+    """ Retrieve the links of a list of movie IDs """
+    return get_batch(db, models.Link, ("moviesId",), movies_Ids, as_rows)
+
+def get_ratings_batch(db: Session, keys: list, as_rows: bool = False) -> list:
+    """ Retrieve the ratings of a list of (userId, moviesId) pairs """
+    return get_batch(db, models.Rating, ("userId", "moviesId"), keys, as_rows)
+
+def get_tags_batch(db: Session, keys: list, as_rows: bool = False) -> list:
+    """ Retrieve all the tags of a list of (userId, moviesId) pairs """
+    return get_batch(db, models.Tag, ("userId", "moviesId"), keys, as_rows)
+
+# --- Movie statistics ---
+
+# Number of "virtual" ratings at the global mean added to every movie by the weighted score
+BAYESIAN_PRIOR_COUNT = 10
+
+def compute_movie_stats(movies_Id: int, count: int, total: float, total_squares: float, last_rated_at: Optional[int],
+                        prior_mean: float, prior_count: int = BAYESIAN_PRIOR_COUNT) -> dict:
+    """ Build a movie_stats row from the count, sum and sum of squares of the ratings of a movie """
+    mean = total / count
+    variance = max(total_squares / count - mean * mean, 0.0)
+    return {
+        "moviesId": movies_Id,
+        "rating_count": count,
+        "rating_sum": total,
+        "rating_sum_squares": total_squares,
+        "rating_mean": mean,
+        "rating_stddev": math.sqrt(variance),
+        "weighted_score": (prior_count * prior_mean + total) / (prior_count + count),
+        "last_rated_at": last_rated_at,
+    }
+
+TOP_MOVIES_ORDER = {
+    "score": models.MovieStats.weighted_score,
+    "count": models.MovieStats.rating_count,
+    "mean": models.MovieStats.rating_mean,
+}
+
+def get_top_movies(db: Session, by: str = "score", genre: Optional[str] = None, genre_mode: str = "all",
+                   min_count: int = 0, skip: int = 0, limit: int = 20) -> list:
+    """ Retrieve the movies with the best statistics, read in order from the movie_stats indexes """
+    query = db.query(models.Movie, models.MovieStats).join(models.MovieStats, models.MovieStats.moviesId == models.Movie.moviesId)
+    if min_count:
+        query = query.filter(models.MovieStats.rating_count >= min_count)
+    # Genres are checked with correlated EXISTS so the movies are still read in the order of the statistics index
+    genres = parse_genres(genre)
+    groups = [genres] if genre_mode == "any" and genres else [[name] for name in genres]
+    for names in groups:
+        query = query.filter(
+            select(models.MovieGenre.moviesId)
+            .where(models.MovieGenre.moviesId == models.MovieStats.moviesId, models.MovieGenre.genre.in_(names))
+            .exists()
+        )
+    # Equal statistics are ordered by moviesId, read from the same index, so skip/limit pages are stable
+    query = query.order_by(desc(TOP_MOVIES_ORDER[by]), desc(models.MovieStats.moviesId))
+
+    return [
+        {
+            "moviesId": movie.moviesId,
+            "title": movie.title,
+            "genres": movie.genres,
+            "rating_count": stats.rating_count,
+            "rating_mean": stats.rating_mean,
+            "rating_stddev": stats.rating_stddev,
+            "weighted_score": stats.weighted_score,
+            "last_rated_at": stats.last_rated_at,
+        }
+        for movie, stats in query.offset(skip).limit(limit).all()
+    ]
+
+def get_similar_movies(db: Session, movies_Id: int, k: int = 10) -> list:
+    """ Retrieve the k movies most similar to a movie, read in rank order from movie_similarity """
+    rows = (
+        db.query(models.Movie.moviesId, models.Movie.title, models.Movie.genres, models.MovieSimilarity.similarity)
+        .join(models.MovieSimilarity, models.MovieSimilarity.similarMoviesId == models.Movie.moviesId)
+        .filter(models.MovieSimilarity.moviesId == movies_Id)
+        .order_by(models.MovieSimilarity.rank)
+        .limit(k)
+        .all()
+    )
+    return [{"moviesId": movies_id, "title": title, "genres": genres, "similarity": similarity}
+            for movies_id, title, genres, similarity in rows]
+
+# --- Users ---
+
+# Number of genres kept in the profile of a user
+USER_TOP_GENRES = 5
+
+def top_genres(genres) -> list:
+    """ Keep the USER_TOP_GENRES most rated of (genre, count, sum of the ratings) tuples, by count then name """
+    return sorted(genres, key = lambda genre: (-genre[1], genre[0]))[:USER_TOP_GENRES]
+
+def compute_user_stats(user_Id: int, histogram: dict, first_activity_at: Optional[int], last_activity_at: Optional[int],
+                       tag_count: int, genres: list) -> dict:
+    """ Build a user_stats row from the number of ratings per value, the activity bounds and the (genre, count, sum) of the rated genres """
+    count = sum(histogram.values())
+    return {
+        "userId": user_Id,
+        "rating_count": count,
+        "rating_mean": sum(rating * number for rating, number in histogram.items()) / count if count else None,
+        "rating_histogram": json.dumps({str(rating): number for rating, number in sorted(histogram.items())}),
+        "first_activity_at": first_activity_at,
+        "last_activity_at": last_activity_at,
+        "tag_count": tag_count,
+        "top_genres": json.dumps([{"genre": genre, "count": number, "mean": total / number} for genre, number, total in top_genres(genres)]),
+    }
+
+def get_user_stats(db: Session, user_Id: int) -> Optional[dict]:
+    """ Retrieve the precomputed profile of a user, None for an unknown user """
+    stats = db.get(models.UserStats, user_Id)
+    if stats is None:
+        return None
+    return {
+        "userId": stats.userId,
+        "rating_count": stats.rating_count,
+        "rating_mean": stats.rating_mean,
+        "rating_histogram": {float(rating): number for rating, number in json.loads(stats.rating_histogram).items()},
+        "first_activity_at": stats.first_activity_at,
+        "last_activity_at": stats.last_activity_at,
+        "tag_count": stats.tag_count,
+        "top_genres": json.loads(stats.top_genres),
+    }
+
+# Sort key of the ratings of a user, moviesId making it unique for the cursor
+USER_RATINGS_ORDER = {
+    "time": ("timestamp", "moviesId"),
+    "score": ("rating", "moviesId"),
+}
+
+def get_user_ratings(db: Session, user_Id: int, sort: str = "time", order: str = "desc", skip: int = 0, limit: int = 100,
+                     cursor: Optional[str] = None, as_rows: bool = False):
+    """ Retrieve the ratings of a user ordered by time or by rating, the most recent or best first by default
+
+    By time, the ratings are read in order from the (userId, timestamp, moviesId) index, and the
+    cursor seeks into it; by rating, the ratings of the user are read from the primary key and sorted.
+    """
+    keys = [getattr(models.Rating, key) for key in USER_RATINGS_ORDER[sort]]
+    query = _select(db, models.Rating, as_rows).filter(models.Rating.userId == user_Id)
+    if cursor:
+        values = decode_cursor(cursor, len(keys))
+        seek = tuple_(*keys) < tuple_(*values) if order == "desc" else tuple_(*keys) > tuple_(*values)
+        query = query.filter(seek)
+    query = query.order_by(*(desc(key) if order == "desc" else key for key in keys))
+    return query.offset(skip).limit(limit).all()
+
+# --- Export ---
+
+EXPORT_MODELS = {
+    "movies": models.Movie,
+    "ratings": models.Rating,
+    "tags": models.Tag,
+    "links": models.Link,
+}
+
+def get_columns(model) -> list:
+    """ Return the column attributes of a model, in table order """
+    return [getattr(model, column.key) for column in model.__table__.columns]
+
+def export_rows(db: Session, table: str, movies_Id: Optional[int] = None, user_Id: Optional[int] = None,
+                min_rating: Optional[float] = None, batch_size: int = 10000):
+    """ Stream all the rows of a table as plain tuples, fetched from a server side cursor by batches
+
+    Ratings and tags honor the same filters as get_ratings and get_tags.
+    """
+    model = EXPORT_MODELS[table]
+    query = db.query(*get_columns(model))
+    if model is models.Rating:
+        query, _ = _filter_ratings(query, movies_Id, user_Id, min_rating)
+    elif model is models.Tag:
+        query, _ = _filter_tags(query, movies_Id, user_Id)
+    query = query.order_by(*(getattr(model, key) for key in CURSOR_KEYS[model]))
+    return query.execution_options(yield_per = batch_size, stream_results = True)
 
 # Analytic Queries 
 
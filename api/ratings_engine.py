@@ -0,0 +1,198 @@
+""" In-memory read engine of the ratings: NumPy columns sorted by user and by movie, memory-mapped from a snapshot"""
+import collections
+import os
+import shutil
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from settings import settings
+import dataset
+
+# Suffix of the snapshot directories of the engine, next to the Arrow and Parquet snapshots
+ENGINE_SUFFIX = ".engine"
+
+# Rating columns in (userId, moviesId) order, the primary key order served by the SQL queries
+COLUMNS = {"users": np.int32, "movies": np.int32, "ratings": np.float32, "timestamps": np.int64}
+# CSR indexes: the IDs of the users and movies and the offsets of their ratings. The ratings of a
+# movie are the positions by_movie[movie_indptr[i]:movie_indptr[i + 1]] of the columns, by userId.
+INDEXES = ("user_ids", "user_indptr", "movie_ids", "movie_indptr", "by_movie")
+
+# Rows read from the database at once while building the snapshot
+READ_BATCH_SIZE = 1_000_000
+# Ratings checked at once when min_rating filters a range
+SCAN_CHUNK_SIZE = 65536
+
+# A rating row, with the attributes of the columns like the rows of the SQL queries
+RatingRow = collections.namedtuple("RatingRow", ["userId", "moviesId", "rating", "timestamp"])
+
+_lock = threading.Lock()
+_cache = {}
+
+
+def engine_path(directory: Path, version: str) -> Path:
+    """ Directory of the snapshot of the engine for a version of the dataset """
+    return Path(directory) / f"ratings-{version}{ENGINE_SUFFIX}"
+
+
+def build_snapshot(engine, directory: Path, version: str) -> int:
+    """ Write the columns and CSR indexes of the ratings as .npy files, return the number of ratings
+
+    The ratings are read in primary key order and the positions by movie come from a stable sort,
+    so the ratings of a movie stay ordered by userId.
+    """
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.execute('SELECT "userId", "moviesId", rating, timestamp FROM ratings ORDER BY "userId", "moviesId"')
+        chunks = []
+        for rows in iter(lambda: cursor.fetchmany(READ_BATCH_SIZE), []):
+            chunk = np.array(rows, dtype = np.float64)
+            chunks.append([chunk[:, index].astype(dtype) for index, dtype in enumerate(COLUMNS.values())])
+        cursor.close()
+    finally:
+        raw_connection.close()
+    columns = {name: np.concatenate([chunk[index] for chunk in chunks]) if chunks else np.empty(0, dtype)
+               for index, (name, dtype) in enumerate(COLUMNS.items())}
+    del chunks
+
+    user_ids, user_counts = np.unique(columns["users"], return_counts = True)
+    by_movie = np.argsort(columns["movies"], kind = "stable").astype(np.int64)
+    movie_ids, movie_counts = np.unique(columns["movies"], return_counts = True)
+    arrays = {
+        **columns,
+        "user_ids": user_ids.astype(np.int32), "user_indptr": np.concatenate(([0], np.cumsum(user_counts))).astype(np.int64),
+        "movie_ids": movie_ids.astype(np.int32), "movie_indptr": np.concatenate(([0], np.cumsum(movie_counts))).astype(np.int64),
+        "by_movie": by_movie,
+    }
+
+    path = engine_path(directory, version)
+    # Written under a temporary name and renamed once complete, so a half written snapshot is never opened
+    building = path.with_name(path.name + ".building")
+    shutil.rmtree(building, ignore_errors = True)
+    building.mkdir(parents = True)
+    for name, array in arrays.items():
+        np.save(building / f"{name}.npy", array)
+    shutil.rmtree(path, ignore_errors = True)
+    os.replace(building, path)
+    return len(columns["users"])
+
+
+class RatingsEngine:
+    """ Answer the ratings queries of the API with array slicing on memory-mapped columns
+
+    The arrays are mapped read-only: opening the engine reads nothing, the pages are loaded on
+    first access and shared through the page cache by all the worker processes.
+    """
+
+    def __init__(self, path: Path, version: Optional[str] = None):
+        self.path = Path(path)
+        self.version = version
+        for name in (*COLUMNS, *INDEXES):
+            setattr(self, name, np.load(self.path / f"{name}.npy", mmap_mode = "r"))
+
+    def _user_range(self, user_Id: int) -> tuple:
+        """ Start and stop of the ratings of a user in the columns """
+        index = int(np.searchsorted(self.user_ids, user_Id))
+        if index < len(self.user_ids) and self.user_ids[index] == user_Id:
+            return int(self.user_indptr[index]), int(self.user_indptr[index + 1])
+        return 0, 0
+
+    def _movie_positions(self, movies_Id: int) -> np.ndarray:
+        """ Positions of the ratings of a movie in the columns, by userId """
+        index = int(np.searchsorted(self.movie_ids, movies_Id))
+        if index < len(self.movie_ids) and self.movie_ids[index] == movies_Id:
+            return self.by_movie[self.movie_indptr[index]:self.movie_indptr[index + 1]]
+        return self.by_movie[:0]
+
+    def _seek(self, user_Id: int, movies_Id: int) -> int:
+        """ Position of the first rating after the key (user_Id, movies_Id) """
+        index = int(np.searchsorted(self.user_ids, user_Id))
+        if index < len(self.user_ids) and self.user_ids[index] == user_Id:
+            start, stop = int(self.user_indptr[index]), int(self.user_indptr[index + 1])
+            return start + int(np.searchsorted(self.movies[start:stop], movies_Id, side = "right"))
+        return int(self.user_indptr[index])
+
+    def _select(self, positions, skip: int, limit: int, min_rating: Optional[float]) -> np.ndarray:
+        """ Positions of the page: a range (start, stop) or an array of positions, filtered by min_rating
+
+        Without min_rating the page is a slice. With it, the candidates are checked chunk by chunk
+        until the page is complete, like the SQL scan stops at the LIMIT.
+        """
+        if isinstance(positions, tuple):
+            start, stop = positions
+            if not min_rating:
+                return np.arange(min(start + skip, stop), min(start + skip + limit, stop))
+            chunks = (np.arange(begin, min(begin + SCAN_CHUNK_SIZE, stop)) for begin in range(start, stop, SCAN_CHUNK_SIZE))
+        else:
+            if not min_rating:
+                return np.asarray(positions[skip:skip + limit])
+            chunks = (positions[begin:begin + SCAN_CHUNK_SIZE] for begin in range(0, len(positions), SCAN_CHUNK_SIZE))
+
+        found, count = [], 0
+        for chunk in chunks:
+            matching = chunk[self.ratings[chunk] >= min_rating]
+            found.append(matching)
+            count += len(matching)
+            if count >= skip + limit:
+                break
+        return np.concatenate(found)[skip:skip + limit] if found else np.empty(0, dtype = np.int64)
+
+    def rows(self, positions: np.ndarray) -> list:
+        """ Rating rows of the given positions """
+        return list(map(RatingRow._make, zip(self.users[positions].tolist(), self.movies[positions].tolist(),
+                                             self.ratings[positions].tolist(), self.timestamps[positions].tolist())))
+
+    def get_ratings(self, skip: int = 0, limit: int = 100, movies_Id: int = None, user_Id: int = None,
+                    min_rating: float = None, after: Optional[list] = None) -> list:
+        """ Ratings with the filters and the (userId, moviesId) order of query_helpers.get_ratings
+
+        `after` is the decoded cursor: the key of the last rating of the previous page.
+        """
+        if user_Id:
+            start, stop = self._user_range(user_Id)
+            if movies_Id:
+                start += int(np.searchsorted(self.movies[start:stop], movies_Id))
+                # A single rating matches both IDs: no page follows it
+                stop = start + 1 if start < stop and self.movies[start] == movies_Id and not after else start
+            elif after:
+                start += int(np.searchsorted(self.movies[start:stop], after[1], side = "right"))
+            positions = (start, stop)
+        elif movies_Id:
+            positions = self._movie_positions(movies_Id)
+            if after:
+                positions = positions[int(np.searchsorted(self.users[positions], after[0], side = "right")):]
+        else:
+            positions = (self._seek(*after) if after else 0, len(self.users))
+        return self.rows(self._select(positions, skip, limit, min_rating))
+
+    def get_rating_stats(self, movies_Id: int) -> dict:
+        """ Count, mean and histogram of the ratings of a movie, as query_helpers.get_rating_stats """
+        values, counts = np.unique(self.ratings[self._movie_positions(movies_Id)], return_counts = True)
+        histogram = dict(zip(values.tolist(), counts.tolist()))
+        count = sum(histogram.values())
+        mean = sum(value * n for value, n in histogram.items()) / count if count else None
+        return {"count": count, "mean": mean, "histogram": histogram}
+
+
+def get_engine(db: Session) -> Optional[RatingsEngine]:
+    """ Return the engine of the current dataset version, None when it is disabled or its snapshot was not built
+
+    The snapshot is opened once per version; the helpers fall back to SQL without it.
+    """
+    if not settings.ratings_engine:
+        return None
+    version = dataset.get_data_version(db)["version"]
+    cached = _cache.get("engine")
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    with _lock:
+        cached = _cache.get("engine")
+        if cached is None or cached[0] != version:
+            path = engine_path(settings.snapshot_dir, version) if version else None
+            _cache["engine"] = (version, RatingsEngine(path, version) if path is not None and path.is_dir() else None)
+        return _cache["engine"][1]
@@ -0,0 +1,31 @@
+""" Bulk read of the ratings into NumPy arrays, shared by the offline jobs (train_recommender.py, build_similarity.py)"""
+import numpy as np
+
+# Ratings read from the database at once
+READ_CHUNK_SIZE = 1_000_000
+
+
+def read_ratings(engine, chunk_size: int = READ_CHUNK_SIZE) -> tuple:
+    """ Read the user, movie and rating of every rating into three NumPy arrays, chunk by chunk
+
+    The rows are read on a raw DBAPI cursor, which skips building Row objects.
+    """
+    raw_connection = engine.raw_connection()
+    try:
+        cursor = raw_connection.cursor()
+        cursor.execute('SELECT "userId", "moviesId", rating FROM ratings')
+        users, movies, ratings = [], [], []
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            chunk = np.array(rows, dtype = np.float64)
+            users.append(chunk[:, 0].astype(np.int32))
+            movies.append(chunk[:, 1].astype(np.int32))
+            ratings.append(chunk[:, 2].astype(np.float32))
+        cursor.close()
+    finally:
+        raw_connection.close()
+    if not users:
+        return np.empty(0, np.int32), np.empty(0, np.int32), np.empty(0, np.float32)
+    return np.concatenate(users), np.concatenate(movies), np.concatenate(ratings)
@@ -0,0 +1,179 @@
+""" Movie recommendations served from the factors of the model trained by train_recommender.py"""
+import json
+import threading
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from settings import settings
+import dataset
+import models
+import query_helpers as helpers
+
+# Arrays of a trained model, each one saved as `<name>.npy` and memory-mapped by the API
+MODEL_ARRAYS = ("user_ids", "user_factors", "user_bias", "item_ids", "item_factors", "item_bias")
+
+# Ratings added to the count of a user or a movie when averaging its bias, pulling the biases
+# of the users and movies with few ratings toward 0
+BIAS_DAMPING = 10.0
+
+# Number of trained models kept: the one of the new dataset version and the previous one
+MODEL_VERSIONS_KEPT = 2
+
+_lock = threading.Lock()
+_cache = {}
+
+
+class ModelNotTrained(Exception):
+    """ No recommendation model has been trained yet """
+
+
+def model_path(directory: Path, version: str) -> Path:
+    """ Directory of the model trained on a version of the dataset """
+    return Path(directory) / version
+
+
+def trained_models(directory: Path) -> list:
+    """ Directories of the complete models, the most recently trained first """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    paths = [path for path in directory.iterdir() if (path / "meta.json").is_file() and not path.name.endswith(".building")]
+    return sorted(paths, key = lambda path: (path / "meta.json").stat().st_mtime, reverse = True)
+
+
+def _saved_at(path: Path) -> int:
+    """ Modification time of the meta.json of a model, which changes when the model is trained again """
+    return (Path(path) / "meta.json").stat().st_mtime_ns
+
+
+def load_model(path: Path) -> dict:
+    """ Open the arrays of a model memory-mapped: their pages are read on demand and shared between the workers """
+    saved_at = _saved_at(path)
+    model = {name: np.load(Path(path) / f"{name}.npy", mmap_mode = "r") for name in MODEL_ARRAYS}
+    model["meta"] = json.loads((Path(path) / "meta.json").read_text())
+    model["path"] = Path(path)
+    model["saved_at"] = saved_at
+    return model
+
+
+def _is_current(model: dict, version: Optional[str]) -> bool:
+    """ Tell whether a cached model is still the one to serve for a dataset version """
+    if model["data_version"] != version:
+        return False
+    # A fallback model is kept until the model of the current version appears
+    if version is not None and model["path"].name != version and model_path(settings.model_dir, version).is_dir():
+        return False
+    try:
+        return _saved_at(model["path"]) == model["saved_at"]
+    except FileNotFoundError:
+        return False
+
+
+def current_model(version: Optional[str]) -> dict:
+    """ Return the model of a dataset version, or the most recent one until it is trained
+
+    The model is opened once and reused while the dataset version, the chosen directory and its
+    training stay the same. Raise ModelNotTrained when no model has been trained.
+    """
+    cached = _cache.get("model")
+    if cached is not None and _is_current(cached, version):
+        return cached
+
+    with _lock:
+        current = model_path(settings.model_dir, version) if version else None
+        if current is not None and current.is_dir():
+            path = current
+        else:
+            trained = trained_models(settings.model_dir)
+            if not trained:
+                raise ModelNotTrained("No recommendation model, train it with train_recommender.py")
+            path = trained[0]
+        cached = _cache.get("model")
+        if cached is None or cached["path"] != path or cached["saved_at"] != _saved_at(path):
+            cached = load_model(path)
+        _cache["model"] = {**cached, "data_version": version}
+        return _cache["model"]
+
+
+def get_model(db: Session) -> dict:
+    """ Return the model to serve for the current dataset version (see current_model) """
+    return current_model(dataset.get_data_version(db)["version"])
+
+
+def trained_at(version: Optional[str]) -> Optional[int]:
+    """ Training time of the model served for a dataset version, None when no model has been trained
+
+    Part of the ETag of the recommendations, which change when the model is trained again
+    while the dataset version stays the same.
+    """
+    try:
+        return current_model(version)["meta"]["trained_at"]
+    except ModelNotTrained:
+        return None
+
+
+def fold_in(model: dict, item_index: np.ndarray, ratings: np.ndarray) -> tuple:
+    """ Bias and factors of a user unknown to the model, fitted on their ratings against the fixed movie factors """
+    meta = model["meta"]
+    item_bias = model["item_bias"][item_index]
+    user_bias = float(np.sum(ratings - meta["global_mean"] - item_bias) / (len(ratings) + meta["bias_damping"]))
+    residuals = (ratings - meta["global_mean"] - user_bias - item_bias).astype(np.float32)
+    vectors = model["item_factors"][item_index]
+    gram = vectors.T @ vectors + meta["regularization"] * len(ratings) * np.eye(vectors.shape[1], dtype = np.float32)
+    return user_bias, np.linalg.solve(gram, vectors.T @ residuals).astype(np.float32)
+
+
+def recommend(db: Session, user_Id: int, k: int = 10, genre: Optional[str] = None, genre_mode: str = "all") -> Optional[list]:
+    """ Recommend the k movies with the highest predicted rating that a user has not rated yet
+
+    The predictions of all the movies are a single product of the movie factors with the user
+    factors; the rated movies and those outside the genres are masked and the top k are selected
+    with argpartition. They are ranked on the raw predictions, only the returned scores are
+    clipped to the rating scale. Users who rated after the training are fitted on the fly on their ratings.
+    Return None when the user has no rating.
+    """
+    model = get_model(db)
+    item_ids = model["item_ids"]
+    rated = db.query(models.Rating.moviesId, models.Rating.rating).filter(models.Rating.userId == user_Id).all()
+    if not rated:
+        return None
+    rated_ids = np.fromiter((movies_id for movies_id, _ in rated), dtype = np.int64, count = len(rated))
+    rated_index = np.searchsorted(item_ids, rated_ids).clip(max = len(item_ids) - 1)
+    known = item_ids[rated_index] == rated_ids
+
+    user = np.searchsorted(model["user_ids"], user_Id)
+    if user < len(model["user_ids"]) and model["user_ids"][user] == user_Id:
+        user_bias, user_factors = float(model["user_bias"][user]), model["user_factors"][user]
+    elif known.any():
+        ratings = np.fromiter((rating for _, rating in rated), dtype = np.float32, count = len(rated))
+        user_bias, user_factors = fold_in(model, rated_index[known], ratings[known])
+    else:
+        user_bias, user_factors = 0.0, np.zeros(model["item_factors"].shape[1], dtype = np.float32)
+
+    scores = model["item_factors"] @ user_factors + model["item_bias"] + (model["meta"]["global_mean"] + user_bias)
+    scores[rated_index[known]] = -np.inf
+    genres = helpers.parse_genres(genre)
+    if genres:
+        query, _ = helpers.filter_genres(db.query(models.Movie.moviesId), genres, genre_mode)
+        genre_ids = np.fromiter((movies_id for movies_id, in query), dtype = np.int64)
+        allowed = np.zeros(len(item_ids), dtype = bool)
+        genre_index = np.searchsorted(item_ids, genre_ids).clip(max = len(item_ids) - 1)
+        allowed[genre_index[item_ids[genre_index] == genre_ids]] = True
+        scores[~allowed] = -np.inf
+
+    k = min(k, int(np.isfinite(scores).sum()))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind = "stable")]
+
+    top_ids = [int(movies_id) for movies_id in item_ids[top]]
+    movies = {movie.moviesId: movie for movie in helpers.get_movies_batch(db, top_ids)}
+    return [
+        {"moviesId": movies_id, "title": movies[movies_id].title, "genres": movies[movies_id].genres,
+         "score": float(np.clip(scores[index], 0.5, 5.0))}
+        for movies_id, index in zip(top_ids, top) if movies_id in movies
+    ]
@@ -1,5 +1,6 @@
-from pydantic import BaseModel
-from typing import Optional, List
+from enum import Enum
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List, Tuple
 
 # --- Second Schemas ---
 
@@ -28,6 +29,12 @@ class LinkBase(BaseModel):
         orm_mode = True
         
         
+class RatingStats(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    histogram: Dict[float, int] = {}
+        
+        
 # --- Main Schema for Movies ---
 
 class MovieBase(BaseModel):
@@ -43,6 +50,7 @@ class MovieDetailed(MovieBase):
     ratings: List[RatingBase] = []
     tags: List[TagBase] = []
     links: Optional[LinkBase] = None
+    rating_stats: Optional[RatingStats] = None
     
     class Config:
         orm_mode = True
@@ -57,6 +65,39 @@ class MovieSimple(MovieBase):
     class Config: 
         orm_mode = True
         
+class MovieSearchResult(MovieSimple):
+    score: float
+        
+class MovieTop(MovieSimple):
+    rating_count: int
+    rating_mean: float
+    rating_stddev: float
+    weighted_score: float
+    last_rated_at: Optional[int] = None
+        
+class SimilarMovie(MovieSimple):
+    similarity: float
+        
+class Recommendation(MovieSimple):
+    score: float # predicted rating
+        
+#--- Schemas of the users ---
+
+class GenreActivity(BaseModel):
+    genre: str
+    count: int
+    mean: float
+
+class UserProfile(BaseModel):
+    userId: int
+    rating_count: int
+    rating_mean: Optional[float] = None
+    rating_histogram: Dict[float, int] = {}
+    first_activity_at: Optional[int] = None
+    last_activity_at: Optional[int] = None
+    tag_count: int
+    top_genres: List[GenreActivity] = []
+        
 #--- Schemas for the endpoints of ratings and tags ---
 
 class RatingSimple(BaseModel):
@@ -92,7 +133,40 @@ class AnalyticsResponse(BaseModel):
     rating_count: int
     tag_count: int
     link_count: int
+    user_count: Optional[int] = None
+    rating_histogram: Dict[float, int] = {}
+    ratings_per_year: Dict[int, int] = {}
+    genre_counts: Dict[str, int] = {}
+    user_activity: Dict[str, float] = {}
+    data_version: Optional[str] = None
     
     class Config:
         orm_mode = True
-        
+
+# --- Options of the export endpoints ---
+
+class ExportTable(str, Enum):
+    movies = "movies"
+    ratings = "ratings"
+    tags = "tags"
+    links = "links"
+
+class ExportFormat(str, Enum):
+    ndjson = "ndjson"
+    csv = "csv"
+    arrow = "arrow"
+
+class SnapshotFormat(str, Enum):
+    arrow = "arrow"
+    parquet = "parquet"
+
+# --- Schemas of the batch lookups ---
+
+# Largest number of IDs or pairs resolved by a single batch request
+BATCH_MAX_SIZE = 5000
+
+class MovieIdsBatch(BaseModel):
+    moviesIds: List[int] = Field(..., min_length = 1, max_length = BATCH_MAX_SIZE)
+
+class UserMoviePairsBatch(BaseModel):
+    pairs: List[Tuple[int, int]] = Field(..., min_length = 1, max_length = BATCH_MAX_SIZE, description = "(userId, moviesId) pairs")
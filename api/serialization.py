@@ -0,0 +1,122 @@
+""" Encoding of plain rows for the list endpoints: JSON (with orjson when installed), columnar JSON or Arrow IPC"""
+import io
+import json
+from typing import Iterable, Optional
+from fastapi import Response
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Encoder of the JSON responses, logged when the API starts: the standard json module is several times slower
+JSON_ENCODER = "orjson" if orjson is not None else "json"
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# --- Media types ---
+
+JSON = "application/json"
+# {"columns": {"userId": [...], ...}, "types": {"userId": "int32", ...}}: one array per column
+COLUMNAR_JSON = "application/vnd.movies.columnar+json"
+# Arrow IPC stream: a schema followed by record batches (only when pyarrow is installed)
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+# Integer columns whose values do not fit in 32 bits
+WIDE_INTEGER_COLUMNS = {"timestamp"}
+
+
+def negotiate(accept: Optional[str]) -> str:
+    """ Choose the media type of a response from the Accept header of the request """
+    accept = accept or ""
+    if ARROW_STREAM in accept and pyarrow is not None:
+        return ARROW_STREAM
+    if COLUMNAR_JSON in accept:
+        return COLUMNAR_JSON
+    return JSON
+
+
+def column_type(column) -> str:
+    """ Compact type of a column on the wire: int32, int64, float32 or string """
+    python_type = column.type.python_type
+    if python_type is int:
+        return "int64" if column.key in WIDE_INTEGER_COLUMNS else "int32"
+    if python_type is float:
+        return "float32"
+    return "string"
+
+
+def dumps(value) -> bytes:
+    """ Encode a value of JSON types to UTF-8 bytes """
+    if orjson is not None:
+        return orjson.dumps(value)
+    return json.dumps(value, separators = (",", ":"), ensure_ascii = False).encode()
+
+
+def encode_rows(keys: list, rows) -> bytes:
+    """ Encode rows of column values as a JSON array of objects keyed by the column names """
+    return dumps([dict(zip(keys, row)) for row in rows])
+
+
+def encode_columns(columns: list, rows) -> bytes:
+    """ Encode rows of column values as columnar JSON: one array per column and the types of the columns """
+    values = list(zip(*rows)) or [()] * len(columns)
+    return dumps({
+        "columns": {column.key: list(column_values) for column, column_values in zip(columns, values)},
+        "types": {column.key: column_type(column) for column in columns},
+    })
+
+
+def arrow_schema(columns: list):
+    """ Arrow schema of the given model columns """
+    return pyarrow.schema([(column.key, pyarrow.type_for_alias(column_type(column))) for column in columns])
+
+
+def arrow_batch(schema, rows):
+    """ Arrow record batch of rows of column values """
+    values = list(zip(*rows)) or [()] * len(schema)
+    return pyarrow.record_batch([pyarrow.array(column_values, type = field.type) for field, column_values in zip(schema, values)],
+                                schema = schema)
+
+
+def encode_arrow(columns: list, rows) -> bytes:
+    """ Encode rows of column values as an Arrow IPC stream of a single record batch """
+    schema = arrow_schema(columns)
+    sink = pyarrow.BufferOutputStream()
+    with pyarrow.ipc.new_stream(sink, schema) as writer:
+        writer.write_batch(arrow_batch(schema, rows))
+    return sink.getvalue().to_pybytes()
+
+
+def stream_arrow(columns: list, batches: Iterable[list]):
+    """ Generate an Arrow IPC stream batch by batch: the schema with the first batch, then each batch """
+    schema = arrow_schema(columns)
+    buffer = io.BytesIO()
+    with pyarrow.ipc.new_stream(buffer, schema) as writer:
+        for rows in batches:
+            writer.write_batch(arrow_batch(schema, rows))
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+
+class RowsResponse(Response):
+    """ Response of rows read from the database, in the media type negotiated with the client
+
+    The rows come straight from typed columns matching the response model, so they are
+    encoded as they are instead of being validated by the response model one by one.
+    """
+
+    def __init__(self, columns: list, rows, media_type: str = JSON, **kwargs):
+        if media_type == ARROW_STREAM:
+            content = encode_arrow(columns, rows)
+        elif media_type == COLUMNAR_JSON:
+            content = encode_columns(columns, rows)
+        else:
+            content = encode_rows([column.key for column in columns], rows)
+        super().__init__(content = content, media_type = media_type, **kwargs)
@@ -0,0 +1,93 @@
+""" Versioned Arrow IPC and Parquet snapshots of the tables, built by the loader and served as files"""
+import itertools
+import os
+import shutil
+from pathlib import Path
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+import query_helpers as helpers
+import ratings_engine
+import serialization
+
+try:
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# File extension and media type of each snapshot format. The Arrow files use the IPC file format
+# (random access), so that clients can memory-map them instead of reading them.
+SNAPSHOT_FORMATS = {
+    "arrow": (".arrow", "application/vnd.apache.arrow.file"),
+    "parquet": (".parquet", "application/vnd.apache.parquet"),
+}
+
+# Number of rows per Arrow record batch and Parquet row group
+SNAPSHOT_BATCH_SIZE = 65536
+
+# Number of dataset versions whose snapshots are kept: the new one and the previous one,
+# still served until the running APIs see the new version
+SNAPSHOT_VERSIONS_KEPT = 2
+
+
+def snapshot_path(directory: Path, table: str, format: str, version: str) -> Path:
+    """ File of the snapshot of a table in a format, for a version of the dataset """
+    return Path(directory) / f"{table}-{version}{SNAPSHOT_FORMATS[format][0]}"
+
+
+def _write_snapshot(db: Session, table: str, directory: Path, version: str) -> dict:
+    """ Write the Arrow and Parquet snapshots of a table from a single pass over its rows """
+    columns = helpers.get_columns(helpers.EXPORT_MODELS[table])
+    schema = serialization.arrow_schema(columns)
+    paths = {format: snapshot_path(directory, table, format, version) for format in SNAPSHOT_FORMATS}
+    # Written under temporary names and renamed once complete, so a half written file is never served
+    building = {format: path.with_name(path.name + ".building") for format, path in paths.items()}
+
+    rows = iter(helpers.export_rows(db, table, batch_size = SNAPSHOT_BATCH_SIZE))
+    count = 0
+    with pyarrow.ipc.new_file(str(building["arrow"]), schema) as arrow_writer, \
+            pyarrow.parquet.ParquetWriter(str(building["parquet"]), schema, compression = "zstd") as parquet_writer:
+        for batch_rows in iter(lambda: list(itertools.islice(rows, SNAPSHOT_BATCH_SIZE)), []):
+            batch = serialization.arrow_batch(schema, batch_rows)
+            arrow_writer.write_batch(batch)
+            parquet_writer.write_batch(batch)
+            count += batch.num_rows
+
+    for format, path in paths.items():
+        os.replace(building[format], path)
+    return {"rows": count, "bytes": {format: path.stat().st_size for format, path in paths.items()}}
+
+
+def build_snapshots(engine, directory: Path, version: str) -> Optional[dict]:
+    """ Write the snapshots of every exported table for a version of the dataset
+
+    Return the number of rows and the file sizes per table, None when pyarrow is not installed.
+    """
+    if pyarrow is None or serialization.pyarrow is None:
+        return None
+    directory = Path(directory)
+    directory.mkdir(parents = True, exist_ok = True)
+    with Session(engine) as db:
+        return {table: _write_snapshot(db, table, directory, version) for table in helpers.EXPORT_MODELS}
+
+
+def prune_snapshots(directory: Path, keep: int = SNAPSHOT_VERSIONS_KEPT) -> int:
+    """ Delete the snapshots (and ratings engine snapshots) of all but the `keep` most recently built versions, return the number deleted """
+    directory = Path(directory)
+    if not directory.is_dir():
+        return 0
+    suffixes = tuple(extension for extension, _ in SNAPSHOT_FORMATS.values()) + (ratings_engine.ENGINE_SUFFIX,)
+    files = [path for path in directory.iterdir() if path.name.endswith(suffixes) and "-" in path.stem]
+    built_at = {}
+    for path in files:
+        version = path.stem.rsplit("-", 1)[1]
+        built_at[version] = max(built_at.get(version, 0), path.stat().st_mtime)
+    kept = set(sorted(built_at, key = built_at.get, reverse = True)[:keep])
+    stale = [path for path in files if path.stem.rsplit("-", 1)[1] not in kept]
+    for path in stale:
+        if path.is_dir():
+            shutil.rmtree(path)
+        else:
+            path.unlink()
+    return len(stale)
@@ -0,0 +1,39 @@
+""" Behaviour tests of the batch lookups of movies, ratings, tags and links
+
+Run with: python -m pytest test_batch.py
+"""
+import schemas
+
+
+def test_movies_in_the_order_of_the_ids(client):
+    response = client.post("/movies/batch", json={"moviesIds": [3, 1, 999999999, 2]})
+    assert response.status_code == 200
+    movies = response.json()
+    assert [movie["moviesId"] for movie in movies] == [3, 1, 2]
+    assert movies[1] == client.get("/movies", params={"limit": 1}).json()[0]
+
+
+def test_links_in_the_order_of_the_ids(client):
+    links = client.post("/links/batch", json={"moviesIds": [2, 1]}).json()
+    assert [link["moviesId"] for link in links] == [2, 1]
+    assert links[1] == client.get("/links/1").json()
+
+
+def test_ratings_of_pairs(client):
+    expected = client.get("/ratings", params={"user_Id": 1, "limit": 3}).json()
+    pairs = [[rating["userId"], rating["moviesId"]] for rating in reversed(expected)] + [[1, 999999999]]
+    ratings = client.post("/ratings/batch", json={"pairs": pairs}).json()
+    assert ratings == list(reversed(expected))
+
+
+def test_tags_of_pairs(client):
+    tag = client.get("/tags", params={"limit": 1}).json()[0]
+    tags = client.post("/tags/batch", json={"pairs": [[tag["userId"], tag["moviesId"]]]}).json()
+    assert tag in tags
+    assert all((found["userId"], found["moviesId"]) == (tag["userId"], tag["moviesId"]) for found in tags)
+
+
+def test_batch_size_is_bounded(client):
+    assert client.post("/movies/batch", json={"moviesIds": []}).status_code == 422
+    assert client.post("/movies/batch", json={"moviesIds": list(range(schemas.BATCH_MAX_SIZE + 1))}).status_code == 422
+    assert client.post("/movies/batch", json={"moviesIds": list(range(1, schemas.BATCH_MAX_SIZE + 1))}).status_code == 200
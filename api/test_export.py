@@ -0,0 +1,48 @@
+""" Behaviour tests of the exports of whole tables as NDJSON, CSV and Arrow streams
+
+Run with: python -m pytest test_export.py
+"""
+import csv
+import io
+import json
+
+import pyarrow.ipc
+
+import serialization
+
+
+def test_ndjson_holds_every_row(client):
+    response = client.get("/export/links", params={"format": "ndjson"})
+    assert response.status_code == 200
+    assert response.headers["Content-Type"].startswith("application/x-ndjson")
+    rows = [json.loads(line) for line in response.text.splitlines()]
+    assert len(rows) == client.get("/analytics").json()["movie_count"]
+    assert set(rows[0]) == {"moviesId", "imdbId", "tmdbId"}
+
+
+def test_csv_matches_ndjson(client):
+    ndjson = [json.loads(line) for line in client.get("/export/tags", params={"format": "ndjson"}).text.splitlines()]
+    response = client.get("/export/tags", params={"format": "csv"})
+    assert response.headers["Content-Disposition"] == "attachment; filename=tags.csv"
+    rows = list(csv.DictReader(io.StringIO(response.text)))
+    assert len(rows) == len(ndjson)
+    assert [row["tag"] for row in rows] == [row["tag"] for row in ndjson]
+
+
+def test_arrow_matches_ndjson(client):
+    ndjson = [json.loads(line) for line in client.get("/export/ratings", params={"format": "ndjson", "movies_Id": 1}).text.splitlines()]
+    response = client.get("/export/ratings", params={"movies_Id": 1}, headers={"Accept": serialization.ARROW_STREAM})
+    assert response.headers["Content-Type"] == serialization.ARROW_STREAM
+    table = pyarrow.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert table.to_pylist() == ndjson
+
+
+def test_filters_of_ratings(client):
+    rows = [json.loads(line) for line in client.get("/export/ratings", params={"user_Id": 1, "min_rating": 4.5}).text.splitlines()]
+    assert rows and all(row["userId"] == 1 and row["rating"] >= 4.5 for row in rows)
+    whole = client.get("/ratings", params={"user_Id": 1, "min_rating": 4.5, "limit": 1000}).json()
+    assert [row["moviesId"] for row in rows] == [row["moviesId"] for row in whole]
+
+
+def test_unsupported_filter_is_rejected(client):
+    assert client.get("/export/movies", params={"user_Id": 1}).status_code == 400
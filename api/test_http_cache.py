@@ -0,0 +1,74 @@
+""" Behaviour tests of the conditional requests: ETag, If-None-Match, If-Modified-Since, 304 and HEAD
+
+Run with: python -m pytest test_http_cache.py
+"""
+from email.utils import formatdate
+import time
+
+import pytest
+
+import main
+
+
+def test_revalidation_with_the_etag_gets_304(client):
+    response = client.get("/movies/1")
+    assert response.status_code == 200
+    etag = response.headers["ETag"]
+    assert response.headers["Cache-Control"].startswith("public")
+
+    revalidated = client.get("/movies/1", headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["ETag"] == etag
+    assert revalidated.content == b""
+    assert client.get("/movies/2", headers={"If-None-Match": etag}).status_code == 200
+
+
+def test_etag_depends_on_the_accept_header(client):
+    json_etag = client.get("/movies", params={"limit": 5}).headers["ETag"]
+    columnar = client.get("/movies", params={"limit": 5}, headers={"Accept": "application/vnd.movies.columnar+json"})
+    assert columnar.headers["ETag"] != json_etag
+
+
+@pytest.mark.parametrize("path", ["/movies/999999999", "/movies/999999999/similar", "/ratings/1/999999999", "/no/such/path"])
+def test_wildcard_and_dates_never_hide_a_missing_resource(client, path):
+    assert client.get(path, headers={"If-None-Match": "*"}).status_code == 404
+    future = formatdate(time.time() + 86400, usegmt=True)
+    assert client.get(path, headers={"If-Modified-Since": future}).status_code == 404
+
+
+def test_wildcard_and_dates_match_an_existing_resource(client):
+    assert client.get("/movies/1", headers={"If-None-Match": "*"}).status_code == 304
+    future = formatdate(time.time() + 86400, usegmt=True)
+    assert client.get("/movies/1", headers={"If-Modified-Since": future}).status_code == 304
+    assert client.get("/movies/1", headers={"If-Modified-Since": formatdate(0, usegmt=True)}).status_code == 200
+
+
+def test_not_modified_page_keeps_its_cursor(client):
+    page = client.get("/ratings", params={"limit": 10})
+    cursor, etag = page.headers["X-Next-Cursor"], page.headers["ETag"]
+
+    revalidated = client.get("/ratings", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["X-Next-Cursor"] == cursor
+
+    # Another worker, which did not serve the page, runs the query to find the cursor
+    main._next_cursors.clear()
+    revalidated = client.get("/ratings", params={"limit": 10}, headers={"If-None-Match": etag})
+    assert revalidated.status_code == 304
+    assert revalidated.headers["X-Next-Cursor"] == cursor
+
+
+def test_head_sends_the_headers_of_get_without_body(client):
+    get = client.get("/movies/1")
+    head = client.head("/movies/1")
+    assert head.status_code == 200
+    assert head.content == b""
+    assert head.headers["ETag"] == get.headers["ETag"]
+    assert head.headers["Content-Length"] == get.headers["Content-Length"]
+    assert client.head("/movies/999999999").status_code == 404
+    assert client.head("/movies/1", headers={"If-None-Match": get.headers["ETag"]}).status_code == 304
+
+
+def test_writes_and_unversioned_paths_have_no_etag(client):
+    assert "ETag" not in client.post("/movies/batch", json={"moviesIds": [1, 2]}).headers
+    assert "ETag" not in client.get("/").headers
@@ -0,0 +1,46 @@
+""" Behaviour tests of the movie endpoints: list filters, title search and rankings
+
+Run with: python -m pytest test_movies.py
+"""
+
+
+def titles(response) -> list:
+    assert response.status_code == 200, response.text
+    return [movie["title"] for movie in response.json()]
+
+
+def test_title_filter_matches_substrings(client):
+    found = titles(client.get("/movies", params={"title": "tar", "limit": 1000}))
+    assert any(title.startswith("Star Wars") for title in found)
+    assert all("tar" in title.lower() for title in found)
+
+
+def test_title_filter_is_ordered_by_id(client):
+    movies = client.get("/movies", params={"title": "Toy Story", "limit": 1000}).json()
+    assert [movie["moviesId"] for movie in movies] == sorted(movie["moviesId"] for movie in movies)
+    assert movies[0]["title"] == "Toy Story (1995)"
+
+
+def test_search_matches_word_prefixes_by_relevance(client):
+    results = client.get("/movies/search", params={"q": "toy sto", "limit": 5}).json()
+    assert results[0]["title"].startswith("Toy Story")
+    assert [result["score"] for result in results] == sorted((result["score"] for result in results), reverse=True)
+    assert not any(title.startswith("Star Wars") for title in titles(client.get("/movies/search", params={"q": "tar"})))
+
+
+def test_top_movies_pages_are_stable_on_ties(client):
+    # Many movies share the same number of ratings: the pages must neither repeat nor skip any of them
+    whole = client.get("/movies/top", params={"by": "count", "limit": 1000}).json()
+    pages = [movie for skip in range(0, 1000, 50)
+             for movie in client.get("/movies/top", params={"by": "count", "skip": skip, "limit": 50}).json()]
+    assert [movie["moviesId"] for movie in pages] == [movie["moviesId"] for movie in whole]
+    assert len({movie["moviesId"] for movie in whole}) == 1000
+    keys = [(movie["rating_count"], movie["moviesId"]) for movie in whole]
+    assert keys == sorted(keys, reverse=True)
+
+
+def test_top_movies_filters(client):
+    movies = client.get("/movies/top", params={"by": "mean", "genre": "Comedy", "min_count": 50, "limit": 100}).json()
+    assert movies and all(movie["rating_count"] >= 50 and "Comedy" in movie["genres"] for movie in movies)
+    means = [movie["rating_mean"] for movie in movies]
+    assert means == sorted(means, reverse=True)
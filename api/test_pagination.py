@@ -0,0 +1,72 @@
+""" Behaviour tests of the cursor pagination of /movies, /ratings, /tags and /links
+
+Run with: python -m pytest test_pagination.py
+"""
+import pytest
+
+KEYS = {
+    "/movies": ("moviesId",),
+    "/ratings": ("userId", "moviesId"),
+    "/tags": ("userId", "moviesId", "tag"),
+    "/links": ("moviesId",),
+}
+
+
+def pages(client, path: str, params: dict, max_pages: int = 1000) -> list:
+    """ Follow the cursors of a list endpoint and return its first `max_pages` pages """
+    found, cursor = [], None
+    while len(found) < max_pages:
+        response = client.get(path, params={**params, **({"cursor": cursor} if cursor else {})})
+        assert response.status_code == 200, response.text
+        found.append(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            break
+    return found
+
+
+@pytest.mark.parametrize("path, params", [
+    ("/movies", {"genre": "Western"}),
+    ("/ratings", {"user_Id": 414}),
+    ("/ratings", {"movies_Id": 1, "min_rating": 4.0}),
+    ("/tags", {}),
+    ("/links", {}),
+])
+def test_cursors_walk_the_same_rows_as_one_page(client, path, params):
+    whole = client.get(path, params={**params, "limit": 1000}).json()
+    if len(whole) == 1000:
+        whole = [row for page in pages(client, path, {**params, "limit": 1000}) for row in page]
+    walked = pages(client, path, {**params, "limit": 97})
+    assert [row for page in walked for row in page] == whole
+    assert all(len(page) == 97 for page in walked[:-1])
+
+
+@pytest.mark.parametrize("path", KEYS)
+def test_rows_are_ordered_by_key_without_repeats(client, path):
+    rows = [row for page in pages(client, path, {"limit": 1000}, max_pages=5) for row in page]
+    keys = [tuple(row[key] for key in KEYS[path]) for row in rows]
+    assert keys == sorted(keys)
+    assert len(set(keys)) == len(keys)
+
+
+def test_cursor_matches_skip(client):
+    first = client.get("/ratings", params={"limit": 500})
+    by_cursor = client.get("/ratings", params={"limit": 500, "cursor": first.headers["X-Next-Cursor"]}).json()
+    by_skip = client.get("/ratings", params={"limit": 500, "skip": 500}).json()
+    assert by_cursor == by_skip
+
+
+def test_last_page_has_no_cursor(client):
+    response = client.get("/movies", params={"title": "Toy Story", "limit": 1000})
+    assert response.json() and "X-Next-Cursor" not in response.headers
+
+
+@pytest.mark.parametrize("cursor", ["not-a-cursor", "1"])
+def test_invalid_cursor_is_rejected(client, cursor):
+    assert client.get("/ratings", params={"cursor": cursor}).status_code == 400
+
+
+def test_cursor_of_a_single_pinned_rating_ends_the_pages(client):
+    # userId and moviesId pin the whole key of the ratings: the page after the rating is empty
+    walked = pages(client, "/ratings", {"user_Id": 1, "movies_Id": 1, "limit": 1}, max_pages=5)
+    assert [len(page) for page in walked] == [1, 0]
@@ -0,0 +1,97 @@
+""" Query plan regression tests: every filtered helper must be answered through an index
+
+A temporary database is built from the CSV files, every helper is run with its filters while the
+statements it sends are recorded, and the plan of each statement is checked with EXPLAIN QUERY PLAN.
+Run with: python -m pytest test_query_plans.py
+"""
+import re
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.orm import sessionmaker
+import load_data
+import query_helpers as helpers
+
+# A plan step reading a whole table, directly or through one of its indexes, e.g. "SCAN ratings"
+# or "SCAN ratings USING INDEX sqlite_autoindex_ratings_1" (virtual tables are not matched)
+FULL_SCAN = re.compile(r"^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$")
+# A skip-scan: the index does not lead with the filtered column and every value of its first column
+# is searched in turn, e.g. "SEARCH ratings USING INDEX sqlite_autoindex_ratings_1 (ANY(userId) AND moviesId=?)"
+SKIP_SCAN = re.compile(r"^SEARCH (\w+) USING .*\(ANY\(")
+
+# Helper calls with their filters, as sent by the API endpoints, and the tables the call may walk:
+# a page of an unfiltered list or ranking reads an index in order and stops at the LIMIT
+HELPER_CALLS = {
+    "get_movie": (helpers.get_movie, {"movies_Id": 1}),
+    "get_movie_detail": (helpers.get_movie_detail, {"movies_Id": 1}),
+    "get_rating_stats": (helpers.get_rating_stats, {"movies_Id": 1}),
+    # A substring of the title cannot be searched in an index: a page reads the movies in key order until the LIMIT
+    "get_movies_title": (helpers.get_movies, {"title": "story"}, {"movies"}),
+    "get_movies_genre": (helpers.get_movies, {"genre": "comedy"}),
+    "get_movies_genres_all": (helpers.get_movies, {"genre": "comedy,romance", "genre_mode": "all"}),
+    "get_movies_genres_any": (helpers.get_movies, {"genre": "comedy,romance", "genre_mode": "any"}),
+    "search_movies": (helpers.search_movies, {"q": "star wars"}),
+    "get_top_movies": (helpers.get_top_movies, {"min_count": 50}, {"movie_stats"}),
+    "get_top_movies_genre": (helpers.get_top_movies, {"genre": "drama", "by": "mean"}, {"movie_stats"}),
+    "get_similar_movies": (helpers.get_similar_movies, {"movies_Id": 1, "k": 10}),
+    "get_rating": (helpers.get_rating, {"user_Id": 1, "movies_Id": 1}),
+    "get_ratings": (helpers.get_ratings, {}, {"ratings"}),
+    "get_ratings_movie": (helpers.get_ratings, {"movies_Id": 1}),
+    "get_ratings_user": (helpers.get_ratings, {"user_Id": 1}),
+    "get_ratings_movie_user": (helpers.get_ratings, {"movies_Id": 1, "user_Id": 1}),
+    "get_ratings_min_rating": (helpers.get_ratings, {"movies_Id": 1, "min_rating": 4.0}),
+    "get_user_stats": (helpers.get_user_stats, {"user_Id": 1}),
+    "get_user_ratings_time": (helpers.get_user_ratings, {"user_Id": 1, "cursor": helpers.encode_cursor([964984100, 157])}),
+    "get_user_ratings_score": (helpers.get_user_ratings, {"user_Id": 1, "sort": "score", "order": "asc"}),
+    "get_tag": (helpers.get_tag, {"user_Id": 2, "movies_Id": 60756, "tag_text": "funny"}),
+    "get_tags": (helpers.get_tags, {}, {"tags"}),
+    "get_tags_movie": (helpers.get_tags, {"movies_Id": 1}),
+    "get_tags_user": (helpers.get_tags, {"user_Id": 2}),
+    "get_link": (helpers.get_link, {"movies_Id": 1}),
+    "get_movies_batch": (helpers.get_movies_batch, {"movies_Ids": [3, 1, 2]}),
+    "get_links_batch": (helpers.get_links_batch, {"movies_Ids": [3, 1, 2]}),
+    "get_ratings_batch": (helpers.get_ratings_batch, {"keys": [(1, 3), (1, 1), (2, 333)]}),
+    "get_tags_batch": (helpers.get_tags_batch, {"keys": [(2, 60756), (2, 89774)]}),
+    "export_ratings_movie": (lambda db, **filters: list(helpers.export_rows(db, **filters)), {"table": "ratings", "movies_Id": 1}),
+    "export_tags_user": (lambda db, **filters: list(helpers.export_rows(db, **filters)), {"table": "tags", "user_Id": 2}),
+}
+
+
+@pytest.fixture(scope="module")
+def engine(tmp_path_factory):
+    database_url = f"sqlite:///{tmp_path_factory.mktemp('plans') / 'movies.db'}"
+    load_data.load(database_url, verbose=False)
+    engine = create_engine(database_url)
+    yield engine
+    engine.dispose()
+
+
+def full_scans(engine, call, filters, walks=()) -> list:
+    """ Run a helper call and return the plan steps of its statements that scan a whole table or index """
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT"):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        with sessionmaker(bind=engine)() as db:
+            call(db, **filters)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert statements, "the helper did not query the database"
+
+    scans = []
+    with engine.connect() as conn:
+        for statement, parameters in statements:
+            for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters):
+                scan = FULL_SCAN.match(row[-1]) or SKIP_SCAN.match(row[-1])
+                if scan and scan.group(1) not in walks:
+                    scans.append(f"{row[-1]}  <-  {statement}")
+    return scans
+
+
+@pytest.mark.parametrize("name", HELPER_CALLS)
+def test_no_full_table_scan(engine, name):
+    call, filters, *walks = HELPER_CALLS[name]
+    assert full_scans(engine, call, filters, *walks) == []
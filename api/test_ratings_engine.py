@@ -0,0 +1,82 @@
+""" Behaviour tests of the ratings engine: the memory-mapped NumPy snapshot answers like the SQL queries
+
+Run with: python -m pytest test_ratings_engine.py
+"""
+import pytest
+
+from database import SessionLocal
+from settings import settings
+import models
+import query_helpers as helpers
+import ratings_engine
+
+FILTERS = [
+    {},
+    {"user_Id": 414},
+    {"user_Id": 414, "min_rating": 4.5},
+    {"user_Id": 1, "movies_Id": 3},
+    {"user_Id": 1, "movies_Id": 2},
+    {"movies_Id": 1},
+    {"movies_Id": 1, "min_rating": 4.0},
+    {"min_rating": 5.0},
+    {"user_Id": 999999999},
+    {"movies_Id": 999999999},
+]
+
+
+@pytest.fixture()
+def db(client):
+    with SessionLocal() as db:
+        yield db
+
+
+def answers(db, monkeypatch, use_engine: bool, query):
+    monkeypatch.setattr(settings, "ratings_engine", use_engine)
+    result = query(db)
+    assert (ratings_engine.get_engine(db) is not None) == use_engine
+    return result
+
+
+def pages(db, filters: dict, limit: int, count: int) -> list:
+    """ The first `count` pages of the ratings with the filters, following the cursors """
+    found, cursor = [], None
+    for _ in range(count):
+        rows = helpers.get_ratings(db, limit=limit, cursor=cursor, as_rows=True, **filters)
+        found.append([tuple(row) for row in rows])
+        cursor = helpers.next_cursor(rows, limit, models.Rating)
+        if cursor is None:
+            break
+    return found
+
+
+@pytest.mark.parametrize("filters", FILTERS)
+def test_pages_match_sql(db, monkeypatch, filters):
+    query = lambda db: pages(db, filters, 37, 5)
+    assert answers(db, monkeypatch, True, query) == answers(db, monkeypatch, False, query)
+
+
+def test_cursor_of_a_single_rating_ends_the_pages(db, monkeypatch):
+    query = lambda db: pages(db, {"user_Id": 1, "movies_Id": 1}, 1, 5)
+    assert answers(db, monkeypatch, True, query) == answers(db, monkeypatch, False, query) == [[(1, 1, 4.0, 964982703)], []]
+
+
+@pytest.mark.parametrize("filters", FILTERS[:3])
+def test_skip_matches_sql(db, monkeypatch, filters):
+    query = lambda db: [tuple(row) for row in helpers.get_ratings(db, skip=250, limit=40, as_rows=True, **filters)]
+    assert answers(db, monkeypatch, True, query) == answers(db, monkeypatch, False, query)
+
+
+@pytest.mark.parametrize("movies_Id", [1, 2, 999999999])
+def test_rating_stats_match_sql(db, monkeypatch, movies_Id):
+    engine = answers(db, monkeypatch, True, lambda db: helpers.get_rating_stats(db, movies_Id))
+    sql = answers(db, monkeypatch, False, lambda db: helpers.get_rating_stats(db, movies_Id))
+    assert engine["count"] == sql["count"] and engine["histogram"] == sql["histogram"]
+    assert engine["mean"] == pytest.approx(sql["mean"])
+
+
+def test_endpoint_is_served_by_the_engine(client, monkeypatch):
+    sql = client.get("/ratings", params={"movies_Id": 1, "limit": 50})
+    monkeypatch.setattr(settings, "ratings_engine", True)
+    engine = client.get("/ratings", params={"movies_Id": 1, "limit": 50})
+    assert engine.json() == sql.json()
+    assert engine.headers["X-Next-Cursor"] == sql.headers["X-Next-Cursor"]
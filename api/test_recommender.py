@@ -0,0 +1,92 @@
+""" Behaviour tests of the recommendations: offline training, served predictions and revalidation after a training
+
+Run with: python -m pytest test_recommender.py
+"""
+import time
+
+import numpy as np
+import pytest
+
+from database import SessionLocal
+import dataset
+import models
+import recommender
+import train_recommender
+
+USER = 1
+
+
+@pytest.fixture(scope="module")
+def before_training(client, database_url):
+    """ Response of the recommendations before the first training, then train the model """
+    before = client.get(f"/users/{USER}/recommendations")
+    train_recommender.build(database_url, factors=8, iterations=3, workers=2, verbose=False)
+    return before
+
+
+def rated_by(user_Id: int) -> set:
+    with SessionLocal() as db:
+        return {movies_id for movies_id, in db.query(models.Rating.moviesId).filter(models.Rating.userId == user_Id)}
+
+
+def test_no_model_answers_503(before_training):
+    assert before_training.status_code == 503
+
+
+def test_recommends_unrated_movies_by_predicted_rating(client, before_training):
+    response = client.get(f"/users/{USER}/recommendations", params={"k": 20})
+    assert response.status_code == 200
+    recommendations = response.json()
+    assert len(recommendations) == 20
+    assert not {movie["moviesId"] for movie in recommendations} & rated_by(USER)
+    scores = [movie["score"] for movie in recommendations]
+    assert scores == sorted(scores, reverse=True)
+    assert all(0.5 <= score <= 5.0 for score in scores)
+
+
+def test_genre_filter(client, before_training):
+    recommendations = client.get(f"/users/{USER}/recommendations", params={"genre": "Comedy"}).json()
+    assert recommendations and all("Comedy" in movie["genres"] for movie in recommendations)
+
+
+def test_unknown_user_is_not_found(client, before_training):
+    assert client.get("/users/999999999/recommendations").status_code == 404
+
+
+def test_training_again_changes_the_etag(client, database_url, before_training):
+    first = client.get(f"/users/{USER}/recommendations")
+    assert client.get(f"/users/{USER}/recommendations", headers={"If-None-Match": first.headers["ETag"]}).status_code == 304
+
+    # The training time is in seconds
+    time.sleep(1.1)
+    train_recommender.build(database_url, factors=4, iterations=2, workers=2, verbose=False)
+    second = client.get(f"/users/{USER}/recommendations", headers={"If-None-Match": first.headers["ETag"]})
+    assert second.status_code == 200
+    assert second.headers["ETag"] != first.headers["ETag"]
+    assert second.headers["Last-Modified"] != first.headers["Last-Modified"]
+
+
+def test_movies_are_ranked_on_the_raw_prediction(tmp_path, monkeypatch, before_training):
+    # Three movies predicted above the rating scale: their scores are all clipped to 5, but they
+    # keep the order of their predictions
+    with SessionLocal() as db:
+        item_ids = np.array(sorted(movies_id for movies_id, in db.query(models.Movie.moviesId)), dtype=np.int64)
+        version = dataset.get_data_version(db)["version"]
+    rated = rated_by(USER)
+    favourites = [int(movies_id) for movies_id in item_ids if movies_id not in rated][:3]
+    item_bias = np.zeros(len(item_ids), dtype=np.float32)
+    item_bias[np.searchsorted(item_ids, favourites)] = [8.0, 10.0, 9.0]
+    model = {
+        "user_ids": np.array([USER], dtype=np.int64), "user_factors": np.zeros((1, 1), dtype=np.float32),
+        "user_bias": np.zeros(1, dtype=np.float32), "item_ids": item_ids,
+        "item_factors": np.zeros((len(item_ids), 1), dtype=np.float32), "item_bias": item_bias,
+        "meta": {"global_mean": 3.0, "bias_damping": recommender.BIAS_DAMPING, "regularization": 0.1},
+    }
+    train_recommender.save_model(tmp_path, version, model)
+    monkeypatch.setattr(recommender.settings, "model_dir", tmp_path)
+    monkeypatch.setattr(recommender, "_cache", {})
+
+    with SessionLocal() as db:
+        recommendations = recommender.recommend(db, USER, k=3)
+    assert [movie["moviesId"] for movie in recommendations] == [favourites[1], favourites[2], favourites[0]]
+    assert [movie["score"] for movie in recommendations] == [5.0, 5.0, 5.0]
@@ -0,0 +1,56 @@
+""" Behaviour tests of the encoding of the rows: JSON fast path, columnar JSON and Arrow IPC
+
+Run with: python -m pytest test_serialization.py
+"""
+import io
+import logging
+
+from fastapi.testclient import TestClient
+import pyarrow.ipc
+
+import main
+import schemas
+import serialization
+
+
+def test_startup_logs_the_json_encoder(database_url, caplog):
+    with caplog.at_level(logging.INFO, logger="uvicorn.error"), TestClient(main.app):
+        pass
+    assert f"JSON responses encoded with {serialization.JSON_ENCODER}" in caplog.text
+    assert serialization.JSON_ENCODER == "orjson"
+
+
+def test_json_rows_match_the_response_model(client):
+    response = client.get("/ratings", params={"user_Id": 1, "limit": 5})
+    assert response.headers["content-type"] == serialization.JSON
+    rows = response.json()
+    assert len(rows) == 5
+    assert [schemas.RatingSimple(**row).model_dump() for row in rows] == rows
+
+
+def test_columnar_json_has_the_rows_of_json(client):
+    params = {"movies_Id": 1, "limit": 50}
+    rows = client.get("/ratings", params=params).json()
+    response = client.get("/ratings", params=params, headers={"Accept": serialization.COLUMNAR_JSON})
+    assert response.headers["content-type"] == serialization.COLUMNAR_JSON
+    columnar = response.json()
+    assert columnar["types"] == {"userId": "int32", "moviesId": "int32", "rating": "float32", "timestamp": "int64"}
+    assert [dict(zip(columnar["columns"], values)) for values in zip(*columnar["columns"].values())] == rows
+
+
+def test_arrow_has_the_rows_and_compact_types_of_json(client):
+    rows = client.get("/movies", params={"genre": "Western", "limit": 30}).json()
+    response = client.get("/movies", params={"genre": "Western", "limit": 30}, headers={"Accept": serialization.ARROW_STREAM})
+    assert response.headers["content-type"] == serialization.ARROW_STREAM
+    table = pyarrow.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert str(table.schema.field("moviesId").type) == "int32"
+    assert table.to_pylist() == rows
+    assert response.headers["X-Next-Cursor"] == client.get("/movies", params={"genre": "Western", "limit": 30}).headers["X-Next-Cursor"]
+
+
+def test_empty_pages_keep_their_columns(client):
+    columnar = client.get("/tags", params={"user_Id": 999999999}, headers={"Accept": serialization.COLUMNAR_JSON}).json()
+    assert columnar["columns"] == {"userId": [], "moviesId": [], "tag": [], "timestamp": []}
+    response = client.get("/tags", params={"user_Id": 999999999}, headers={"Accept": serialization.ARROW_STREAM})
+    table = pyarrow.ipc.open_stream(io.BytesIO(response.content)).read_all()
+    assert table.num_rows == 0 and table.column_names == ["userId", "moviesId", "tag", "timestamp"]
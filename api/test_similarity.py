@@ -0,0 +1,56 @@
+""" Behaviour tests of the similar movies: offline build, served neighbours and revalidation after a rebuild
+
+Run with: python -m pytest test_similarity.py
+"""
+import numpy as np
+import pytest
+from sqlalchemy import create_engine
+
+from ratings_io import read_ratings
+import build_similarity
+import dataset
+
+MOVIE = 1
+
+
+@pytest.fixture(scope="module")
+def before_build(client, database_url):
+    """ Response of the similar movies before the first build, then build them """
+    before = client.get(f"/movies/{MOVIE}/similar")
+    build_similarity.build(database_url, k=20, workers=2, verbose=False)
+    dataset.reset()
+    return before
+
+
+def test_list_is_empty_before_the_build(before_build):
+    assert before_build.status_code == 200
+    assert before_build.json() == []
+
+
+def test_rebuild_changes_the_etag(client, database_url, before_build):
+    response = client.get(f"/movies/{MOVIE}/similar", headers={"If-None-Match": before_build.headers["ETag"]})
+    assert response.status_code == 200
+    assert len(response.json()) == 10
+    assert response.headers["ETag"] != before_build.headers["ETag"]
+    assert client.get(f"/movies/{MOVIE}/similar", headers={"If-None-Match": response.headers["ETag"]}).status_code == 304
+
+
+def test_neighbours_are_the_most_similar_movies(client, database_url, before_build):
+    engine = create_engine(database_url)
+    try:
+        movie_ids, matrix = build_similarity.rating_matrix(*read_ratings(engine))
+    finally:
+        engine.dispose()
+    row = int(np.searchsorted(movie_ids, MOVIE))
+    similarities = (matrix[row] @ matrix.T).toarray().ravel()
+    similarities[row] = -np.inf
+
+    similar = client.get(f"/movies/{MOVIE}/similar", params={"k": 20}).json()
+    served = np.array([movie["similarity"] for movie in similar])
+    assert np.allclose(served, np.sort(similarities)[::-1][:20], atol=1e-5)
+    assert all(similarities[np.searchsorted(movie_ids, movie["moviesId"])] == pytest.approx(movie["similarity"], abs=1e-5)
+               for movie in similar)
+
+
+def test_unknown_movie_is_not_found(client, before_build):
+    assert client.get("/movies/999999999/similar").status_code == 404
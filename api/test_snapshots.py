@@ -0,0 +1,47 @@
+""" Behaviour tests of the table snapshots: full download, Range resumption with If-Range and revalidation
+
+Run with: python -m pytest test_snapshots.py
+"""
+import io
+
+import pyarrow.ipc
+import pyarrow.parquet
+
+
+def test_arrow_snapshot_holds_the_whole_table(client):
+    response = client.get("/snapshots/movies")
+    assert response.status_code == 200
+    assert response.headers["Content-Type"] == "application/vnd.apache.arrow.file"
+    table = pyarrow.ipc.open_file(io.BytesIO(response.content)).read_all()
+    assert table.num_rows == client.get("/analytics").json()["movie_count"]
+    assert table.column_names[0] == "moviesId"
+
+
+def test_parquet_snapshot_has_the_rows_of_the_arrow_one(client):
+    arrow = pyarrow.ipc.open_file(io.BytesIO(client.get("/snapshots/links").content)).read_all()
+    parquet = pyarrow.parquet.read_table(io.BytesIO(client.get("/snapshots/links", params={"format": "parquet"}).content))
+    assert parquet.num_rows == arrow.num_rows
+    assert parquet.column_names == arrow.column_names
+
+
+def test_range_resumes_the_same_version(client):
+    whole = client.get("/snapshots/tags")
+    etag, size = whole.headers["ETag"], len(whole.content)
+
+    rest = client.get("/snapshots/tags", headers={"Range": "bytes=1000-", "If-Range": etag})
+    assert rest.status_code == 206
+    assert rest.headers["Content-Range"] == f"bytes 1000-{size - 1}/{size}"
+    assert whole.content[:1000] + rest.content == whole.content
+
+
+def test_range_of_another_version_sends_the_whole_file(client):
+    whole = client.get("/snapshots/tags")
+    restarted = client.get("/snapshots/tags", headers={"Range": "bytes=1000-", "If-Range": '"another-version"'})
+    assert restarted.status_code == 200
+    assert restarted.content == whole.content
+
+
+def test_downloaded_version_is_not_sent_again(client):
+    etag = client.head("/snapshots/movies").headers["ETag"]
+    assert client.get("/snapshots/movies", headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/snapshots/movies", params={"format": "parquet"}, headers={"If-None-Match": etag}).status_code == 200
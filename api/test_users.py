@@ -0,0 +1,56 @@
+""" Behaviour tests of the user resource: precomputed profile and ratings sorted by time or score
+
+Run with: python -m pytest test_users.py
+"""
+from collections import Counter
+
+import pytest
+
+USER = 414
+
+
+def all_ratings(client, user_Id: int) -> list:
+    """ Every rating of a user, following the cursors of /ratings """
+    ratings, cursor = [], None
+    while True:
+        response = client.get("/ratings", params={"user_Id": user_Id, "limit": 1000, **({"cursor": cursor} if cursor else {})})
+        ratings.extend(response.json())
+        cursor = response.headers.get("X-Next-Cursor")
+        if cursor is None:
+            return ratings
+
+
+def test_profile_matches_the_ratings_and_tags(client):
+    ratings = all_ratings(client, USER)
+    tags = client.get("/tags", params={"user_Id": USER, "limit": 1000}).json()
+    profile = client.get(f"/users/{USER}").json()
+
+    assert profile["rating_count"] == len(ratings)
+    assert profile["rating_mean"] == pytest.approx(sum(rating["rating"] for rating in ratings) / len(ratings))
+    assert {float(rating): count for rating, count in profile["rating_histogram"].items()} == Counter(rating["rating"] for rating in ratings)
+    assert profile["tag_count"] == len(tags)
+    times = [rating["timestamp"] for rating in ratings] + [tag["timestamp"] for tag in tags]
+    assert (profile["first_activity_at"], profile["last_activity_at"]) == (min(times), max(times))
+    counts = [genre["count"] for genre in profile["top_genres"]]
+    assert counts == sorted(counts, reverse=True) and len(counts) <= 5
+
+
+def test_unknown_user_is_not_found(client):
+    assert client.get("/users/999999999").status_code == 404
+
+
+@pytest.mark.parametrize("sort, key", [("time", "timestamp"), ("score", "rating")])
+@pytest.mark.parametrize("order", ["desc", "asc"])
+def test_ratings_sorted_and_paged_with_cursors(client, sort, key, order):
+    params = {"sort": sort, "order": order}
+    whole = client.get(f"/users/{USER}/ratings", params={**params, "limit": 1000}).json()
+    keys = [(rating[key], rating["moviesId"]) for rating in whole]
+    assert keys == sorted(keys, reverse=order == "desc")
+    assert len(whole) == min(1000, client.get(f"/users/{USER}").json()["rating_count"])
+
+    walked, cursor = [], None
+    while len(walked) < len(whole):
+        response = client.get(f"/users/{USER}/ratings", params={**params, "limit": 150, **({"cursor": cursor} if cursor else {})})
+        walked.extend(response.json())
+        cursor = response.headers["X-Next-Cursor"]
+    assert walked[:len(whole)] == whole
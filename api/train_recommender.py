@@ -0,0 +1,218 @@
+""" Offline training of the recommendation model: biased matrix factorization of the ratings by alternating least squares"""
+import argparse
+import json
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from database import SQLALCHEMY_DATABASE_URL
+from ratings_io import read_ratings
+from settings import default_model_dir, settings
+import models
+import recommender
+
+DEFAULT_FACTORS = 32
+DEFAULT_ITERATIONS = 10
+# Weight of the L2 penalty of the factors, multiplied by the number of ratings of each user or movie
+DEFAULT_REGULARIZATION = 0.1
+# Cells of the padded (groups x ratings) grid of a task of the thread pool: 65536 cells of 32 float32 factors hold 8MB
+CHUNK_RATINGS = 65536
+# Ratings whose prediction error is computed at once
+ERROR_CHUNK_SIZE = 1_000_000
+
+
+def _group(index: np.ndarray, size: int) -> tuple:
+    """ Order of the ratings grouped by `index` (user or movie) and the offsets of each group in that order """
+    order = np.argsort(index, kind = "stable")
+    indptr = np.zeros(size + 1, dtype = np.int64)
+    np.cumsum(np.bincount(index, minlength = size), out = indptr[1:])
+    return order, indptr
+
+
+def _chunks(indptr: np.ndarray, chunk_ratings: int = CHUNK_RATINGS) -> list:
+    """ Split the groups into tasks of groups with similar numbers of ratings
+
+    The groups are bucketed by their number of ratings rounded up to a power of two, the padded
+    length of their ratings in a task, so padding at most doubles the work. Return (groups, length) pairs.
+    """
+    counts = np.diff(indptr)
+    lengths = np.left_shift(1, np.ceil(np.log2(np.maximum(counts, 1))).astype(np.int64))
+    chunks = []
+    for length in np.unique(lengths):
+        members = np.flatnonzero(lengths == length)
+        size = max(chunk_ratings // int(length), 1)
+        chunks.extend((members[start:start + size], int(length)) for start in range(0, len(members), size))
+    return chunks
+
+
+def solve_factors(fixed: np.ndarray, other: np.ndarray, values: np.ndarray, indptr: np.ndarray,
+                  groups: np.ndarray, length: int, regularization: float) -> np.ndarray:
+    """ Least squares factors of groups of ratings (one user or one movie each) against fixed factors
+
+    The ratings of a group g are other[indptr[g]:indptr[g + 1]] (indexes of the fixed factors) and the
+    same slice of values (residuals). The fixed factors of the ratings are laid out in a zero padded
+    (groups, length, factors) array, so that each group solves (F'F + regularization * count * I) x = F'values
+    with batched matrix products and a single batched solve.
+    """
+    counts = indptr[groups + 1] - indptr[groups]
+    rows = np.repeat(np.arange(len(groups)), counts)
+    columns = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ratings = np.repeat(indptr[groups], counts) + columns
+
+    padded = np.zeros((len(groups), length, fixed.shape[1]), dtype = np.float32)
+    padded[rows, columns] = fixed[other[ratings]]
+    targets = np.zeros((len(groups), length, 1), dtype = np.float32)
+    targets[rows, columns, 0] = values[ratings]
+
+    transposed = padded.transpose(0, 2, 1)
+    gram = transposed @ padded
+    gram += (regularization * counts).astype(np.float32)[:, None, None] * np.eye(fixed.shape[1], dtype = np.float32)
+    return np.linalg.solve(gram, transposed @ targets)[..., 0]
+
+
+def _half_step(pool, fixed: np.ndarray, other: np.ndarray, values: np.ndarray, indptr: np.ndarray,
+               chunks: list, regularization: float) -> np.ndarray:
+    """ Solve the factors of every group given the fixed factors, chunk by chunk on the thread pool """
+    solved = np.empty((len(indptr) - 1, fixed.shape[1]), dtype = np.float32)
+
+    def solve(chunk):
+        groups, length = chunk
+        solved[groups] = solve_factors(fixed, other, values, indptr, groups, length, regularization)
+
+    # NumPy releases the GIL in the matrix products and the batched solve, so the chunks run on all the cores
+    for _ in pool.map(solve, chunks):
+        pass
+    return solved
+
+
+def rmse(user_factors: np.ndarray, item_factors: np.ndarray, user_index: np.ndarray, item_index: np.ndarray,
+         residuals: np.ndarray) -> float:
+    """ Root mean squared error of the factors on the residuals of the ratings """
+    total = 0.0
+    for start in range(0, len(residuals), ERROR_CHUNK_SIZE):
+        part = slice(start, start + ERROR_CHUNK_SIZE)
+        errors = residuals[part] - np.einsum("nf,nf->n", user_factors[user_index[part]], item_factors[item_index[part]])
+        total += float(np.dot(errors, errors))
+    return float(np.sqrt(total / max(len(residuals), 1)))
+
+
+def train(users: np.ndarray, movies: np.ndarray, ratings: np.ndarray, factors: int = DEFAULT_FACTORS,
+          iterations: int = DEFAULT_ITERATIONS, regularization: float = DEFAULT_REGULARIZATION,
+          workers: Optional[int] = None, seed: int = 0, verbose: bool = True) -> dict:
+    """ Fit rating ~ mean + user bias + movie bias + user factors . movie factors
+
+    The biases are damped means of the ratings, the factors are fitted on what the biases leave
+    by alternating least squares: the movie factors fixed, every user is an independent ridge
+    regression, then the other way around. Return the arrays of the model, as saved by save_model.
+    """
+    user_ids, user_index = np.unique(users, return_inverse = True)
+    item_ids, item_index = np.unique(movies, return_inverse = True)
+    user_index, item_index = user_index.astype(np.int32), item_index.astype(np.int32)
+    user_counts = np.bincount(user_index, minlength = len(user_ids))
+    item_counts = np.bincount(item_index, minlength = len(item_ids))
+
+    mean = float(ratings.mean()) if len(ratings) else 0.0
+    item_bias = (np.bincount(item_index, weights = ratings - mean, minlength = len(item_ids))
+                 / (item_counts + recommender.BIAS_DAMPING)).astype(np.float32)
+    user_bias = (np.bincount(user_index, weights = ratings - mean - item_bias[item_index], minlength = len(user_ids))
+                 / (user_counts + recommender.BIAS_DAMPING)).astype(np.float32)
+    residuals = (ratings - mean - user_bias[user_index] - item_bias[item_index]).astype(np.float32)
+
+    generator = np.random.default_rng(seed)
+    user_factors = np.zeros((len(user_ids), factors), dtype = np.float32)
+    item_factors = generator.normal(0, 0.1, (len(item_ids), factors)).astype(np.float32)
+
+    # The ratings are grouped once by user and once by movie, each half step reads its groups contiguously
+    by_user, user_indptr = _group(user_index, len(user_ids))
+    by_item, item_indptr = _group(item_index, len(item_ids))
+    user_side = (item_index[by_user], residuals[by_user], user_indptr, _chunks(user_indptr))
+    item_side = (user_index[by_item], residuals[by_item], item_indptr, _chunks(item_indptr))
+
+    with ThreadPoolExecutor(workers or os.cpu_count()) as pool:
+        for iteration in range(iterations):
+            start = time.perf_counter()
+            user_factors = _half_step(pool, item_factors, *user_side, regularization)
+            item_factors = _half_step(pool, user_factors, *item_side, regularization)
+            if verbose:
+                error = rmse(user_factors, item_factors, user_index, item_index, residuals)
+                print(f"{'iteration ' + str(iteration + 1):<14} {'':>12} {time.perf_counter() - start:>13.2f}s  train RMSE {error:.4f}")
+
+    return {
+        "user_ids": user_ids.astype(np.int32), "user_factors": user_factors, "user_bias": user_bias,
+        "item_ids": item_ids.astype(np.int32), "item_factors": item_factors, "item_bias": item_bias,
+        "meta": {"global_mean": mean, "factors": factors, "iterations": iterations,
+                 "regularization": regularization, "bias_damping": recommender.BIAS_DAMPING,
+                 "rating_count": int(len(ratings))},
+    }
+
+
+def save_model(directory: Path, version: str, model: dict) -> Path:
+    """ Write the arrays of a model as .npy files, served memory-mapped, into `<directory>/<version>/` """
+    path = recommender.model_path(directory, version)
+    # Written under a temporary name and renamed once complete, so a half written model is never loaded
+    building = path.with_name(path.name + ".building")
+    shutil.rmtree(building, ignore_errors = True)
+    building.mkdir(parents = True)
+    for name in recommender.MODEL_ARRAYS:
+        np.save(building / f"{name}.npy", np.ascontiguousarray(model[name]))
+    (building / "meta.json").write_text(json.dumps({**model["meta"], "data_version": version, "trained_at": int(time.time())}))
+    shutil.rmtree(path, ignore_errors = True)
+    os.replace(building, path)
+    return path
+
+
+def prune_models(directory: Path, keep: int = recommender.MODEL_VERSIONS_KEPT) -> int:
+    """ Delete all but the `keep` most recently trained models, return the number of deleted models """
+    models_by_age = recommender.trained_models(directory)
+    for path in models_by_age[keep:]:
+        shutil.rmtree(path)
+    return len(models_by_age[keep:])
+
+
+def build(database_url: str = SQLALCHEMY_DATABASE_URL, model_dir: Optional[Path] = None, factors: int = DEFAULT_FACTORS,
+          iterations: int = DEFAULT_ITERATIONS, regularization: float = DEFAULT_REGULARIZATION,
+          workers: Optional[int] = None, verbose: bool = True) -> Path:
+    """ Train the model on the ratings of a database and save it for the version of its dataset """
+    if model_dir is None:
+        # The model of the API database goes where the API loads it from (MODEL_DIR)
+        model_dir = settings.model_dir if database_url == settings.database_url else default_model_dir(database_url)
+    engine = create_engine(database_url)
+    try:
+        with Session(engine) as db:
+            version = dict(db.query(models.DatasetMeta.key, models.DatasetMeta.value).all()).get("version") or "unversioned"
+        start = time.perf_counter()
+        users, movies, ratings = read_ratings(engine)
+        if verbose:
+            print(f"{'ratings':<14} {len(ratings):>12,} rows {time.perf_counter() - start:>8.2f}s")
+    finally:
+        engine.dispose()
+
+    model = train(users, movies, ratings, factors, iterations, regularization, workers, verbose = verbose)
+    path = save_model(Path(model_dir), version, model)
+    prune_models(Path(model_dir))
+    if verbose:
+        print(f"{'model':<14} {len(model['user_ids']):>9,} users x {len(model['item_ids']):,} movies  {path}")
+    return path
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the recommendation model on the ratings.")
+    parser.add_argument("--database-url", default=SQLALCHEMY_DATABASE_URL, help="SQLAlchemy URL of the database")
+    parser.add_argument("--model-dir", type=Path, default=None,
+                        help="Directory of the models (default: MODEL_DIR, or next to the SQLite database)")
+    parser.add_argument("--factors", type=int, default=DEFAULT_FACTORS, help="Number of latent factors")
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS, help="Alternating least squares iterations")
+    parser.add_argument("--regularization", type=float, default=DEFAULT_REGULARIZATION, help="L2 penalty of the factors")
+    parser.add_argument("--workers", type=int, default=None, help="Threads solving the factors (default: number of CPUs)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    build(args.database_url, args.model_dir, args.factors, args.iterations, args.regularization, args.workers)
+    print(f"Model trained in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,43 @@
+# Benchmark of N sequential SDK calls: one connection per call (module-level httpx.get, as the
+# client did before) vs the persistent, keep-alive connection pool of MovieClient.
+#
+# Usage: python bench_client.py [--base-url https://api-architecture.onrender.com] [--calls 100] [--path /ratings?limit=100]
+import argparse
+import statistics
+import time
+
+import httpx
+
+from hmoviessdk import MovieClient, MovieConfig
+
+
+def measure(call, calls: int) -> list:
+    # Duration of each of `calls` sequential calls, in milliseconds
+    durations = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        call()
+        durations.append(1000 * (time.perf_counter() - start))
+    return durations
+
+
+def report(name: str, durations: list):
+    print(f"{name:<22} total {sum(durations) / 1000:>7.2f}s  mean {statistics.mean(durations):>7.1f}ms  "
+          f"p50 {statistics.median(durations):>7.1f}ms  max {max(durations):>7.1f}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare sequential SDK calls with and without a persistent connection.")
+    parser.add_argument("--base-url", default=None, help="API URL (default: MOVIE_API_BASE_URL)")
+    parser.add_argument("--calls", type=int, default=100, help="Number of sequential calls")
+    parser.add_argument("--path", default="/ratings?limit=100", help="Path requested by each call")
+    parser.add_argument("--http2", action="store_true", help="Use HTTP/2 for the persistent client")
+    args = parser.parse_args()
+
+    config = MovieConfig(movie_base_url=args.base_url, http2=args.http2)
+    url = f"{config.movie_base_url}{args.path}"
+    print(f"{args.calls} sequential GET {url}")
+
+    report("new connection/call", measure(lambda: httpx.get(url, timeout=config.movie_timeout).raise_for_status(), args.calls))
+    with MovieClient(config) as client:
+        report("persistent client", measure(lambda: client._get(args.path), args.calls))
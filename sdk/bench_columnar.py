@@ -0,0 +1,50 @@
+# Benchmark of the download of all the ratings into a DataFrame with each wire format of the list
+# endpoints: JSON objects, columnar JSON and Arrow IPC, plus the Arrow export of the whole table.
+# Reports the wall time, the peak of the memory allocated by Python during the download and the
+# size of the resulting DataFrame.
+#
+# Usage: python bench_columnar.py [--base-url http://127.0.0.1:8000] [--rounds 3]
+import argparse
+import statistics
+import time
+import tracemalloc
+
+import pandas as pd
+
+from hmoviessdk import MovieClient, MovieConfig
+
+
+def measure(download, rounds: int):
+    # Median duration (s), median peak of the traced allocations (MB) and the last DataFrame
+    durations, peaks = [], []
+    for _ in range(rounds):
+        tracemalloc.start()
+        start = time.perf_counter()
+        frame = download()
+        durations.append(time.perf_counter() - start)
+        peaks.append(tracemalloc.get_traced_memory()[1] / 2**20)
+        tracemalloc.stop()
+    return statistics.median(durations), statistics.median(peaks), frame
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the wire formats for downloading all the ratings.")
+    parser.add_argument("--base-url", default=None, help="API URL (default: MOVIE_API_BASE_URL)")
+    parser.add_argument("--rounds", type=int, default=3, help="Downloads per format")
+    args = parser.parse_args()
+
+    count = None
+    print(f"{'format':<18} {'time':>8} {'peak alloc':>12} {'DataFrame':>11}  dtypes")
+    for wire_format in ("json", "columnar", "arrow", "arrow export"):
+        config = MovieConfig(movie_base_url=args.base_url, wire_format=wire_format.split()[0])
+        with MovieClient(config) as client:
+            if count is None:
+                count = client.get_analytics().rating_count
+            if wire_format == "arrow export":
+                download = lambda: pd.concat(client.stream_ratings(chunk_size=count, output_format="pandas"), ignore_index=True)
+            else:
+                download = lambda: client.list_ratings(limit=count, output_format="pandas")
+            duration, peak, frame = measure(download, args.rounds)
+        size = frame.memory_usage(deep=True).sum() / 2**20
+        dtypes = ", ".join(str(dtype) for dtype in frame.dtypes)
+        print(f"{wire_format:<18} {duration:>7.2f}s {peak:>10.1f}MB {size:>9.1f}MB  {dtypes}")
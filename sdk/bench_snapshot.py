@@ -0,0 +1,77 @@
+# Benchmark of loading all the ratings into a DataFrame: streaming the Arrow export vs downloading
+# the snapshot file and opening it memory-mapped. Reports the wall time and the growth of the resident
+# memory of the process. With --synthetic-rows, a local ratings snapshot of that many rows is written
+# first and opened the same way, to check the load of a 25M ratings dataset without the API.
+#
+# Usage: python bench_snapshot.py [--base-url http://127.0.0.1:8000] [--synthetic-rows 25000000]
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow
+import pyarrow.ipc
+
+from hmoviessdk import MovieClient, MovieConfig, open_snapshot
+
+
+def resident_mb() -> float:
+    # Resident memory of the process (Linux), in MB
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+
+
+def report(name: str, load):
+    before = resident_mb()
+    start = time.perf_counter()
+    frame = load()
+    loaded = time.perf_counter() - start
+    loaded_rss = resident_mb() - before
+    start = time.perf_counter()
+    mean = frame["rating"].mean()
+    print(f"{name:<26} {len(frame):>11,} rows  load {loaded:>6.2f}s  RSS +{loaded_rss:>7.1f}MB  "
+          f"mean rating {mean:.3f} in {time.perf_counter() - start:.2f}s")
+    return frame
+
+
+def write_synthetic(path: Path, rows: int, batch_size: int = 1_000_000):
+    # Ratings snapshot with the schema of the API and random values
+    schema = pyarrow.schema([("userId", pyarrow.int32()), ("moviesId", pyarrow.int32()),
+                             ("rating", pyarrow.float32()), ("timestamp", pyarrow.int64())])
+    generator = np.random.default_rng(0)
+    with pyarrow.ipc.new_file(str(path), schema) as writer:
+        for start in range(0, rows, batch_size):
+            size = min(batch_size, rows - start)
+            writer.write_batch(pyarrow.record_batch([
+                np.sort(generator.integers(1, 160_000, size, dtype=np.int32)),
+                generator.integers(1, 200_000, size, dtype=np.int32),
+                generator.integers(1, 11, size).astype(np.float32) / 2,
+                generator.integers(789_652_009, 1_574_327_703, size, dtype=np.int64),
+            ], schema=schema))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the export stream and the memory-mapped snapshot of the ratings.")
+    parser.add_argument("--base-url", default=None, help="API URL (default: MOVIE_API_BASE_URL)")
+    parser.add_argument("--synthetic-rows", type=int, default=0, help="Also open a local snapshot of that many random ratings")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = Path(directory) / "ratings.arrow"
+        with MovieClient(MovieConfig(movie_base_url=args.base_url)) as client:
+            report("Arrow export stream", lambda: pd.concat(
+                client.stream_ratings(chunk_size=1_000_000, output_format="pandas"), ignore_index=True))
+            report("snapshot download + open", lambda: client.download_snapshot("ratings", path))
+            report("snapshot unchanged (304)", lambda: client.download_snapshot("ratings", path))
+
+        if args.synthetic_rows:
+            synthetic = Path(directory) / "synthetic.arrow"
+            start = time.perf_counter()
+            write_synthetic(synthetic, args.synthetic_rows)
+            print(f"synthetic snapshot written in {time.perf_counter() - start:.1f}s "
+                  f"({synthetic.stat().st_size / 2**20:.0f}MB)")
+            report("synthetic snapshot open", lambda: open_snapshot(synthetic))
+            report("synthetic read into NumPy", lambda: pyarrow.ipc.open_file(str(synthetic)).read_all().to_pandas())
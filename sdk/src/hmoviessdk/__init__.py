@@ -1,2 +1,5 @@
-from .movies_client import MovieClient
-from .movies_config import MovieConfig
\ No newline at end of file
+from .movies_client import MovieClient, Page
+from .async_movies_client import AsyncMovieClient
+from .movies_config import MovieConfig
+from .movies_retry import CircuitOpenError
+from .movies_snapshots import open_snapshot
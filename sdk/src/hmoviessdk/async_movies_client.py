@@ -0,0 +1,472 @@
+import asyncio
+import httpx
+import json
+from typing import AsyncIterator, Awaitable, Callable, Iterable, Optional, List, Literal, Tuple, TypeVar, Union
+from .schemas import MovieSimple, MovieSearchResult, MovieTop, SimilarMovie, Recommendation, MovieDetailed, RatingSimple, UserProfile, TagSimple, LinkSimple, AnalyticsResponse
+from .movies_config import MovieConfig
+from .movies_cache import ResponseCache, UNCACHED_PATHS
+from .movies_columnar import aiter_arrow_frames, pyarrow
+from .movies_retry import RetryPolicy
+from .movies_client import MAX_PAGE_SIZE, NEXT_CURSOR_HEADER, MAX_BATCH_SIZE, MovieClient, with_next_cursor
+import pandas as pd
+
+Item = TypeVar("Item")
+Result = TypeVar("Result")
+
+
+class AsyncMovieClient:
+    # Asynchronous version of MovieClient, with the same methods as coroutines. Several calls can
+    # run concurrently, e.g. with fetch_many; at most `max_concurrency` requests are in flight at once.
+
+    def __init__(self, config: Optional[MovieConfig] = None):
+        # Initialize the client with a given configuration or a default one
+        self.config = config or MovieConfig()
+        self.movie_base_url = self.config.movie_base_url
+        self.http_client = httpx.AsyncClient(
+            base_url=self.movie_base_url,
+            timeout=self.config.movie_timeout,
+            limits=httpx.Limits(
+                max_connections=self.config.movie_max_connections,
+                max_keepalive_connections=self.config.movie_max_keepalive_connections,
+                keepalive_expiry=self.config.movie_keepalive_expiry,
+            ),
+            http2=self.config.movie_http2,
+        )
+        # Cache of the GET responses, enabled with MovieConfig(cache=True)
+        self.cache = ResponseCache(self.config.movie_cache_ttl, self.config.movie_cache_max_entries,
+                                   self.config.movie_cache_path) if self.config.movie_cache else None
+        # Retries with backoff, circuit breaker and hedging of the requests
+        self.retry = RetryPolicy(self.config)
+        # Bounds the requests in flight, whatever the number of tasks sending them
+        self._requests = asyncio.Semaphore(self.config.movie_max_concurrency)
+
+    async def aclose(self):
+        # Close the connections of the client and the disk store of the cache
+        await self.http_client.aclose()
+        self.retry.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def cache_stats(self) -> dict:
+        # Hits, misses, revalidations (304) and evictions of the response cache
+        return self.cache.stats() if self.cache is not None else {}
+
+    def clear_cache(self):
+        # Forget every cached response
+        if self.cache is not None:
+            self.cache.clear()
+
+    async def __aenter__(self) -> "AsyncMovieClient":
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    _format_output = MovieClient._format_output
+    _rows_headers = MovieClient._rows_headers
+    _read_rows = MovieClient._read_rows
+    _join_rows = MovieClient._join_rows
+
+    async def fetch_many(
+        self,
+        fetch: Callable[[Item], Awaitable[Result]],
+        items: Iterable[Item],
+        concurrency: Optional[int] = None,
+    ) -> List[Result]:
+        # Run `fetch(item)` for every item, at most `concurrency` at once (default: max_concurrency),
+        # and return the results in the order of the items. The first error is raised.
+        semaphore = asyncio.Semaphore(concurrency or self.config.movie_max_concurrency)
+
+        async def run(item):
+            async with semaphore:
+                return await fetch(item)
+
+        return list(await asyncio.gather(*(run(item) for item in items)))
+
+    async def _send(self, method: str, path: str, **kwargs) -> httpx.Response:
+        # Send a single request, once one of the `max_concurrency` slots is free
+        async with self._requests:
+            return await self.http_client.request(method, path, **kwargs)
+
+    async def _open(self, request: httpx.Request) -> httpx.Response:
+        # Open a streamed request, once one of the `max_concurrency` slots is free
+        async with self._requests:
+            return await self.http_client.send(request, stream=True)
+
+    async def _stream(self, path: str, params: dict) -> httpx.Response:
+        # Open a streamed GET request, whose body is read by the caller, which must close the response.
+        # Only the connection and the status are retried: a stream failing midway is not resumed.
+        # Like `_send`, a concurrency slot is only held until the response headers arrive, so a stream
+        # left open by its consumer does not block the other requests.
+        request = self.http_client.build_request("GET", path, params=params, timeout=None)
+        response = await self.retry.acall(lambda: self._open(request), hedge=False)
+        if response.is_error:
+            await response.aclose()
+            response.raise_for_status()
+        return response
+
+    async def _get(self, path: str, params: Optional[dict] = None, headers: Optional[dict] = None) -> httpx.Response:
+        # Send a GET request to the API and raise an error for unsuccessful status codes.
+        # With the cache, a fresh cached response is returned without any request and a stale one
+        # is revalidated with its ETag.
+        if self.cache is None or path in UNCACHED_PATHS:
+            response = await self.retry.acall(lambda: self._send("GET", path, params=params, headers=headers))
+            response.raise_for_status()
+            return response
+
+        key = self.cache.key(path, params, (headers or {}).get("Accept"))
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.hit()
+            return entry.to_response(f"{self.movie_base_url}{key}")
+        if entry is not None and entry.etag:
+            headers = {**(headers or {}), "If-None-Match": entry.etag}
+        response = await self.retry.acall(lambda: self._send("GET", path, params=params, headers=headers))
+        if response.status_code == 304 and entry is not None:
+            self.cache.revalidated(key, entry)
+            return entry.to_response(f"{self.movie_base_url}{key}")
+        response.raise_for_status()
+        self.cache.store(key, response)
+        return response
+
+    async def _post(self, path: str, payload: dict, headers: Optional[dict] = None) -> httpx.Response:
+        # Send a POST request with a JSON body and raise an error for unsuccessful status codes
+        # The batch lookups only read: they are retried, but never sent twice at once
+        response = await self.retry.acall(lambda: self._send("POST", path, json=payload, headers=headers), hedge=False)
+        response.raise_for_status()
+        return response
+
+    async def _post_batches(self, path: str, field: str, keys: list, output_format: str = "dict"):
+        # Resolve a list of IDs or pairs through a batch endpoint, with concurrent requests of at
+        # most MAX_BATCH_SIZE distinct keys. The rows come back in the order of the keys.
+        keys = list(dict.fromkeys(tuple(key) if isinstance(key, (list, tuple)) else key for key in keys))
+        batches = [[list(key) if isinstance(key, tuple) else key for key in keys[start:start + MAX_BATCH_SIZE]]
+                   for start in range(0, len(keys), MAX_BATCH_SIZE)]
+        headers = self._rows_headers(output_format)
+        responses = await self.fetch_many(lambda batch: self._post(path, {field: batch}, headers), batches)
+        return self._join_rows([self._read_rows(response, output_format) for response in responses], output_format)
+
+    async def _get_pages(self, path: str, params: dict, skip: int, limit: int, cursor: Optional[str],
+                         output_format: str = "dict"):
+        # Retrieve up to `limit` rows, following the cursors sent back by the API page after page:
+        # only the first page skips `skip` rows, every following page is a seek on the key.
+        # Return the rows and the cursor of the next page.
+        headers = self._rows_headers(output_format)
+        parts, count = [], 0
+        while True:
+            page_params = {**params, "skip": skip, "limit": min(limit - count, MAX_PAGE_SIZE)}
+            if cursor:
+                page_params["cursor"] = cursor
+            response = await self._get(path, page_params, headers)
+            parts.append(self._read_rows(response, output_format))
+            count += len(parts[-1])
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            skip = 0
+            if not cursor or count >= limit:
+                return self._join_rows(parts, output_format), cursor
+
+    async def health_check(self) -> dict:
+        # Check if the API server is up and responding
+        response = await self._get("/")
+        return response.json()
+
+    async def get_movie(self, movies_Id: int, ratings_limit: int = 100, tags_limit: int = 100) -> MovieDetailed:
+        # Retrieve detailed information for a specific movie by ID, with at most
+        # `ratings_limit` ratings and `tags_limit` tags and the statistics of all its ratings
+        params = {"ratings_limit": ratings_limit, "tags_limit": tags_limit}
+        response = await self._get(f"/movies/{movies_Id}", params)
+        return MovieDetailed(**response.json())
+
+    async def get_movies_many(
+        self,
+        movies_Ids: List[int],
+        ratings_limit: int = 100,
+        tags_limit: int = 100,
+        concurrency: Optional[int] = None,
+    ) -> List[Optional[MovieDetailed]]:
+        # Retrieve the details of many movies concurrently, in the order of the IDs (None for unknown IDs)
+        async def fetch(movies_Id: int) -> Optional[MovieDetailed]:
+            try:
+                return await self.get_movie(movies_Id, ratings_limit, tags_limit)
+            except httpx.HTTPStatusError as error:
+                if error.response.status_code == 404:
+                    return None
+                raise
+
+        return await self.fetch_many(fetch, movies_Ids, concurrency)
+
+    async def get_movies_batch(
+        self,
+        movies_Ids: List[int],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the movies of many IDs with a few batch requests, in the order of the IDs.
+        # Unknown IDs are left out.
+        data = await self._post_batches("/movies/batch", "moviesIds", movies_Ids, output_format)
+        return self._format_output(data, MovieSimple, output_format)
+
+    async def list_movies(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        title: Optional[str] = None,
+        genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        cursor: Optional[str] = None,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve a list of movies with optional filters (title, genre) and pagination.
+        # Limits above the API page size are fetched page by page with cursors.
+        params = {}
+        if title:
+            params["title"] = title
+        if genre:
+            params["genre"] = genre
+            params["genre_mode"] = genre_mode
+        data, next_cursor = await self._get_pages("/movies", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, MovieSimple, output_format), next_cursor)
+
+    async def search_movies(
+        self,
+        q: str,
+        skip: int = 0,
+        limit: int = 20,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieSearchResult], List[dict], "pd.DataFrame"]:
+        # Full-text search of the movie titles, best matches first (every word matches as a prefix)
+        response = await self._get("/movies/search", {"q": q, "skip": skip, "limit": limit})
+        return self._format_output(response.json(), MovieSearchResult, output_format)
+
+    async def top_movies(
+        self,
+        by: Literal["score", "count", "mean"] = "score",
+        genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        min_count: int = 0,
+        skip: int = 0,
+        limit: int = 20,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieTop], List[dict], "pd.DataFrame"]:
+        # Retrieve the best movies by weighted score, number of ratings or mean rating
+        params = {"by": by, "min_count": min_count, "skip": skip, "limit": limit}
+        if genre:
+            params["genre"] = genre
+            params["genre_mode"] = genre_mode
+        response = await self._get("/movies/top", params)
+        return self._format_output(response.json(), MovieTop, output_format)
+
+    async def get_similar_movies(
+        self,
+        movies_Id: int,
+        k: int = 10,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[SimilarMovie], List[dict], "pd.DataFrame"]:
+        # Retrieve the k movies whose ratings are the most similar to those of a movie, most similar first
+        response = await self._get(f"/movies/{movies_Id}/similar", {"k": k})
+        return self._format_output(response.json(), SimilarMovie, output_format)
+
+    async def get_recommendations(
+        self,
+        user_Id: int,
+        k: int = 10,
+        genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[Recommendation], List[dict], "pd.DataFrame"]:
+        # Retrieve the k movies not rated yet by a user with the highest predicted rating
+        params = {"k": k}
+        if genre:
+            params["genre"] = genre
+            params["genre_mode"] = genre_mode
+        response = await self._get(f"/users/{user_Id}/recommendations", params)
+        return self._format_output(response.json(), Recommendation, output_format)
+
+    async def get_rating(self, user_Id: int, movies_Id: int) -> RatingSimple:
+        # Retrieve a specific user's rating for a specific movie
+        response = await self._get(f"/ratings/{user_Id}/{movies_Id}")
+        return RatingSimple(**response.json())
+
+    async def get_ratings_batch(
+        self,
+        pairs: List[Tuple[int, int]],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[RatingSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the ratings of many (user_Id, movies_Id) pairs, in the order of the pairs
+        data = await self._post_batches("/ratings/batch", "pairs", pairs, output_format)
+        return self._format_output(data, RatingSimple, output_format)
+
+    async def get_user(self, user_Id: int) -> UserProfile:
+        # Retrieve the activity profile of a user: number, mean and distribution of the ratings,
+        # first and last activity, number of tags and most rated genres
+        response = await self._get(f"/users/{user_Id}")
+        return UserProfile(**response.json())
+
+    async def list_user_ratings(
+        self,
+        user_Id: int,
+        sort: Literal["time", "score"] = "time",
+        order: Literal["asc", "desc"] = "desc",
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[RatingSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the ratings of a user sorted by time or by rating, the most recent or best first by default
+        params = {"sort": sort, "order": order}
+        data, next_cursor = await self._get_pages(f"/users/{user_Id}/ratings", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, RatingSimple, output_format), next_cursor)
+
+    async def list_ratings(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        cursor: Optional[str] = None,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[RatingSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve a list of ratings with optional filters (movies_Id, user_Id, min_rating)
+        params = {}
+        if movies_Id:
+            params["movies_Id"] = movies_Id
+        if user_Id:
+            params["user_Id"] = user_Id
+        if min_rating:
+            params["min_rating"] = min_rating
+        data, next_cursor = await self._get_pages("/ratings", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, RatingSimple, output_format), next_cursor)
+
+    async def get_tag(self, user_Id: int, movies_Id: int, tag_text: str) -> TagSimple:
+        # Retrieve a specific tag associated with a user and movie
+        response = await self._get(f"/tags/{user_Id}/{movies_Id}/{tag_text}")
+        return TagSimple(**response.json())
+
+    async def get_tags_batch(
+        self,
+        pairs: List[Tuple[int, int]],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[TagSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve all the tags of many (user_Id, movies_Id) pairs
+        data = await self._post_batches("/tags/batch", "pairs", pairs, output_format)
+        return self._format_output(data, TagSimple, output_format)
+
+    async def list_tags(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        cursor: Optional[str] = None,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[TagSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve a list of tags with optional filters (movies_Id, user_Id)
+        params = {}
+        if movies_Id:
+            params["movies_Id"] = movies_Id
+        if user_Id:
+            params["user_Id"] = user_Id
+        data, next_cursor = await self._get_pages("/tags", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, TagSimple, output_format), next_cursor)
+
+    async def get_link(self, movies_Id: int) -> LinkSimple:
+        # Retrieve external link information for a specific movie
+        response = await self._get(f"/links/{movies_Id}")
+        return LinkSimple(**response.json())
+
+    async def get_links_batch(
+        self,
+        movies_Ids: List[int],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[LinkSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the links of many movies, in the order of the IDs
+        data = await self._post_batches("/links/batch", "moviesIds", movies_Ids, output_format)
+        return self._format_output(data, LinkSimple, output_format)
+
+    async def list_links(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[LinkSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve a list of links for multiple movies with pagination
+        data, next_cursor = await self._get_pages("/links", {}, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, LinkSimple, output_format), next_cursor)
+
+    async def get_analytics(self) -> AnalyticsResponse:
+        # Retrieve global analytics or statistical data from the API
+        response = await self._get("/analytics")
+        return AnalyticsResponse(**response.json())
+
+    async def stream_table(
+        self,
+        table: Literal["movies", "ratings", "tags", "links"],
+        params: Optional[dict] = None,
+        chunk_size: int = 10000,
+        output_format: Literal["pydantic", "dict", "pandas"] = "dict"
+    ) -> AsyncIterator[Union[MovieSimple, RatingSimple, TagSimple, LinkSimple, dict, "pd.DataFrame"]]:
+        # Stream a whole table from the export endpoint, decoding the NDJSON rows as they arrive.
+        # Rows are yielded one by one, or as DataFrames of `chunk_size` rows with "pandas", which
+        # are decoded from the Arrow export when pyarrow is installed.
+        model = {"movies": MovieSimple, "ratings": RatingSimple, "tags": TagSimple, "links": LinkSimple}[table]
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        if output_format == "pandas" and pyarrow is not None and self.config.movie_wire_format == "arrow":
+            params["format"] = "arrow"
+            response = await self._stream(f"/export/{table}", params)
+            try:
+                async for frame in aiter_arrow_frames(response.aiter_bytes(), chunk_size):
+                    yield frame
+            finally:
+                await response.aclose()
+            return
+        params["format"] = "ndjson"
+        chunk = []
+        response = await self._stream(f"/export/{table}", params)
+        try:
+            async for line in response.aiter_lines():
+                if not line:
+                    continue
+                row = json.loads(line)
+                if output_format != "pandas":
+                    yield self._format_output([row], model, output_format)[0]
+                    continue
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield pd.DataFrame(chunk)
+                    chunk = []
+        finally:
+            await response.aclose()
+        if chunk:
+            yield pd.DataFrame(chunk)
+
+    def stream_movies(self, chunk_size: int = 10000, output_format: Literal["pydantic", "dict", "pandas"] = "dict"):
+        # Stream all the movies
+        return self.stream_table("movies", chunk_size=chunk_size, output_format=output_format)
+
+    def stream_ratings(
+        self,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        chunk_size: int = 10000,
+        output_format: Literal["pydantic", "dict", "pandas"] = "dict"
+    ):
+        # Stream all the ratings with optional filters (movies_Id, user_Id, min_rating)
+        params = {"movies_Id": movies_Id, "user_Id": user_Id, "min_rating": min_rating}
+        return self.stream_table("ratings", params, chunk_size, output_format)
+
+    def stream_tags(
+        self,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        chunk_size: int = 10000,
+        output_format: Literal["pydantic", "dict", "pandas"] = "dict"
+    ):
+        # Stream all the tags with optional filters (movies_Id, user_Id)
+        params = {"movies_Id": movies_Id, "user_Id": user_Id}
+        return self.stream_table("tags", params, chunk_size, output_format)
+
+    def stream_links(self, chunk_size: int = 10000, output_format: Literal["pydantic", "dict", "pandas"] = "dict"):
+        # Stream all the links
+        return self.stream_table("links", chunk_size=chunk_size, output_format=output_format)
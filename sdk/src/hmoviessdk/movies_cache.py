@@ -0,0 +1,147 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlencode
+
+import httpx
+
+# Paths always requested from the server: the health check
+UNCACHED_PATHS = {"/"}
+
+# Response headers kept with a cached body
+CACHED_HEADERS = ("content-type", "etag", "last-modified", "x-next-cursor")
+
+
+class CachedResponse:
+    # Body and headers of a successful GET response, with the time it was received or last revalidated
+
+    def __init__(self, body: bytes, headers: dict, stored_at: float):
+        self.body = body
+        self.headers = headers
+        self.stored_at = stored_at
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get("etag")
+
+    def to_response(self, url: str) -> httpx.Response:
+        # Rebuild the httpx response served from the cache
+        return httpx.Response(200, headers=self.headers, content=self.body, request=httpx.Request("GET", url))
+
+
+class ResponseCache:
+    # In-process LRU cache of the GET responses of the API, optionally backed by a SQLite file
+    # shared between processes.
+    # - A response younger than `ttl` seconds is served without any request.
+    # - An older one is revalidated with its ETag (If-None-Match): a 304 refreshes it without
+    #   downloading the body again.
+    # - At most `max_entries` responses are kept in memory (and on disk), the least recently
+    #   used ones are evicted first.
+
+    def __init__(self, ttl: float = 300.0, max_entries: int = 1024, path: Optional[str] = None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.path = path
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "revalidated": 0, "evictions": 0}
+        self._disk = None
+        if path:
+            self._disk = sqlite3.connect(os.path.expanduser(path), timeout=30, isolation_level=None, check_same_thread=False)
+            self._disk.execute("PRAGMA journal_mode = WAL")
+            self._disk.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, headers TEXT, body BLOB, stored_at REAL)"
+            )
+
+    @staticmethod
+    def key(path: str, params: Optional[dict] = None, accept: Optional[str] = None) -> str:
+        # Cache key of a request: the path, the sorted query parameters and the requested media type
+        query = urlencode(sorted((name, str(value)) for name, value in (params or {}).items()))
+        return f"{path}?{query}#{accept}" if accept else f"{path}?{query}"
+
+    def get(self, key: str) -> Optional[CachedResponse]:
+        # Return the cached response of a key, fresh or not, from memory then from disk
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if self._disk is None:
+                return None
+            row = self._disk.execute("SELECT headers, body, stored_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            entry = CachedResponse(row[1], json.loads(row[0]), row[2])
+            self._remember(key, entry)
+            return entry
+
+    def is_fresh(self, entry: CachedResponse) -> bool:
+        return time.time() - entry.stored_at < self.ttl
+
+    def hit(self):
+        with self._lock:
+            self._stats["hits"] += 1
+
+    def store(self, key: str, response: httpx.Response):
+        # Cache a successful response, replacing the previous one of the key
+        headers = {name: response.headers[name] for name in CACHED_HEADERS if name in response.headers}
+        entry = CachedResponse(response.content, headers, time.time())
+        with self._lock:
+            self._stats["misses"] += 1
+            self._remember(key, entry)
+            self._write(key, entry)
+
+    def revalidated(self, key: str, entry: CachedResponse):
+        # The server answered 304 Not Modified: the cached response is fresh again
+        entry.stored_at = time.time()
+        with self._lock:
+            self._stats["revalidated"] += 1
+            self._remember(key, entry)
+            self._write(key, entry)
+
+    def clear(self):
+        # Forget every cached response, in memory and on disk
+        with self._lock:
+            self._entries.clear()
+            if self._disk is not None:
+                self._disk.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        # Hits (served without request), misses (downloaded), revalidated (304), evictions and size
+        with self._lock:
+            requests = sum(self._stats[name] for name in ("hits", "misses", "revalidated"))
+            return {
+                **self._stats,
+                "hit_ratio": self._stats["hits"] / requests if requests else 0.0,
+                "entries": len(self._entries),
+            }
+
+    def close(self):
+        if self._disk is not None:
+            self._disk.close()
+            self._disk = None
+
+    def _remember(self, key: str, entry: CachedResponse):
+        # Keep an entry in memory as the most recently used one (lock held)
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._stats["evictions"] += 1
+
+    def _write(self, key: str, entry: CachedResponse):
+        # Write an entry to the disk store and keep only its `max_entries` most recent ones (lock held)
+        if self._disk is None:
+            return
+        self._disk.execute(
+            "INSERT OR REPLACE INTO responses (key, headers, body, stored_at) VALUES (?, ?, ?, ?)",
+            (key, json.dumps(entry.headers), entry.body, entry.stored_at),
+        )
+        self._disk.execute(
+            "DELETE FROM responses WHERE key NOT IN (SELECT key FROM responses ORDER BY stored_at DESC LIMIT ?)",
+            (self.max_entries,),
+        )
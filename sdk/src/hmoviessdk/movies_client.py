@@ -1,15 +1,237 @@
 import httpx
-from typing import Optional, List, Literal, Union
-from .schemas import MovieSimple, MovieDetailed, RatingSimple, TagSimple, LinkSimple, AnalyticsResponse
+import json
+import queue
+import threading
+from pathlib import Path
+from typing import Iterator, Optional, List, Literal, Tuple, Union
+from .schemas import MovieSimple, MovieSearchResult, MovieTop, SimilarMovie, Recommendation, MovieDetailed, RatingSimple, UserProfile, TagSimple, LinkSimple, AnalyticsResponse
 from .movies_config import MovieConfig
+from .movies_cache import ResponseCache, UNCACHED_PATHS
+from .movies_retry import RetryPolicy
+from .movies_snapshots import SNAPSHOT_EXTENSIONS, fetch_snapshot, open_snapshot
+from .movies_columnar import concat_frames, frame_media_type, iter_arrow_frames, pyarrow, read_frame
 import pandas as pd
 
+# Largest page served by the API list endpoints
+MAX_PAGE_SIZE = 1000
+# Header in which the API sends the cursor of the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Largest number of IDs or pairs resolved by a single batch request of the API
+MAX_BATCH_SIZE = 5000
+# Seconds the consumer of the pages waits for the prefetching thread when it stops. A thread still
+# sending a request (and its retries) is a daemon: it ends on its own once the request returns.
+PREFETCH_JOIN_TIMEOUT = 0.5
+
+
+class Page(list):
+    # Rows returned by a list method, with the cursor of the following page (None at the end of the
+    # results). The cursor travels with the rows, so concurrent calls on one client never mix them up.
+    def __init__(self, rows=(), next_cursor: Optional[str] = None):
+        super().__init__(rows)
+        self.next_cursor = next_cursor
+
+
+def with_next_cursor(rows, next_cursor: Optional[str]):
+    # Attach the cursor of the following page to the rows of a list method: a Page for the lists,
+    # `attrs["next_cursor"]` for a DataFrame
+    if isinstance(rows, pd.DataFrame):
+        rows.attrs["next_cursor"] = next_cursor
+        return rows
+    return Page(rows, next_cursor)
+
 
 class MovieClient:
     def __init__(self, config: Optional[MovieConfig] = None):
         # Initialize the client with a given configuration or a default one
         self.config = config or MovieConfig()
         self.movie_base_url = self.config.movie_base_url
+        # Persistent client: its connections are kept alive and reused by the following calls,
+        # instead of a new TCP (and TLS) handshake for every call
+        self.http_client = httpx.Client(
+            base_url=self.movie_base_url,
+            timeout=self.config.movie_timeout,
+            limits=httpx.Limits(
+                max_connections=self.config.movie_max_connections,
+                max_keepalive_connections=self.config.movie_max_keepalive_connections,
+                keepalive_expiry=self.config.movie_keepalive_expiry,
+            ),
+            http2=self.config.movie_http2,
+        )
+        # Cache of the GET responses, enabled with MovieConfig(cache=True)
+        self.cache = ResponseCache(self.config.movie_cache_ttl, self.config.movie_cache_max_entries,
+                                   self.config.movie_cache_path) if self.config.movie_cache else None
+        # Retries with backoff, circuit breaker and hedging of the requests
+        self.retry = RetryPolicy(self.config)
+
+    def close(self):
+        # Close the connections of the client and the disk store of the cache
+        self.http_client.close()
+        self.retry.close()
+        if self.cache is not None:
+            self.cache.close()
+
+    def cache_stats(self) -> dict:
+        # Hits, misses, revalidations (304) and evictions of the response cache
+        return self.cache.stats() if self.cache is not None else {}
+
+    def clear_cache(self):
+        # Forget every cached response
+        if self.cache is not None:
+            self.cache.clear()
+
+    def __enter__(self) -> "MovieClient":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def _get(self, path: str, params: Optional[dict] = None, headers: Optional[dict] = None) -> httpx.Response:
+        # Send a GET request to the API and raise an error for unsuccessful status codes.
+        # With the cache, a fresh cached response is returned without any request and a stale one
+        # is revalidated with its ETag.
+        if self.cache is None or path in UNCACHED_PATHS:
+            response = self.retry.call(lambda: self.http_client.get(path, params=params, headers=headers))
+            response.raise_for_status()
+            return response
+
+        key = self.cache.key(path, params, (headers or {}).get("Accept"))
+        entry = self.cache.get(key)
+        if entry is not None and self.cache.is_fresh(entry):
+            self.cache.hit()
+            return entry.to_response(f"{self.movie_base_url}{key}")
+        if entry is not None and entry.etag:
+            headers = {**(headers or {}), "If-None-Match": entry.etag}
+        response = self.retry.call(lambda: self.http_client.get(path, params=params, headers=headers))
+        if response.status_code == 304 and entry is not None:
+            self.cache.revalidated(key, entry)
+            return entry.to_response(f"{self.movie_base_url}{key}")
+        response.raise_for_status()
+        self.cache.store(key, response)
+        return response
+
+    def _post(self, path: str, payload: dict, headers: Optional[dict] = None) -> httpx.Response:
+        # Send a POST request with a JSON body and raise an error for unsuccessful status codes
+        # The batch lookups only read: they are retried, but never sent twice at once
+        response = self.retry.call(lambda: self.http_client.post(path, json=payload, headers=headers), hedge=False)
+        response.raise_for_status()
+        return response
+
+    def _stream(self, path: str, params: dict) -> httpx.Response:
+        # Open a streamed GET request, whose body is read by the caller, which must close the response.
+        # Only the connection and the status are retried: a stream failing midway is not resumed.
+        request = self.http_client.build_request("GET", path, params=params, timeout=None)
+        response = self.retry.call(lambda: self.http_client.send(request, stream=True), hedge=False)
+        if response.is_error:
+            response.close()
+            response.raise_for_status()
+        return response
+
+    def _rows_headers(self, output_format: str) -> Optional[dict]:
+        # The rows of a DataFrame are requested in a columnar format (MovieConfig(wire_format=...))
+        if output_format != "pandas":
+            return None
+        return {"Accept": frame_media_type(self.config.movie_wire_format)}
+
+    def _read_rows(self, response: httpx.Response, output_format: str):
+        # Rows of a list or batch response: a DataFrame with "pandas", a list of dicts otherwise
+        return read_frame(response) if output_format == "pandas" else response.json()
+
+    def _join_rows(self, parts: list, output_format: str):
+        # Rows of several pages or batches, in order
+        if output_format == "pandas":
+            return concat_frames(parts)
+        return [row for part in parts for row in part]
+
+    def _post_batches(self, path: str, field: str, keys: list, output_format: str = "dict"):
+        # Resolve a list of IDs or pairs through a batch endpoint, split in requests of at most
+        # MAX_BATCH_SIZE distinct keys. The rows come back in the order of the keys.
+        keys = list(dict.fromkeys(tuple(key) if isinstance(key, (list, tuple)) else key for key in keys))
+        headers = self._rows_headers(output_format)
+        parts = []
+        for start in range(0, len(keys), MAX_BATCH_SIZE):
+            batch = [list(key) if isinstance(key, tuple) else key for key in keys[start:start + MAX_BATCH_SIZE]]
+            parts.append(self._read_rows(self._post(path, {field: batch}, headers), output_format))
+        return self._join_rows(parts, output_format)
+
+    def _get_pages(self, path: str, params: dict, skip: int, limit: int, cursor: Optional[str],
+                   output_format: str = "dict"):
+        # Retrieve up to `limit` rows, following the cursors sent back by the API page after page.
+        # Return the rows and the cursor of the next page, to resume from it later.
+        headers = self._rows_headers(output_format)
+        parts, count = [], 0
+        while True:
+            page_params = {**params, "skip": skip, "limit": min(limit - count, MAX_PAGE_SIZE)}
+            if cursor:
+                page_params["cursor"] = cursor
+            response = self._get(path, page_params, headers)
+            parts.append(self._read_rows(response, output_format))
+            count += len(parts[-1])
+            cursor = response.headers.get(NEXT_CURSOR_HEADER)
+            skip = 0
+            if not cursor or count >= limit:
+                return self._join_rows(parts, output_format), cursor
+
+    def _iter_pages(self, path: str, params: dict, page_size: int, prefetch: int,
+                    output_format: str = "dict") -> Iterator[Union[List[dict], "pd.DataFrame"]]:
+        # Yield the pages of a list endpoint until the last one. A background thread follows the
+        # cursors sent back by the API, so every page costs the same whatever its depth, and keeps
+        # up to `prefetch` pages ready while the current one is consumed.
+        page_size = min(page_size, MAX_PAGE_SIZE)
+        headers = self._rows_headers(output_format)
+        pages = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+
+        def put(item):
+            # Wait for room in the queue, unless the consumer stopped
+            while not stop.is_set():
+                try:
+                    pages.put(item, timeout=0.1)
+                    return
+                except queue.Full:
+                    continue
+
+        def produce():
+            cursor = None
+            try:
+                while not stop.is_set():
+                    page_params = {**params, "limit": page_size}
+                    if cursor:
+                        page_params["cursor"] = cursor
+                    response = self._get(path, page_params, headers)
+                    cursor = response.headers.get(NEXT_CURSOR_HEADER)
+                    put((self._read_rows(response, output_format), None))
+                    if not cursor:
+                        break
+            except Exception as error:
+                put((None, error))
+            put((None, None))
+
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                page, error = pages.get()
+                if error is not None:
+                    raise error
+                if page is None:
+                    return
+                if len(page):
+                    yield page
+        finally:
+            # The consumer reached the end, failed or stopped early
+            stop.set()
+            producer.join(PREFETCH_JOIN_TIMEOUT)
+
+    def _iter_rows(self, path: str, params: dict, model, page_size: int, prefetch: int,
+                   output_format: Literal["pydantic", "dict", "pandas"]):
+        # Iterate over the rows of every page, or a DataFrame per page with "pandas".
+        # The arguments are checked when the iterator is created, not at the first row.
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        pages = self._iter_pages(path, params, page_size, prefetch, output_format)
+        if output_format == "pandas":
+            return pages
+        return (row for page in pages for row in self._format_output(page, model, output_format))
 
     def _format_output(self, data, model, output_format: Literal["pydantic", "dict", "pandas"]):
         # Helper method to convert API responses into different formats:
@@ -21,22 +243,21 @@ class MovieClient:
         elif output_format == "dict":
             return data
         elif output_format == "pandas":
-            return pd.DataFrame(data)
+            # Already decoded from a columnar response by the list and batch methods
+            return data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
         else:
             raise ValueError("Invalid output_format. Choose from 'pydantic', 'dict', or 'pandas'.")
 
     def health_check(self) -> dict:
         # Check if the API server is up and responding
-        url = f"{self.movie_base_url}/"
-        response = httpx.get(url)
-        response.raise_for_status()
+        response = self._get("/")
         return response.json()
 
-    def get_movie(self, movies_Id: int) -> MovieDetailed:
-        # Retrieve detailed information for a specific movie by ID
-        url = f"{self.movie_base_url}/movies/{movies_Id}"
-        response = httpx.get(url)
-        response.raise_for_status()
+    def get_movie(self, movies_Id: int, ratings_limit: int = 100, tags_limit: int = 100) -> MovieDetailed:
+        # Retrieve detailed information for a specific movie by ID, with at most
+        # `ratings_limit` ratings and `tags_limit` tags and the statistics of all its ratings
+        params = {"ratings_limit": ratings_limit, "tags_limit": tags_limit}
+        response = self._get(f"/movies/{movies_Id}", params)
         return MovieDetailed(**response.json())
 
     def list_movies(
@@ -45,24 +266,111 @@ class MovieClient:
         limit: int = 100,
         title: Optional[str] = None,
         genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        cursor: Optional[str] = None,
         output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
     ) -> Union[List[MovieSimple], List[dict], "pd.DataFrame"]:
-        # Retrieve a list of movies with optional filters (title, genre) and pagination
-        url = f"{self.movie_base_url}/movies"
-        params = {"skip": skip, "limit": limit}
+        # Retrieve a list of movies with optional filters (title, genre) and pagination.
+        # Several genres can be given as "Action,Comedy": genre_mode="all" keeps the movies
+        # having every genre, genre_mode="any" the movies having at least one of them.
+        # Limits above the API page size are fetched page by page with cursors; pass the
+        # `next_cursor` of the returned rows as `cursor` to continue from there.
+        params = {}
         if title:
             params["title"] = title
         if genre:
             params["genre"] = genre
-        response = httpx.get(url, params=params)
-        response.raise_for_status()
-        return self._format_output(response.json(), MovieSimple, output_format)
+            params["genre_mode"] = genre_mode
+        data, next_cursor = self._get_pages("/movies", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, MovieSimple, output_format), next_cursor)
+
+    def get_movies_batch(
+        self,
+        movies_Ids: List[int],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the movies of many IDs with a few batch requests, in the order of the IDs.
+        # Unknown IDs are left out.
+        data = self._post_batches("/movies/batch", "moviesIds", movies_Ids, output_format)
+        return self._format_output(data, MovieSimple, output_format)
+
+    def iter_movies(
+        self,
+        title: Optional[str] = None,
+        genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        page_size: int = MAX_PAGE_SIZE,
+        prefetch: int = 4,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Iterator[Union[MovieSimple, dict, "pd.DataFrame"]]:
+        # Iterate over all the movies matching the filters, `prefetch` pages ahead of the consumer.
+        # Rows are yielded one by one, or as a DataFrame per page with "pandas".
+        params = {}
+        if title:
+            params["title"] = title
+        if genre:
+            params["genre"] = genre
+            params["genre_mode"] = genre_mode
+        return self._iter_rows("/movies", params, MovieSimple, page_size, prefetch, output_format)
+
+    def search_movies(
+        self,
+        q: str,
+        skip: int = 0,
+        limit: int = 20,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieSearchResult], List[dict], "pd.DataFrame"]:
+        # Full-text search of the movie titles, best matches first (every word matches as a prefix)
+        response = self._get("/movies/search", {"q": q, "skip": skip, "limit": limit})
+        return self._format_output(response.json(), MovieSearchResult, output_format)
+
+    def top_movies(
+        self,
+        by: Literal["score", "count", "mean"] = "score",
+        genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        min_count: int = 0,
+        skip: int = 0,
+        limit: int = 20,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[MovieTop], List[dict], "pd.DataFrame"]:
+        # Retrieve the best movies by weighted score, number of ratings or mean rating
+        params = {"by": by, "min_count": min_count, "skip": skip, "limit": limit}
+        if genre:
+            params["genre"] = genre
+            params["genre_mode"] = genre_mode
+        response = self._get("/movies/top", params)
+        return self._format_output(response.json(), MovieTop, output_format)
+
+    def get_similar_movies(
+        self,
+        movies_Id: int,
+        k: int = 10,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[SimilarMovie], List[dict], "pd.DataFrame"]:
+        # Retrieve the k movies whose ratings are the most similar to those of a movie, most similar first
+        response = self._get(f"/movies/{movies_Id}/similar", {"k": k})
+        return self._format_output(response.json(), SimilarMovie, output_format)
+
+    def get_recommendations(
+        self,
+        user_Id: int,
+        k: int = 10,
+        genre: Optional[str] = None,
+        genre_mode: Literal["all", "any"] = "all",
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[Recommendation], List[dict], "pd.DataFrame"]:
+        # Retrieve the k movies not rated yet by a user with the highest predicted rating
+        params = {"k": k}
+        if genre:
+            params["genre"] = genre
+            params["genre_mode"] = genre_mode
+        response = self._get(f"/users/{user_Id}/recommendations", params)
+        return self._format_output(response.json(), Recommendation, output_format)
 
     def get_rating(self, user_Id: int, movies_Id: int) -> RatingSimple:
         # Retrieve a specific user's rating for a specific movie
-        url = f"{self.movie_base_url}/ratings/{user_Id}/{movies_Id}"
-        response = httpx.get(url)
-        response.raise_for_status()
+        response = self._get(f"/ratings/{user_Id}/{movies_Id}")
         return RatingSimple(**response.json())
 
     def list_ratings(
@@ -72,26 +380,73 @@ class MovieClient:
         movies_Id: Optional[int] = None,
         user_Id: Optional[int] = None,
         min_rating: Optional[float] = None,
+        cursor: Optional[str] = None,
         output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
     ) -> Union[List[RatingSimple], List[dict], "pd.DataFrame"]:
         # Retrieve a list of ratings with optional filters (movies_Id, user_Id, min_rating)
-        url = f"{self.movie_base_url}/ratings"
-        params = {"skip": skip, "limit": limit}
+        params = {}
         if movies_Id:
             params["movies_Id"] = movies_Id
         if user_Id:
             params["user_Id"] = user_Id
         if min_rating:
             params["min_rating"] = min_rating
-        response = httpx.get(url, params=params)
-        response.raise_for_status()
-        return self._format_output(response.json(), RatingSimple, output_format)
+        data, next_cursor = self._get_pages("/ratings", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, RatingSimple, output_format), next_cursor)
+
+    def get_ratings_batch(
+        self,
+        pairs: List[Tuple[int, int]],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[RatingSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the ratings of many (user_Id, movies_Id) pairs with a few batch requests,
+        # in the order of the pairs. Pairs without rating are left out.
+        data = self._post_batches("/ratings/batch", "pairs", pairs, output_format)
+        return self._format_output(data, RatingSimple, output_format)
+
+    def get_user(self, user_Id: int) -> UserProfile:
+        # Retrieve the activity profile of a user: number, mean and distribution of the ratings,
+        # first and last activity, number of tags and most rated genres
+        response = self._get(f"/users/{user_Id}")
+        return UserProfile(**response.json())
+
+    def list_user_ratings(
+        self,
+        user_Id: int,
+        sort: Literal["time", "score"] = "time",
+        order: Literal["asc", "desc"] = "desc",
+        skip: int = 0,
+        limit: int = 100,
+        cursor: Optional[str] = None,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[RatingSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the ratings of a user sorted by time or by rating, the most recent or best first by default
+        params = {"sort": sort, "order": order}
+        data, next_cursor = self._get_pages(f"/users/{user_Id}/ratings", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, RatingSimple, output_format), next_cursor)
+
+    def iter_ratings(
+        self,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        page_size: int = MAX_PAGE_SIZE,
+        prefetch: int = 4,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Iterator[Union[RatingSimple, dict, "pd.DataFrame"]]:
+        # Iterate over all the ratings matching the filters, `prefetch` pages ahead of the consumer
+        params = {}
+        if movies_Id:
+            params["movies_Id"] = movies_Id
+        if user_Id:
+            params["user_Id"] = user_Id
+        if min_rating:
+            params["min_rating"] = min_rating
+        return self._iter_rows("/ratings", params, RatingSimple, page_size, prefetch, output_format)
 
     def get_tag(self, user_Id: int, movies_Id: int, tag_text: str) -> TagSimple:
         # Retrieve a specific tag associated with a user and movie
-        url = f"{self.movie_base_url}/tags/{user_Id}/{movies_Id}/{tag_text}"
-        response = httpx.get(url)
-        response.raise_for_status()
+        response = self._get(f"/tags/{user_Id}/{movies_Id}/{tag_text}")
         return TagSimple(**response.json())
 
     def list_tags(
@@ -100,42 +455,169 @@ class MovieClient:
         limit: int = 100,
         movies_Id: Optional[int] = None,
         user_Id: Optional[int] = None,
+        cursor: Optional[str] = None,
         output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
     ) -> Union[List[TagSimple], List[dict], "pd.DataFrame"]:
         # Retrieve a list of tags with optional filters (movies_Id, user_Id)
-        url = f"{self.movie_base_url}/tags"
-        params = {"skip": skip, "limit": limit}
+        params = {}
         if movies_Id:
             params["movies_Id"] = movies_Id
         if user_Id:
             params["user_Id"] = user_Id
-        response = httpx.get(url, params=params)
-        response.raise_for_status()
-        return self._format_output(response.json(), TagSimple, output_format)
+        data, next_cursor = self._get_pages("/tags", params, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, TagSimple, output_format), next_cursor)
+
+    def get_tags_batch(
+        self,
+        pairs: List[Tuple[int, int]],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[TagSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve all the tags of many (user_Id, movies_Id) pairs with a few batch requests
+        data = self._post_batches("/tags/batch", "pairs", pairs, output_format)
+        return self._format_output(data, TagSimple, output_format)
+
+    def iter_tags(
+        self,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        page_size: int = MAX_PAGE_SIZE,
+        prefetch: int = 4,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Iterator[Union[TagSimple, dict, "pd.DataFrame"]]:
+        # Iterate over all the tags matching the filters, `prefetch` pages ahead of the consumer
+        params = {}
+        if movies_Id:
+            params["movies_Id"] = movies_Id
+        if user_Id:
+            params["user_Id"] = user_Id
+        return self._iter_rows("/tags", params, TagSimple, page_size, prefetch, output_format)
 
     def get_link(self, movies_Id: int) -> LinkSimple:
         # Retrieve external link information for a specific movie
-        url = f"{self.movie_base_url}/links/{movies_Id}"
-        response = httpx.get(url)
-        response.raise_for_status()
+        response = self._get(f"/links/{movies_Id}")
         return LinkSimple(**response.json())
 
     def list_links(
         self,
         skip: int = 0,
         limit: int = 100,
+        cursor: Optional[str] = None,
         output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
     ) -> Union[List[LinkSimple], List[dict], "pd.DataFrame"]:
         # Retrieve a list of links for multiple movies with pagination
-        url = f"{self.movie_base_url}/links"
-        params = {"skip": skip, "limit": limit}
-        response = httpx.get(url, params=params)
-        response.raise_for_status()
-        return self._format_output(response.json(), LinkSimple, output_format)
+        data, next_cursor = self._get_pages("/links", {}, skip, limit, cursor, output_format)
+        return with_next_cursor(self._format_output(data, LinkSimple, output_format), next_cursor)
+
+    def get_links_batch(
+        self,
+        movies_Ids: List[int],
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Union[List[LinkSimple], List[dict], "pd.DataFrame"]:
+        # Retrieve the links of many movies with a few batch requests, in the order of the IDs
+        data = self._post_batches("/links/batch", "moviesIds", movies_Ids, output_format)
+        return self._format_output(data, LinkSimple, output_format)
+
+    def iter_links(
+        self,
+        page_size: int = MAX_PAGE_SIZE,
+        prefetch: int = 4,
+        output_format: Literal["pydantic", "dict", "pandas"] = "pydantic"
+    ) -> Iterator[Union[LinkSimple, dict, "pd.DataFrame"]]:
+        # Iterate over all the links, `prefetch` pages ahead of the consumer
+        return self._iter_rows("/links", {}, LinkSimple, page_size, prefetch, output_format)
 
     def get_analytics(self) -> AnalyticsResponse:
         # Retrieve global analytics or statistical data from the API
-        url = f"{self.movie_base_url}/analytics"
-        response = httpx.get(url)
-        response.raise_for_status()
+        response = self._get("/analytics")
         return AnalyticsResponse(**response.json())
+
+    def stream_table(
+        self,
+        table: Literal["movies", "ratings", "tags", "links"],
+        params: Optional[dict] = None,
+        chunk_size: int = 10000,
+        output_format: Literal["pydantic", "dict", "pandas"] = "dict"
+    ) -> Iterator[Union[MovieSimple, RatingSimple, TagSimple, LinkSimple, dict, "pd.DataFrame"]]:
+        # Stream a whole table from the export endpoint, decoding the NDJSON rows as they arrive.
+        # Rows are yielded one by one, or as DataFrames of `chunk_size` rows with "pandas", which
+        # are decoded from the Arrow export when pyarrow is installed.
+        model = {"movies": MovieSimple, "ratings": RatingSimple, "tags": TagSimple, "links": LinkSimple}[table]
+        params = {key: value for key, value in (params or {}).items() if value is not None}
+        if output_format == "pandas" and pyarrow is not None and self.config.movie_wire_format == "arrow":
+            params["format"] = "arrow"
+            response = self._stream(f"/export/{table}", params)
+            try:
+                yield from iter_arrow_frames(response.iter_bytes(), chunk_size)
+            finally:
+                response.close()
+            return
+        params["format"] = "ndjson"
+        chunk = []
+        response = self._stream(f"/export/{table}", params)
+        try:
+            for line in response.iter_lines():
+                if not line:
+                    continue
+                row = json.loads(line)
+                if output_format != "pandas":
+                    yield self._format_output([row], model, output_format)[0]
+                    continue
+                chunk.append(row)
+                if len(chunk) >= chunk_size:
+                    yield pd.DataFrame(chunk)
+                    chunk = []
+        finally:
+            response.close()
+        if chunk:
+            yield pd.DataFrame(chunk)
+
+    def stream_movies(self, chunk_size: int = 10000, output_format: Literal["pydantic", "dict", "pandas"] = "dict"):
+        # Stream all the movies
+        return self.stream_table("movies", chunk_size=chunk_size, output_format=output_format)
+
+    def stream_ratings(
+        self,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        min_rating: Optional[float] = None,
+        chunk_size: int = 10000,
+        output_format: Literal["pydantic", "dict", "pandas"] = "dict"
+    ):
+        # Stream all the ratings with optional filters (movies_Id, user_Id, min_rating)
+        params = {"movies_Id": movies_Id, "user_Id": user_Id, "min_rating": min_rating}
+        return self.stream_table("ratings", params, chunk_size, output_format)
+
+    def stream_tags(
+        self,
+        movies_Id: Optional[int] = None,
+        user_Id: Optional[int] = None,
+        chunk_size: int = 10000,
+        output_format: Literal["pydantic", "dict", "pandas"] = "dict"
+    ):
+        # Stream all the tags with optional filters (movies_Id, user_Id)
+        params = {"movies_Id": movies_Id, "user_Id": user_Id}
+        return self.stream_table("tags", params, chunk_size, output_format)
+
+    def stream_links(self, chunk_size: int = 10000, output_format: Literal["pydantic", "dict", "pandas"] = "dict"):
+        # Stream all the links
+        return self.stream_table("links", chunk_size=chunk_size, output_format=output_format)
+
+    def download_snapshot(
+        self,
+        table: Literal["movies", "ratings", "tags", "links"],
+        path: Union[str, Path],
+        format: Literal["arrow", "parquet"] = "arrow",
+        load: bool = True,
+    ) -> Union["pd.DataFrame", Path]:
+        # Download the snapshot file of a whole table built by the API for the current version of the
+        # dataset, and open it as a DataFrame (memory-mapped for "arrow"), or return its path with load=False.
+        # The download is skipped when `path` already holds the current version, and an interrupted
+        # download (e.g. a dropped connection, retried by the retry policy) resumes where it stopped.
+        path = Path(path).expanduser()
+        if path.suffix != SNAPSHOT_EXTENSIONS[format]:
+            raise ValueError(f"The path of a {format} snapshot must end with {SNAPSHOT_EXTENSIONS[format]}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        response = self.retry.call(lambda: fetch_snapshot(self.http_client, table, path, format), hedge=False)
+        if response.status_code != 304:
+            response.raise_for_status()
+        return open_snapshot(path) if load else path
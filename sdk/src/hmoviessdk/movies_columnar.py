@@ -0,0 +1,149 @@
+from typing import AsyncIterator, Iterator, List, Literal
+
+import httpx
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:
+    pyarrow = None
+
+# Media types of the rows sent back by the list, batch and export endpoints of the API
+JSON = "application/json"
+# One array per column, with the compact type of each column
+COLUMNAR_JSON = "application/vnd.movies.columnar+json"
+# Arrow IPC stream (decoded only when pyarrow is installed)
+ARROW_STREAM = "application/vnd.apache.arrow.stream"
+
+WIRE_FORMATS = {"json": JSON, "columnar": COLUMNAR_JSON, "arrow": ARROW_STREAM}
+
+# NumPy dtypes of the column types of the columnar JSON
+COLUMN_DTYPES = {"int32": np.int32, "int64": np.int64, "float32": np.float32, "string": object}
+
+
+def frame_media_type(wire_format: Literal["arrow", "columnar", "json"]) -> str:
+    # Media type requested for the DataFrame outputs: Arrow falls back to columnar JSON without pyarrow
+    if wire_format == "arrow" and pyarrow is None:
+        wire_format = "columnar"
+    if wire_format not in WIRE_FORMATS:
+        raise ValueError("Invalid wire_format. Choose from 'arrow', 'columnar', or 'json'.")
+    return WIRE_FORMATS[wire_format]
+
+
+def _column(values: list, dtype) -> np.ndarray:
+    # Array of a column with its compact dtype, float when an integer column holds missing values
+    if dtype is object:
+        return np.array(values, dtype=object)
+    if None in values:
+        return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+    return np.array(values, dtype=dtype)
+
+
+def read_frame(response: httpx.Response) -> pd.DataFrame:
+    # Decode a response of rows into a DataFrame according to its content type:
+    # - Arrow: the record batches are converted column by column, without Python objects for the numbers
+    # - columnar JSON: one NumPy array per column, with the declared dtypes
+    # - JSON objects (a server without content negotiation): the usual DataFrame of dicts
+    content_type = response.headers.get("content-type", "")
+    if content_type.startswith(ARROW_STREAM):
+        return read_arrow(response.content)
+    if content_type.startswith(COLUMNAR_JSON):
+        payload = response.json()
+        return pd.DataFrame({
+            name: _column(values, COLUMN_DTYPES.get(payload["types"].get(name), object))
+            for name, values in payload["columns"].items()
+        })
+    return pd.DataFrame(response.json())
+
+
+def read_arrow(content: bytes) -> pd.DataFrame:
+    # Decode an Arrow IPC stream into a DataFrame, releasing the Arrow buffers as the columns are converted
+    table = pyarrow.ipc.open_stream(content).read_all()
+    return table.to_pandas(split_blocks=True, self_destruct=True)
+
+
+def concat_frames(frames: List[pd.DataFrame]) -> pd.DataFrame:
+    # Concatenate the DataFrames of several pages or batches, keeping their dtypes
+    frames = [frame for frame in frames if len(frame.columns)]
+    if not frames:
+        return pd.DataFrame()
+    if len(frames) == 1:
+        return frames[0]
+    return pd.concat(frames, ignore_index=True)
+
+
+class _ChunksReader:
+    # Minimal file object reading the chunks of a streamed body, for the Arrow stream reader
+
+    def __init__(self, chunks: Iterator[bytes]):
+        self._chunks = chunks
+        self._buffer = bytearray()
+        self.closed = False
+
+    def read(self, size: int = -1) -> bytes:
+        while size < 0 or len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self._buffer.extend(chunk)
+        size = len(self._buffer) if size < 0 else size
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def iter_arrow_frames(chunks: Iterator[bytes], chunk_size: int) -> Iterator[pd.DataFrame]:
+    # Decode a streamed Arrow IPC body into DataFrames of about `chunk_size` rows, record batch
+    # after record batch as they arrive
+    reader = pyarrow.ipc.open_stream(pyarrow.PythonFile(_ChunksReader(chunks), mode="r"))
+    batches, rows = [], 0
+    for batch in reader:
+        batches.append(batch)
+        rows += batch.num_rows
+        if rows >= chunk_size:
+            yield _batches_frame(batches, reader.schema)
+            batches, rows = [], 0
+    if batches:
+        yield _batches_frame(batches, reader.schema)
+
+
+async def aiter_arrow_frames(chunks: AsyncIterator[bytes], chunk_size: int) -> AsyncIterator[pd.DataFrame]:
+    # Async counterpart of iter_arrow_frames. The pyarrow stream reader only pulls from blocking
+    # files, so the IPC messages are cut from the buffered chunks as soon as they are complete.
+    buffer, schema, batches, rows = b"", None, [], 0
+    async for chunk in chunks:
+        buffer += chunk
+        start = 0
+        # A message starts with an 8 bytes prefix: continuation marker and metadata length
+        while len(buffer) - start >= 8:
+            reader = pyarrow.BufferReader(buffer)
+            reader.seek(start)
+            try:
+                message = pyarrow.ipc.read_message(reader)
+            except EOFError:
+                # End-of-stream marker
+                buffer, start = b"", 0
+                break
+            except (pyarrow.ArrowInvalid, OSError):
+                # Incomplete message: wait for the next chunks
+                break
+            start = reader.tell()
+            if schema is None:
+                schema = pyarrow.ipc.read_schema(message)
+                continue
+            batch = pyarrow.ipc.read_record_batch(message, schema)
+            batches.append(batch)
+            rows += batch.num_rows
+            if rows >= chunk_size:
+                yield _batches_frame(batches, schema)
+                batches, rows = [], 0
+        buffer = buffer[start:]
+    if batches:
+        yield _batches_frame(batches, schema)
+
+
+def _batches_frame(batches: list, schema) -> pd.DataFrame:
+    # DataFrame of record batches, releasing the Arrow buffers as the columns are converted
+    return pyarrow.Table.from_batches(batches, schema).to_pandas(split_blocks=True, self_destruct=True)
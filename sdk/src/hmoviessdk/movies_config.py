@@ -1,4 +1,5 @@
 import os
+from typing import Optional
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -13,12 +14,42 @@ class MovieConfig:
     movie_base_url: str
     movie_backoff: bool
     movie_backoff_max_time: int
+    movie_timeout: float
+    movie_max_connections: int
+    movie_max_keepalive_connections: int
+    movie_keepalive_expiry: float
+    movie_http2: bool
+    movie_max_concurrency: int
+    movie_cache: bool
+    movie_cache_ttl: float
+    movie_cache_max_entries: int
+    movie_cache_path: Optional[str]
+    movie_circuit_failure_threshold: int
+    movie_circuit_reset_timeout: float
+    movie_hedge: bool
+    movie_hedge_delay: float
+    movie_wire_format: str
 
     def __init__(
         self,
         movie_base_url: str = None,
         backoff: bool = True,
         backoff_max_time: int = 30,
+        timeout: float = 10.0,
+        max_connections: int = 10,
+        max_keepalive_connections: int = 10,
+        keepalive_expiry: float = 30.0,
+        http2: bool = False,
+        max_concurrency: int = 10,
+        cache: bool = False,
+        cache_ttl: float = 300.0,
+        cache_max_entries: int = 1024,
+        cache_path: Optional[str] = None,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_timeout: float = 30.0,
+        hedge: bool = False,
+        hedge_delay: float = 0.5,
+        wire_format: str = "arrow",
     ):
         """Building for the class configuration.
 
@@ -33,6 +64,52 @@ class MovieConfig:
             
         movie_backoff_max_time:
             The maximum number of seconds during which the SDK should continue attempting an API call before giving up.
+
+        movie_timeout:
+            The number of seconds to wait for a connection, a read or a write before an API call fails.
+
+        movie_max_connections / movie_max_keepalive_connections:
+            The maximum number of connections opened by the client, and kept open between calls.
+
+        movie_keepalive_expiry:
+            The number of seconds an idle connection is kept open for the next calls.
+
+        movie_http2:
+            A boolean that enables HTTP/2 when the server supports it (requires `pip install httpx[http2]`).
+
+        movie_max_concurrency:
+            The maximum number of requests in flight at once for the AsyncMovieClient.
+
+        movie_cache:
+            A boolean that enables the cache of the GET responses.
+
+        movie_cache_ttl:
+            The number of seconds a cached response is used without asking the server. Older responses
+            are revalidated with their ETag, which costs a request but not the download of the body.
+
+        movie_cache_max_entries:
+            The maximum number of cached responses, the least recently used ones are evicted first.
+
+        movie_cache_path (optional):
+            A SQLite file where the cached responses are also written, to share them between processes and runs.
+
+        movie_circuit_failure_threshold / movie_circuit_reset_timeout:
+            The number of consecutive failed calls (after their retries) which suspend the calls to the API,
+            and the number of seconds they stay suspended before a trial call.
+
+        movie_hedge:
+            A boolean that duplicates a GET request still running after the 95th percentile of the recent
+            durations, keeping the first response, to cut the tail latency at the cost of some extra requests
+            (at most 5% of the recent calls are hedged).
+
+        movie_hedge_delay:
+            The hedging delay in seconds used until enough durations were measured.
+
+        movie_wire_format:
+            The format in which the rows of the "pandas" outputs are downloaded: "arrow" (Arrow IPC,
+            requires `pip install hmoviessdk[arrow]`, columnar JSON without it), "columnar" (one JSON array
+            per column) or "json" (JSON objects). The columnar formats are decoded straight into compact
+            dtypes (int32, float32) instead of Python objects.
         """
 
         self.movie_base_url = movie_base_url or os.getenv("MOVIE_API_BASE_URL")
@@ -43,6 +120,21 @@ class MovieConfig:
 
         self.movie_backoff = backoff
         self.movie_backoff_max_time = backoff_max_time
+        self.movie_timeout = timeout
+        self.movie_max_connections = max_connections
+        self.movie_max_keepalive_connections = max_keepalive_connections
+        self.movie_keepalive_expiry = keepalive_expiry
+        self.movie_http2 = http2
+        self.movie_max_concurrency = max_concurrency
+        self.movie_cache = cache or bool(cache_path)
+        self.movie_cache_ttl = cache_ttl
+        self.movie_cache_max_entries = cache_max_entries
+        self.movie_cache_path = cache_path
+        self.movie_circuit_failure_threshold = circuit_failure_threshold
+        self.movie_circuit_reset_timeout = circuit_reset_timeout
+        self.movie_hedge = hedge
+        self.movie_hedge_delay = hedge_delay
+        self.movie_wire_format = wire_format
 
     def __str__(self):
         """ 
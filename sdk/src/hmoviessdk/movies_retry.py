@@ -0,0 +1,313 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Optional
+
+import backoff
+import httpx
+
+# Statuses of a temporary failure, worth retrying: rate limiting, and a gateway or server not ready
+# (e.g. the hosted API waking up)
+RETRY_STATUS_CODES = {429, 502, 503, 504}
+# Failures without response worth retrying: connection errors, timeouts, dropped connections
+RETRY_EXCEPTIONS = (httpx.TransportError,)
+
+# Number of recent request durations used to compute the hedging delay
+LATENCY_WINDOW = 200
+# Durations needed before the p95 replaces the configured hedging delay
+LATENCY_MIN_SAMPLES = 20
+# Largest share of the recent calls that may be hedged: when the API slows down as a whole, the
+# p95 of the past lags behind and hedging every call would double the load instead of trimming the tail
+HEDGE_MAX_SHARE = 0.05
+
+
+class CircuitOpenError(Exception):
+    # Raised without calling the API while the circuit breaker is open
+    pass
+
+
+class CircuitBreaker:
+    # Stop calling the API after `failure_threshold` consecutive failed calls: for `reset_timeout`
+    # seconds the calls fail immediately with CircuitOpenError, then a single trial call is let
+    # through ("half-open"), which closes the circuit if it succeeds and opens it again otherwise.
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before_call(self):
+        # Raise CircuitOpenError when the call must not reach the API
+        with self._lock:
+            state = self.state
+            if state == "open" or (state == "half-open" and self._trial):
+                raise CircuitOpenError(f"The API failed {self.failures} times in a row, calls are suspended")
+            if state == "half-open":
+                self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self):
+        # The call ended without telling whether the API works (e.g. it was cancelled)
+        with self._lock:
+            self._trial = False
+
+
+class LatencyTracker:
+    # Durations of the recent successful requests, to derive the hedging delay
+
+    def __init__(self, default_delay: float):
+        self.default_delay = default_delay
+        self._durations = deque(maxlen=LATENCY_WINDOW)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._durations.append(seconds)
+
+    def p95(self) -> float:
+        # 95th percentile of the recent durations, the default delay until there are enough of them
+        with self._lock:
+            if len(self._durations) < LATENCY_MIN_SAMPLES:
+                return self.default_delay
+            durations = sorted(self._durations)
+        return durations[int(0.95 * (len(durations) - 1))]
+
+
+def close_response(future):
+    # Release the connection of the response of a hedged request which lost the race
+    if not future.cancelled() and future.exception() is None:
+        future.result().close()
+
+
+def retry_after(response: Optional[httpx.Response]) -> Optional[float]:
+    # Seconds to wait requested by the Retry-After header of a response (delay or HTTP date)
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class RetryPolicy:
+    # Send requests with retries, a circuit breaker and optional hedging, as configured by MovieConfig:
+    # - temporary failures (RETRY_STATUS_CODES, RETRY_EXCEPTIONS) are retried after an exponential
+    #   delay with full jitter, or the delay of the Retry-After header, as long as the next attempt
+    #   starts within `movie_backoff_max_time` seconds of the first one;
+    # - a call failing after its retries counts as a failure of the circuit breaker;
+    # - with hedging, an attempt still running after the p95 of the recent request durations is
+    #   duplicated and the first successful response wins (only for idempotent GET requests), for
+    #   at most HEDGE_MAX_SHARE of the recent calls. The losing request is cancelled, or its
+    #   response closed as soon as it arrives when it cannot be cancelled (sync client).
+
+    def __init__(self, config):
+        self.enabled = config.movie_backoff
+        self.max_time = config.movie_backoff_max_time
+        self.breaker = CircuitBreaker(config.movie_circuit_failure_threshold, config.movie_circuit_reset_timeout)
+        self.latencies = LatencyTracker(config.movie_hedge_delay)
+        self.hedge = config.movie_hedge
+        self.stats = {"retries": 0, "hedged": 0}
+        # The counters are updated from the threads of the pool and of the callers
+        self._stats_lock = threading.Lock()
+        # Whether each of the recent calls was hedged
+        self._hedges = deque(maxlen=LATENCY_WINDOW)
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._pool_size = config.movie_max_connections
+
+    def _count(self, name: str):
+        with self._stats_lock:
+            self.stats[name] += 1
+
+    def _may_hedge(self) -> bool:
+        # Record a call and tell whether it may be hedged without exceeding HEDGE_MAX_SHARE of the recent calls
+        with self._stats_lock:
+            allowed = sum(self._hedges) < HEDGE_MAX_SHARE * max(len(self._hedges) + 1, LATENCY_MIN_SAMPLES)
+            self._hedges.append(False)
+            return allowed
+
+    def _hedging(self):
+        # The call is hedged: count it in the budget and the stats
+        with self._stats_lock:
+            self._hedges[-1] = True
+            self.stats["hedged"] += 1
+
+    def _waits(self):
+        waits = backoff.expo(factor=0.5, max_value=10)
+        next(waits)
+        return waits
+
+    def _next_delay(self, waits, response: Optional[httpx.Response], deadline: float) -> Optional[float]:
+        # Delay before the next attempt, None when the call must give up
+        if not self.enabled:
+            return None
+        delay = retry_after(response)
+        if delay is None:
+            delay = backoff.full_jitter(next(waits))
+        if time.monotonic() + delay > deadline:
+            return None
+        self._count("retries")
+        return delay
+
+    def _timed(self, send: Callable[[], httpx.Response]) -> httpx.Response:
+        start = time.perf_counter()
+        response = send()
+        if response.status_code < 500:
+            self.latencies.record(time.perf_counter() - start)
+        return response
+
+    def _hedged(self, send: Callable[[], httpx.Response]) -> httpx.Response:
+        # Send a request, and a duplicate if the first one takes longer than the p95 delay
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self._pool_size)
+        if not self._may_hedge():
+            return self._timed(send)
+        first = self._pool.submit(self._timed, send)
+        done, _ = wait([first], timeout=self.latencies.p95())
+        if done:
+            return first.result()
+        self._hedging()
+        pending = {first, self._pool.submit(self._timed, send)}
+        error = None
+        try:
+            while pending:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+            raise error
+        finally:
+            # A running request of a thread cannot be interrupted: the losing one is cancelled if it
+            # did not start yet, and its response closed as soon as it arrives otherwise
+            for future in pending:
+                if not future.cancel():
+                    future.add_done_callback(close_response)
+
+    def call(self, send: Callable[[], httpx.Response], hedge: bool = True) -> httpx.Response:
+        # Send a request built by `send` with the retry policy, and return the last response.
+        # `hedge` must be False for the requests which must not be sent twice at once.
+        self.breaker.before_call()
+        try:
+            return self._call(send, hedge)
+        finally:
+            self.breaker.release()
+
+    def _call(self, send: Callable[[], httpx.Response], hedge: bool) -> httpx.Response:
+        deadline = time.monotonic() + self.max_time
+        waits = self._waits()
+        while True:
+            response, error = None, None
+            try:
+                response = self._hedged(send) if self.hedge and hedge else self._timed(send)
+            except RETRY_EXCEPTIONS as exc:
+                error = exc
+            if error is None and response.status_code not in RETRY_STATUS_CODES:
+                self.breaker.record_success()
+                return response
+            delay = self._next_delay(waits, response, deadline)
+            if delay is None:
+                self.breaker.record_failure()
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                # Release the connection of the failed attempt (streamed responses are not read)
+                response.close()
+            time.sleep(delay)
+
+    async def _atimed(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        start = time.perf_counter()
+        response = await send()
+        if response.status_code < 500:
+            self.latencies.record(time.perf_counter() - start)
+        return response
+
+    async def _ahedged(self, send: Callable[[], Awaitable[httpx.Response]]) -> httpx.Response:
+        # Send a request, and a duplicate if the first one takes longer than the p95 delay;
+        # the request that loses the race is cancelled
+        if not self._may_hedge():
+            return await self._atimed(send)
+        first = asyncio.ensure_future(self._atimed(send))
+        done, _ = await asyncio.wait({first}, timeout=self.latencies.p95())
+        if done:
+            return first.result()
+        self._hedging()
+        pending = {first, asyncio.ensure_future(self._atimed(send))}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def acall(self, send: Callable[[], Awaitable[httpx.Response]], hedge: bool = True) -> httpx.Response:
+        # Asynchronous version of call
+        self.breaker.before_call()
+        try:
+            return await self._acall(send, hedge)
+        finally:
+            self.breaker.release()
+
+    async def _acall(self, send: Callable[[], Awaitable[httpx.Response]], hedge: bool) -> httpx.Response:
+        deadline = time.monotonic() + self.max_time
+        waits = self._waits()
+        while True:
+            response, error = None, None
+            try:
+                response = await (self._ahedged(send) if self.hedge and hedge else self._atimed(send))
+            except RETRY_EXCEPTIONS as exc:
+                error = exc
+            if error is None and response.status_code not in RETRY_STATUS_CODES:
+                self.breaker.record_success()
+                return response
+            delay = self._next_delay(waits, response, deadline)
+            if delay is None:
+                self.breaker.record_failure()
+                if error is not None:
+                    raise error
+                return response
+            if response is not None:
+                await response.aclose()
+            await asyncio.sleep(delay)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
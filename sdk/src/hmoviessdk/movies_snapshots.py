@@ -0,0 +1,97 @@
+import os
+from pathlib import Path
+from typing import Literal, Optional
+
+import httpx
+import pandas as pd
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+# Extension of the snapshot files of each format served by the API
+SNAPSHOT_EXTENSIONS = {"arrow": ".arrow", "parquet": ".parquet"}
+
+
+def _sibling(path: Path, suffix: str) -> Path:
+    return path.with_name(path.name + suffix)
+
+
+def _read_etag(path: Path) -> Optional[str]:
+    # ETag of the version of the dataset held by a snapshot file, kept in `<file>.etag`
+    etag_path = _sibling(path, ".etag")
+    if not path.exists() or not etag_path.exists():
+        return None
+    return etag_path.read_text().strip() or None
+
+
+def _write_etag(path: Path, etag: Optional[str]):
+    etag_path = _sibling(path, ".etag")
+    if etag:
+        etag_path.write_text(etag)
+    elif etag_path.exists():
+        etag_path.unlink()
+
+
+def _complete(part: Path, path: Path, etag: Optional[str]):
+    # The partial file holds the whole snapshot: move it in place with its ETag
+    os.replace(part, path)
+    _write_etag(path, etag)
+    _write_etag(part, None)
+
+
+def fetch_snapshot(http_client: httpx.Client, table: str, path: Path, format: Literal["arrow", "parquet"]) -> httpx.Response:
+    # Download the snapshot of a table into `path` with a single request and return its response:
+    # - 304 when `path` already holds the current version (its ETag is sent in If-None-Match)
+    # - 206 when a previous download of the same version stopped midway: the rest of the file is
+    #   appended to `<path>.part` (Range from its size, If-Range with its ETag)
+    # - 200 when the whole file is sent, which also happens when the partial file holds another version
+    # The file is only moved to `path` once complete. An error while reading the body leaves the
+    # partial file to resume from.
+    part = _sibling(path, ".part")
+    headers = {}
+    etag = _read_etag(path)
+    if etag:
+        headers["If-None-Match"] = etag
+    part_etag = _read_etag(part)
+    if part_etag and part.stat().st_size:
+        headers["Range"] = f"bytes={part.stat().st_size}-"
+        headers["If-Range"] = part_etag
+
+    with http_client.stream("GET", f"/snapshots/{table}", params={"format": format}, headers=headers) as response:
+        if response.status_code == 416 and "Range" in headers:
+            # Nothing left after the partial file: it is complete if it has the size of the snapshot
+            if response.headers.get("content-range") == f"bytes */{part.stat().st_size}":
+                _complete(part, path, part_etag)
+                return httpx.Response(304, request=response.request)
+            part.unlink()
+            _write_etag(part, None)
+            return response
+        if response.status_code not in (200, 206):
+            return response
+
+        resumed = response.status_code == 206
+        if not resumed:
+            _write_etag(part, response.headers.get("etag"))
+        with open(part, "ab" if resumed else "wb") as file:
+            for chunk in response.iter_bytes():
+                file.write(chunk)
+        _complete(part, path, response.headers.get("etag"))
+    return response
+
+
+def open_snapshot(path: str) -> pd.DataFrame:
+    # Open a snapshot file as a DataFrame. An Arrow file is memory-mapped: the columns are backed by
+    # the file (pandas Arrow dtypes), its pages are read on demand and shared between processes
+    # instead of being copied in memory. A Parquet file is decompressed into NumPy columns.
+    if pyarrow is None:
+        raise ImportError("Opening a snapshot requires pyarrow: pip install hmoviessdk[arrow]")
+    path = Path(path).expanduser()
+    if path.suffix == SNAPSHOT_EXTENSIONS["parquet"]:
+        table = pyarrow.parquet.read_table(path, memory_map=True)
+        return table.to_pandas(split_blocks=True, self_destruct=True)
+    table = pyarrow.ipc.open_file(pyarrow.memory_map(str(path))).read_all()
+    return table.to_pandas(types_mapper=pd.ArrowDtype)
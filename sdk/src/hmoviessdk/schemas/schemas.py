@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional, List
+from typing import Dict, Optional, List
 
 # --- Second Schemas ---
 
@@ -28,6 +28,12 @@ class LinkBase(BaseModel):
         orm_mode = True
         
         
+class RatingStats(BaseModel):
+    count: int
+    mean: Optional[float] = None
+    histogram: Dict[float, int] = {}
+        
+        
 # --- Main Schema for Movies ---
 
 class MovieBase(BaseModel):
@@ -43,6 +49,7 @@ class MovieDetailed(MovieBase):
     ratings: List[RatingBase] = []
     tags: List[TagBase] = []
     links: Optional[LinkBase] = None
+    rating_stats: Optional[RatingStats] = None
     
     class Config:
         orm_mode = True
@@ -57,6 +64,39 @@ class MovieSimple(MovieBase):
     class Config: 
         orm_mode = True
         
+class MovieSearchResult(MovieSimple):
+    score: float
+        
+class MovieTop(MovieSimple):
+    rating_count: int
+    rating_mean: float
+    rating_stddev: float
+    weighted_score: float
+    last_rated_at: Optional[int] = None
+        
+class SimilarMovie(MovieSimple):
+    similarity: float
+        
+class Recommendation(MovieSimple):
+    score: float
+        
+#--- Schemas of the users ---
+
+class GenreActivity(BaseModel):
+    genre: str
+    count: int
+    mean: float
+
+class UserProfile(BaseModel):
+    userId: int
+    rating_count: int
+    rating_mean: Optional[float] = None
+    rating_histogram: Dict[float, int] = {}
+    first_activity_at: Optional[int] = None
+    last_activity_at: Optional[int] = None
+    tag_count: int
+    top_genres: List[GenreActivity] = []
+        
 #--- Schemas for the endpoints of ratings and tags ---
 
 class RatingSimple(BaseModel):
@@ -92,6 +132,12 @@ class AnalyticsResponse(BaseModel):
     rating_count: int
     tag_count: int
     link_count: int
+    user_count: Optional[int] = None
+    rating_histogram: Dict[float, int] = {}
+    ratings_per_year: Dict[int, int] = {}
+    genre_counts: Dict[str, int] = {}
+    user_activity: Dict[str, float] = {}
+    data_version: Optional[str] = None
     
     class Config:
         orm_mode = True
@@ -0,0 +1,109 @@
+# Tests of the response cache of MovieClient: TTL, ETag revalidation, LRU eviction and disk store
+# Run with: python -m pytest
+import time
+
+import httpx
+
+from hmoviessdk import MovieClient, MovieConfig
+from hmoviessdk.movies_cache import ResponseCache
+
+BASE_URL = "http://movies.test"
+
+
+class VersionedAPI:
+    # /movies/{id} and /movies answered with an ETag of the dataset version, and 304 for a matching If-None-Match
+
+    def __init__(self):
+        self.version = "v1"
+        self.requests = []
+        self.not_modified = 0
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        etag = f'"{self.version}-{request.url.path}-{request.url.query.decode()}"'
+        if request.headers.get("If-None-Match") == etag:
+            self.not_modified += 1
+            return httpx.Response(304, headers={"ETag": etag})
+        if request.url.path == "/movies":
+            return httpx.Response(200, json=[{"moviesId": 1, "title": self.version, "genres": "Drama"}],
+                                  headers={"ETag": etag, "X-Next-Cursor": "1"})
+        movies_id = int(request.url.path.rsplit("/", 1)[1])
+        movie = {"moviesId": movies_id, "title": f"{self.version} {movies_id}", "genres": "Drama", "ratings": [], "tags": [], "links": None}
+        return httpx.Response(200, json=movie, headers={"ETag": etag})
+
+
+def make_client(api, **config) -> MovieClient:
+    client = MovieClient(MovieConfig(BASE_URL, backoff=False, cache=True, **config))
+    client.http_client = httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(api))
+    return client
+
+
+def test_fresh_response_is_served_without_request():
+    api = VersionedAPI()
+    with make_client(api, cache_ttl=60) as client:
+        assert client.get_movie(1).title == "v1 1"
+        api.version = "v2"
+        assert client.get_movie(1).title == "v1 1"
+        assert len(api.requests) == 1
+        assert client.cache.stats()["hits"] == 1
+
+
+def test_stale_response_is_revalidated_with_its_etag():
+    api = VersionedAPI()
+    with make_client(api, cache_ttl=0) as client:
+        client.get_movie(1)
+        assert client.get_movie(1).title == "v1 1"
+        assert api.not_modified == 1
+        assert api.requests[1].headers["If-None-Match"].startswith('"v1-/movies/1-')
+        assert client.cache.stats()["revalidated"] == 1
+
+        api.version = "v2"
+        assert client.get_movie(1).title == "v2 1"
+        assert api.not_modified == 1
+
+
+def test_revalidated_page_keeps_its_cursor():
+    api = VersionedAPI()
+    with make_client(api, cache_ttl=0) as client:
+        assert client.list_movies(limit=1, output_format="dict").next_cursor == "1"
+        page = client.list_movies(limit=1, output_format="dict")
+        assert api.not_modified == 1
+        assert page.next_cursor == "1" and page[0]["title"] == "v1"
+
+
+def test_least_recently_used_responses_are_evicted():
+    api = VersionedAPI()
+    with make_client(api, cache_ttl=60, cache_max_entries=2) as client:
+        client.get_movie(1)
+        client.get_movie(2)
+        client.get_movie(1)
+        client.get_movie(3)
+        assert client.cache.stats()["evictions"] == 1
+        client.get_movie(1)
+        client.get_movie(2)
+        assert [request.url.path for request in api.requests] == ["/movies/1", "/movies/2", "/movies/3", "/movies/2"]
+
+
+def test_disk_store_is_shared_between_clients(tmp_path):
+    api = VersionedAPI()
+    path = str(tmp_path / "cache.db")
+    with make_client(api, cache_ttl=60, cache_path=path) as client:
+        client.get_movie(1)
+    with make_client(api, cache_ttl=60, cache_path=path) as client:
+        assert client.get_movie(1).title == "v1 1"
+        assert len(api.requests) == 1
+
+
+def test_keys_depend_on_the_parameters_and_media_type():
+    assert ResponseCache.key("/movies", {"limit": 5, "skip": 0}) == ResponseCache.key("/movies", {"skip": 0, "limit": 5})
+    assert ResponseCache.key("/movies", {"limit": 5}) != ResponseCache.key("/movies", {"limit": 6})
+    assert ResponseCache.key("/movies", None, "application/json") != ResponseCache.key("/movies")
+
+
+def test_ttl_expires():
+    cache = ResponseCache(ttl=0.05)
+    cache.store("key", httpx.Response(200, content=b"[]"))
+    entry = cache.get("key")
+    assert cache.is_fresh(entry)
+    time.sleep(0.06)
+    assert not cache.is_fresh(entry)
@@ -0,0 +1,167 @@
+# Tests of the pagination of MovieClient and AsyncMovieClient against a fake API (httpx.MockTransport)
+# Run with: python -m pytest
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from hmoviessdk import AsyncMovieClient, MovieClient, MovieConfig, Page
+
+BASE_URL = "http://movies.test"
+
+
+class FakeMoviesAPI:
+    # /movies with `count` movies, paginated by skip and limit or by a cursor (the last moviesId of the previous page)
+
+    def __init__(self, count: int):
+        self.count = count
+        self.requests = []
+
+    def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.requests.append(request)
+        params = request.url.params
+        limit = int(params.get("limit", 100))
+        start = int(params["cursor"]) if "cursor" in params else int(params.get("skip", 0))
+        ids = range(start + 1, min(start + limit, self.count) + 1)
+        # Like the API, every full page has a cursor, so the last page can be empty
+        headers = {"X-Next-Cursor": str(ids[-1])} if ids and len(ids) == limit else {}
+        return httpx.Response(200, json=[{"moviesId": i, "title": f"Movie {i}", "genres": "Drama"} for i in ids], headers=headers)
+
+    def served(self, name: str) -> list:
+        # Values of a query parameter of the requests received, in order
+        return [request.url.params.get(name) for request in self.requests]
+
+
+def make_client(api, **config) -> MovieClient:
+    client = MovieClient(MovieConfig(BASE_URL, backoff=False, **config))
+    client.http_client = httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(api))
+    return client
+
+
+def make_async_client(api, **config) -> AsyncMovieClient:
+    client = AsyncMovieClient(MovieConfig(BASE_URL, backoff=False, **config))
+    client.http_client = httpx.AsyncClient(base_url=BASE_URL, transport=httpx.MockTransport(api))
+    return client
+
+
+def test_list_follows_cursors_and_returns_the_next_one():
+    api = FakeMoviesAPI(2500)
+    with make_client(api) as client:
+        movies = client.list_movies(limit=1500, output_format="dict")
+        assert isinstance(movies, Page)
+        assert [movie["moviesId"] for movie in movies] == list(range(1, 1501))
+        assert api.served("cursor") == [None, "1000"]
+        assert movies.next_cursor == "1500"
+
+        rest = client.list_movies(limit=5000, cursor=movies.next_cursor, output_format="dict")
+        assert [movie["moviesId"] for movie in rest] == list(range(1501, 2501))
+        assert rest.next_cursor is None
+
+
+def test_dataframe_carries_the_next_cursor():
+    api = FakeMoviesAPI(300)
+    with make_client(api, wire_format="json") as client:
+        frame = client.list_movies(limit=100, output_format="pandas")
+        assert len(frame) == 100
+        assert frame.attrs["next_cursor"] == "100"
+
+
+def test_concurrent_async_lists_keep_their_own_cursor():
+    api = FakeMoviesAPI(5000)
+
+    async def main():
+        async with make_async_client(api) as client:
+            pages = await client.fetch_many(
+                lambda start: client.list_movies(limit=10, cursor=str(start), output_format="dict"), range(0, 4000, 100))
+            return [(page[0]["moviesId"], page.next_cursor) for page in pages]
+
+    assert asyncio.run(main()) == [(start + 1, str(start + 10)) for start in range(0, 4000, 100)]
+
+
+@pytest.mark.parametrize("output_format", ["pydantic", "dict"])
+def test_list_returns_page_in_every_format(output_format):
+    api = FakeMoviesAPI(10)
+    with make_client(api) as client:
+        movies = client.list_movies(limit=100, output_format=output_format)
+        assert isinstance(movies, Page) and len(movies) == 10 and movies.next_cursor is None
+
+
+def test_iterator_follows_cursors():
+    api = FakeMoviesAPI(2345)
+    with make_client(api) as client:
+        movies = list(client.iter_movies(page_size=500, prefetch=2, output_format="dict"))
+        assert [movie["moviesId"] for movie in movies] == list(range(1, 2346))
+        assert api.served("cursor") == [None, "500", "1000", "1500", "2000"]
+        assert api.served("skip") == [None] * 5
+
+
+def test_iterator_yields_dataframes_and_skips_an_empty_last_page():
+    api = FakeMoviesAPI(1000)
+    with make_client(api, wire_format="json") as client:
+        frames = list(client.iter_movies(page_size=500, output_format="pandas"))
+        assert [len(frame) for frame in frames] == [500, 500]
+        assert len(api.requests) == 3
+
+
+def test_iterator_prefetches_a_bounded_number_of_pages():
+    api = FakeMoviesAPI(100000)
+    with make_client(api) as client:
+        movies = client.iter_movies(page_size=100, prefetch=3, output_format="dict")
+        assert next(movies)["moviesId"] == 1
+        deadline = time.monotonic() + 5
+        while len(api.requests) < 4 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        time.sleep(0.2)
+        # The page being consumed and at most `prefetch` pages waiting, plus the one being put in the queue
+        assert 4 <= len(api.requests) <= 5
+        movies.close()
+        assert len(api.requests) <= 5
+
+
+def test_iterator_stops_without_waiting_for_a_slow_page():
+    fast = FakeMoviesAPI(100000)
+
+    def api(request):
+        if "cursor" in request.url.params:
+            time.sleep(2)
+        return fast(request)
+
+    with make_client(api) as client:
+        movies = client.iter_movies(page_size=100, output_format="dict")
+        assert next(movies)["moviesId"] == 1
+        started = time.monotonic()
+        movies.close()
+        assert time.monotonic() - started < 1
+
+
+def test_iterator_rejects_no_prefetch():
+    with make_client(FakeMoviesAPI(10)) as client:
+        with pytest.raises(ValueError):
+            client.iter_movies(prefetch=0)
+
+
+def test_iterator_raises_the_errors_of_the_pages():
+    def api(request):
+        if "cursor" in request.url.params:
+            return httpx.Response(404, json={"detail": "Not Found"})
+        return FakeMoviesAPI(2000)(request)
+
+    with make_client(api) as client:
+        movies = client.iter_movies(page_size=1000, output_format="dict")
+        with pytest.raises(httpx.HTTPStatusError):
+            list(movies)
+
+
+def test_async_list_follows_cursors_after_the_first_skip():
+    api = FakeMoviesAPI(5000)
+
+    async def main():
+        async with make_async_client(api) as client:
+            return await client.list_movies(skip=200, limit=2500, output_format="dict")
+
+    movies = asyncio.run(main())
+    assert [movie["moviesId"] for movie in movies] == list(range(201, 2701))
+    assert api.served("skip") == ["200", "0", "0"]
+    assert api.served("cursor") == [None, "1200", "2200"]
+    assert movies.next_cursor == "2700"
@@ -0,0 +1,121 @@
+# Tests of the decoding of the columnar JSON and Arrow responses into DataFrames
+# Run with: python -m pytest
+import asyncio
+import io
+
+import httpx
+import numpy as np
+import pyarrow
+import pyarrow.ipc
+
+from hmoviessdk import AsyncMovieClient, MovieClient, MovieConfig
+from hmoviessdk.movies_columnar import ARROW_STREAM, COLUMNAR_JSON, aiter_arrow_frames, concat_frames, iter_arrow_frames, read_frame
+
+BASE_URL = "http://movies.test"
+RATINGS = {"userId": [1, 1, 2], "moviesId": [1, 3, 1], "rating": [4.0, 3.5, 5.0], "timestamp": [964982703, 964981247, 964982224]}
+TYPES = {"userId": "int32", "moviesId": "int32", "rating": "float32", "timestamp": "int64"}
+
+
+def arrow_stream(columns: dict, batch_size: int = None) -> bytes:
+    table = pyarrow.table({name: pyarrow.array(values, type=pyarrow.type_for_alias(TYPES[name])) for name, values in columns.items()})
+    sink = io.BytesIO()
+    with pyarrow.ipc.new_stream(sink, table.schema) as writer:
+        for batch in table.to_batches(max_chunksize=batch_size):
+            writer.write_batch(batch)
+    return sink.getvalue()
+
+
+def test_columnar_json_keeps_the_compact_dtypes():
+    response = httpx.Response(200, json={"columns": RATINGS, "types": TYPES}, headers={"Content-Type": COLUMNAR_JSON})
+    frame = read_frame(response)
+    assert frame.to_dict("list") == RATINGS
+    assert [str(dtype) for dtype in frame.dtypes] == ["int32", "int32", "float32", "int64"]
+
+
+def test_columnar_json_missing_integers_become_floats():
+    columns = {"moviesId": [1, 2], "imdbId": [114709, 113497], "tmdbId": [862, None]}
+    types = {"moviesId": "int32", "imdbId": "int32", "tmdbId": "int32"}
+    frame = read_frame(httpx.Response(200, json={"columns": columns, "types": types}, headers={"Content-Type": COLUMNAR_JSON}))
+    assert frame["tmdbId"].dtype == np.float64 and np.isnan(frame["tmdbId"][1])
+    assert frame["imdbId"].dtype == np.int32
+
+
+def test_arrow_stream_is_decoded():
+    frame = read_frame(httpx.Response(200, content=arrow_stream(RATINGS), headers={"Content-Type": ARROW_STREAM}))
+    assert frame.to_dict("list") == RATINGS
+    assert frame["rating"].dtype == np.float32
+
+
+def test_plain_json_is_still_read():
+    rows = [dict(zip(RATINGS, values)) for values in zip(*RATINGS.values())]
+    assert read_frame(httpx.Response(200, json=rows)).to_dict("list") == RATINGS
+
+
+def test_concat_frames_skips_empty_pages():
+    frame = read_frame(httpx.Response(200, content=arrow_stream(RATINGS), headers={"Content-Type": ARROW_STREAM}))
+    assert len(concat_frames([frame, read_frame(httpx.Response(200, json=[])), frame])) == 6
+    assert concat_frames([]).empty
+
+
+def test_arrow_frames_are_decoded_chunk_by_chunk():
+    columns = {name: values * 100 for name, values in RATINGS.items()}
+    content = arrow_stream(columns, batch_size=50)
+    chunks = (content[start:start + 1000] for start in range(0, len(content), 1000))
+    frames = list(iter_arrow_frames(chunks, chunk_size=120))
+    assert [len(frame) for frame in frames] == [150, 150]
+    assert concat_frames(frames).to_dict("list") == columns
+
+
+def test_arrow_frames_are_decoded_from_async_chunks():
+    columns = {name: values * 100 for name, values in RATINGS.items()}
+    content = arrow_stream(columns, batch_size=50)
+
+    async def chunks():
+        for start in range(0, len(content), 7):
+            yield content[start:start + 7]
+
+    async def main():
+        return [frame async for frame in aiter_arrow_frames(chunks(), chunk_size=120)]
+
+    frames = asyncio.run(main())
+    assert [len(frame) for frame in frames] == [150, 150]
+    assert concat_frames(frames).to_dict("list") == columns
+    assert frames[0]["rating"].dtype == np.float32
+
+
+def test_async_stream_asks_for_arrow():
+    formats = []
+
+    def api(request):
+        formats.append(request.url.params["format"])
+        return httpx.Response(200, content=arrow_stream(RATINGS, batch_size=1), headers={"Content-Type": ARROW_STREAM})
+
+    async def main():
+        client = AsyncMovieClient(MovieConfig(BASE_URL, backoff=False, wire_format="arrow"))
+        client.http_client = httpx.AsyncClient(base_url=BASE_URL, transport=httpx.MockTransport(api))
+        async with client:
+            return [frame async for frame in client.stream_ratings(chunk_size=2, output_format="pandas")]
+
+    frames = asyncio.run(main())
+    assert formats == ["arrow"]
+    assert [len(frame) for frame in frames] == [2, 1]
+    assert concat_frames(frames).to_dict("list") == RATINGS
+
+
+def test_client_asks_for_the_wire_format():
+    accepts = []
+
+    def api(request):
+        accepts.append(request.headers["Accept"])
+        if request.headers["Accept"] == ARROW_STREAM:
+            return httpx.Response(200, content=arrow_stream(RATINGS), headers={"Content-Type": ARROW_STREAM})
+        return httpx.Response(200, json={"columns": RATINGS, "types": TYPES}, headers={"Content-Type": COLUMNAR_JSON})
+
+    for wire_format in ("arrow", "columnar"):
+        client = MovieClient(MovieConfig(BASE_URL, backoff=False, wire_format=wire_format))
+        client.http_client = httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(api))
+        with client:
+            frame = client.list_ratings(limit=3, output_format="pandas")
+        assert frame.to_dict("list") == RATINGS
+        assert frame["userId"].dtype == np.int32
+    assert accepts == [ARROW_STREAM, COLUMNAR_JSON]
@@ -0,0 +1,192 @@
+# Tests of the retry policy, the circuit breaker and the hedging against a fake API (httpx.MockTransport)
+# Run with: python -m pytest
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx
+import pytest
+
+from hmoviessdk import AsyncMovieClient, MovieClient, MovieConfig
+from hmoviessdk.movies_retry import HEDGE_MAX_SHARE, LATENCY_MIN_SAMPLES, CircuitOpenError, RetryPolicy
+
+BASE_URL = "http://movies.test"
+MOVIE = {"moviesId": 1, "title": "Toy Story (1995)", "genres": "Animation", "ratings": [], "tags": [], "links": None}
+
+
+def failing(failures: int, status_code: int = 503):
+    # Handler failing `failures` times with `status_code` (or a connection error with None), then answering the movie
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request)
+        if len(calls) <= failures:
+            if status_code is None:
+                raise httpx.ConnectError("Connection refused", request=request)
+            return httpx.Response(status_code, headers={"Retry-After": "0"})
+        if request.url.path.startswith("/export/"):
+            return httpx.Response(200, content=b'{"moviesId": 1}\n{"moviesId": 2}\n')
+        return httpx.Response(200, json=MOVIE)
+
+    handler.calls = calls
+    return handler
+
+
+def make_client(handler, **config) -> MovieClient:
+    client = MovieClient(MovieConfig(BASE_URL, **config))
+    client.http_client = httpx.Client(base_url=BASE_URL, transport=httpx.MockTransport(handler))
+    return client
+
+
+def make_async_client(handler, **config) -> AsyncMovieClient:
+    client = AsyncMovieClient(MovieConfig(BASE_URL, **config))
+    client.http_client = httpx.AsyncClient(base_url=BASE_URL, transport=httpx.MockTransport(handler))
+    return client
+
+
+@pytest.mark.parametrize("status_code", [503, 429, None])
+def test_temporary_failures_are_retried(status_code):
+    handler = failing(2, status_code)
+    with make_client(handler) as client:
+        assert client.get_movie(1).title == "Toy Story (1995)"
+        assert len(handler.calls) == 3
+        assert client.retry.stats["retries"] == 2
+
+
+def test_other_errors_are_not_retried():
+    handler = failing(1, 404)
+    with make_client(handler) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            client.get_movie(1)
+        assert len(handler.calls) == 1
+
+
+def test_circuit_opens_after_consecutive_failures():
+    handler = failing(100)
+    with make_client(handler, backoff=False, circuit_failure_threshold=3, circuit_reset_timeout=60) as client:
+        for _ in range(3):
+            with pytest.raises(httpx.HTTPStatusError):
+                client.get_movie(1)
+        assert client.retry.breaker.state == "open"
+        with pytest.raises(CircuitOpenError):
+            client.get_movie(1)
+        assert len(handler.calls) == 3
+
+
+def test_stats_are_counted_from_many_threads():
+    policy = RetryPolicy(MovieConfig(BASE_URL, backoff_max_time=60))
+    waits = [policy._waits() for _ in range(8)]
+
+    def count(index):
+        for _ in range(1000):
+            policy._next_delay(waits[index], httpx.Response(503, headers={"Retry-After": "0"}), time.monotonic() + 60)
+
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(count, range(8)))
+    assert policy.stats["retries"] == 8000
+
+
+def test_hedging_keeps_the_first_response_and_closes_the_loser():
+    closed = []
+
+    class SlowFirst(httpx.BaseTransport):
+        def __init__(self):
+            self.calls = 0
+            self.lock = threading.Lock()
+
+        def handle_request(self, request):
+            with self.lock:
+                self.calls += 1
+                call = self.calls
+            if call == 1:
+                time.sleep(0.3)
+            stream = httpx.ByteStream(httpx.Response(200, json={**MOVIE, "title": f"call {call}"}).content)
+            stream.close = lambda: closed.append(call)
+            return httpx.Response(200, headers={"Content-Type": "application/json"}, stream=stream)
+
+    transport = SlowFirst()
+    with MovieClient(MovieConfig(BASE_URL, hedge=True, hedge_delay=0.05)) as client:
+        client.http_client = httpx.Client(base_url=BASE_URL, transport=transport)
+        assert client.get_movie(1).title == "call 2"
+        assert client.retry.stats["hedged"] == 1
+        deadline = time.monotonic() + 2
+        while 1 not in closed and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert 1 in closed
+
+
+def test_hedges_are_capped_to_a_share_of_the_calls():
+    def slow(request):
+        time.sleep(0.02)
+        return httpx.Response(200, json=MOVIE)
+
+    with make_client(slow, hedge=True, hedge_delay=0.001) as client:
+        # Every call is slower than the hedging delay, as when the whole API slows down
+        client.retry.latencies.default_delay = 0.001
+        for _ in range(2 * LATENCY_MIN_SAMPLES):
+            client.retry.latencies._durations.clear()
+            client.get_movie(1)
+        assert client.retry.stats["hedged"] <= HEDGE_MAX_SHARE * 2 * LATENCY_MIN_SAMPLES
+
+
+def test_async_hedging_cancels_the_loser():
+    started, finished = [], []
+
+    async def handler(request):
+        call = len(started) + 1
+        started.append(call)
+        await asyncio.sleep(0.3 if call == 1 else 0)
+        finished.append(call)
+        return httpx.Response(200, json={**MOVIE, "title": f"call {call}"})
+
+    async def main():
+        async with make_async_client(handler, hedge=True, hedge_delay=0.05) as client:
+            movie = await client.get_movie(1)
+            await asyncio.sleep(0.4)
+            return movie, client.retry.stats["hedged"]
+
+    movie, hedged = asyncio.run(main())
+    assert movie.title == "call 2" and hedged == 1
+    assert finished == [2]
+
+
+@pytest.mark.parametrize("status_code", [503, None])
+def test_stream_retries_the_initial_connect(status_code):
+    handler = failing(2, status_code)
+    with make_client(handler) as client:
+        assert [row["moviesId"] for row in client.stream_movies()] == [1, 2]
+        assert len(handler.calls) == 3
+
+
+def test_stream_raises_the_errors_which_are_not_retried():
+    with make_client(failing(1, 404)) as client:
+        with pytest.raises(httpx.HTTPStatusError):
+            list(client.stream_movies())
+
+
+@pytest.mark.parametrize("status_code", [503, None])
+def test_async_stream_retries_the_initial_connect(status_code):
+    handler = failing(2, status_code)
+
+    async def main():
+        async with make_async_client(handler) as client:
+            return [row["moviesId"] async for row in client.stream_movies()]
+
+    assert asyncio.run(main()) == [1, 2]
+    assert len(handler.calls) == 3
+
+
+def test_open_async_stream_frees_its_concurrency_slot():
+    handler = failing(0)
+
+    async def main():
+        async with make_async_client(handler, max_concurrency=1) as client:
+            stream = client.stream_movies()
+            first = await stream.__anext__()
+            # The stream is still open: the next request must not wait for its slot
+            movie = await asyncio.wait_for(client.get_movie(1), timeout=1)
+            rest = [row async for row in stream]
+            return [first["moviesId"]] + [row["moviesId"] for row in rest], movie.title
+
+    assert asyncio.run(main()) == ([1, 2], "Toy Story (1995)")